@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+失败测试点证据归档 - 后台保存示波器截图和压缩波形
+
+测试点失败或落在保护带内时，在后台线程中保存示波器截图 (PNG) 和该通道的
+原始波形 (NumPy .npz 压缩)，保存到结果文件旁的 <结果文件名>_evidence/ 目录，
+不必再手工复现失败。
+
+示波器只有一台，截图和波形必须在下一次断电前读取 (之后屏幕上就是下一个测试点)，
+主循环的示波器读数也不能与之并发。因此主循环只在下一次断电前等待读取完成
+(hold)，波形压缩和写文件都在后台进行; 通过的测试点完全不受影响。
+"""
+
+import json
+import os
+import threading
+
+from pipeline import StepWorker
+from timing import NULL_TRACER
+
+# 默认归档参数
+#   screenshot / waveform: 是否保存截图 / 波形
+#   guard: 保护带内 (见 sampling.in_guard_band) 的通过点也归档
+#   channel: 波形通道
+#   length: 波形点数 (None 为示波器当前记录长度)
+ARCHIVE_DEFAULTS = {
+    "screenshot": True,
+    "waveform": True,
+    "guard": True,
+    "channel": 4,
+    "length": None,
+}
+
+
+def archive_params(**overrides) -> dict:
+    """ARCHIVE_DEFAULTS 加上覆盖项 (值为 None 的覆盖项忽略)"""
+    params = dict(ARCHIVE_DEFAULTS)
+    params.update({k: v for k, v in overrides.items() if v is not None})
+    return params
+
+
+def evidence_dir(result_file: str) -> str:
+    """结果文件对应的证据目录"""
+    return f"{os.path.splitext(result_file)[0]}_evidence"
+
+
+def save_waveform(path: str, wf: dict, meta: dict = None) -> str:
+    """波形保存为压缩 .npz (samples 为 float32, 另存采样率、通道和测试点信息)"""
+    import numpy as np
+
+    np.savez_compressed(path, samples=np.asarray(wf["samples"], dtype=np.float32),
+                        sample_rate=wf["sample_rate"], channel=wf["channel"],
+                        meta=json.dumps(meta or {}, ensure_ascii=False))
+    return path
+
+
+def load_waveform(path: str) -> dict:
+    """读取 save_waveform 保存的波形: {"samples", "sample_rate", "channel", "meta"}"""
+    import numpy as np
+
+    with np.load(path) as data:
+        return {"samples": data["samples"], "sample_rate": float(data["sample_rate"]),
+                "channel": int(data["channel"]), "meta": json.loads(str(data["meta"]))}
+
+
+class EvidenceArchiver:
+    """失败/临界测试点的后台归档
+
+    用法:
+        archiver = EvidenceArchiver(bench, staging_dir, archive_params())
+        archiver.capture(key, "fail", meta)   # 测量完成后立即调用, 不等待
+        archiver.hold()                       # 下一次断电前调用
+        archiver.close(output_file)           # 结果保存后, 目录改名为 <结果文件名>_evidence
+    """
+
+    def __init__(self, bench, directory: str, params: dict = None, tracer=NULL_TRACER):
+        self.bench = bench
+        self.directory = os.path.expanduser(directory)
+        self.params = params or archive_params()
+        self.tracer = tracer
+        self.count = 0
+        self._worker = StepWorker("archive")
+        self._grabbed = threading.Event()
+        self._grabbed.set()
+
+    def capture(self, key: str, reason: str, meta: dict = None):
+        """提交一个测试点的归档 (reason: "fail" / "guard")"""
+        self._grabbed.clear()
+        self._worker.submit(self._capture, key, reason, meta or {})
+
+    def _capture(self, key: str, reason: str, meta: dict):
+        base = os.path.join(self.directory, f"{key}_{reason}")
+        wf = None
+        saved = False
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # 读取示波器 (屏幕和波形仍是该测试点的)
+            with self.tracer.span("archive_grab", track="archive", point=key):
+                if self.params["screenshot"]:
+                    saved = bool(self.bench.screenshot(f"{base}.png"))
+                if self.params["waveform"]:
+                    wf = self.bench.read_waveform(self.params["channel"], self.params["length"])
+        finally:
+            self._grabbed.set()
+        if wf is not None:
+            with self.tracer.span("archive_write", track="archive", point=key):
+                save_waveform(f"{base}.npz", wf, dict(meta, point=key, reason=reason))
+            saved = True
+        # 只统计确实写入了文件的测试点
+        if saved:
+            self.count += 1
+
+    def hold(self):
+        """等待已提交归档的示波器读取完成 (压缩和写文件不等待)"""
+        if not self._grabbed.is_set():
+            with self.tracer.span("archive_wait"):
+                self._grabbed.wait()
+
+    def drain(self):
+        """等待全部归档完成 (归档失败只影响证据, 不影响测试结果, 已在出错时打印)"""
+        try:
+            self._worker.drain()
+        except Exception:
+            pass
+
+    def close(self, result_file: str = None) -> str:
+        """等待全部归档完成; 给出结果文件时目录改名为 <结果文件名>_evidence, 返回证据目录"""
+        try:
+            self._worker.close()
+        except Exception as e:
+            print(f"  警告: 部分测试点的证据未能归档 ({e})")
+        if not self.count or not os.path.isdir(self.directory):
+            try:
+                # 预先创建的空暂存目录
+                os.rmdir(self.directory)
+            except OSError:
+                pass
+            return None
+        if result_file:
+            target = evidence_dir(os.path.expanduser(result_file))
+            os.replace(self.directory, target)
+            self.directory = target
+        return self.directory
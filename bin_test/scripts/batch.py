@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+BIN 测试批量运行 (无人值守)
+
+按作业文件 (TOML 或 YAML) 依次执行多个 DUT / LED 类型 / 电压 / 重复次数的测试，
+全程不等待输入: 读取失败记为测量失败，单个运行出错时记录错误并继续下一个。
+所有运行的汇总写入 bin_batch_<时间>.csv。
+
+作业文件示例 (见 config/batch_example.toml):
+
+    [defaults]
+    backend = "session"
+    voltages = [13.5]
+
+    [[job]]
+    dut = "SN12345"
+    led = "headlight"
+    levels = [1, 2, 3]
+    voltages = [9.0, 13.5, 16.0]
+    repeat = 3
+
+用法:
+    python3 batch.py jobs.toml
+    python3 batch.py jobs.toml --resume    # 中断后继续, 跳过已记录的测试点
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+from archive import archive_params
+from discovery import AmbiguousDeviceError
+from instruments import SCOPE_MEASURE_ITEMS, open_bench
+from journal import Journal, journal_path, run_id
+from metrics import DEFAULT_METRICS_PORT, RunMetrics, start_server
+from readback import readback_params
+from result_store import ResultStore
+from run_bin_test import (LED_TYPES, RESULT_DB, RESULTS_DIR, available_bins, check_device, default_res_port,
+                          load_test_config, reserve_path, run_tests, select_bins)
+from sampling import sampling_params
+from scope_profile import profile_params
+from settle import settle_params, trigger_params
+from timing import NULL_TRACER, Tracer
+
+# 作业默认值, 可被作业文件的 [defaults] 和每个 [[job]] 覆盖
+JOB_DEFAULTS = {
+    "dut": "",
+    "led": "headlight",
+    "config": None,          # 留空按 LED 类型选择
+    "levels": [],            # 留空测试全部
+    "voltages": [13.5],
+    "repeat": 1,
+    "backend": "session",
+    "res_port": None,        # 留空取发现缓存 (discovery.py), 否则 /dev/ttyUSB0
+    "visa_address": None,    # 留空自动搜索
+    "scope_address": None,
+    "fixed_wait": False,
+    "settle": {},            # 覆盖 settle_params 的参数, 例如 {rel_tol = 0.01}
+    "channels": [4],
+    "items": ["mean"],
+    "waveform": False,
+    "waveform_pass": "mean",
+    "measure": "scope",      # 电流测量策略 scope / supply / fallback / cross-check (见 readback.py)
+    "readback": {},          # 覆盖 readback_params 的参数, 例如 {gain = 1020.0, cross_tol = 0.03}
+    "adaptive": False,       # 自适应重复采样
+    "sampling": {},          # 覆盖 sampling_params 的参数, 例如 {guard = 0.3, max_samples = 20}
+    "trigger": False,        # 示波器单次触发采集
+    "trigger_params": {},    # 覆盖 trigger_params 的参数, 例如 {window = [0.1, 0.3]}
+    "archive": True,         # 失败/临界测试点保存截图和波形 (见 archive.py)
+    "archive_params": {},    # 覆盖 archive_params 的参数, 例如 {screenshot = false}
+    "scope_profile": {},      # 覆盖示波器测量配置 profile_params 的参数, 例如 {tdiv = 0.1, average = 4}
+    "trace": True,
+    "pipeline": True,        # 重叠相邻步骤 (见 pipeline.py)
+    "db": RESULT_DB,         # 空字符串不写入结果库
+    "sim": {},               # 模拟后端参数 (latency, noise, seed)
+}
+
+# LED 类型别名 -> LED_TYPES 键
+LED_ALIASES = {key: key for key in LED_TYPES}
+LED_ALIASES.update({cfg["settle"]: key for key, cfg in LED_TYPES.items()})
+LED_ALIASES.update({cfg["name"]: key for key, cfg in LED_TYPES.items()})
+
+SUMMARY_HEADER = "作业,DUT,LED类型,电压(V),重复,状态,通过,总数,耗时(s),结果文件,错误"
+
+
+def load_job_file(path: str) -> list:
+    """读取作业文件 (.toml / .yaml / .yml), 返回合并默认值后的作业列表"""
+    abs_path = os.path.expanduser(path)
+    if abs_path.endswith((".yaml", ".yml")):
+        import yaml
+
+        with open(abs_path, "r", encoding="utf-8") as f:
+            spec = yaml.safe_load(f) or {}
+    else:
+        import tomllib
+
+        with open(abs_path, "rb") as f:
+            spec = tomllib.load(f)
+
+    defaults = dict(JOB_DEFAULTS, **spec.get("defaults", {}))
+    jobs = []
+    for i, entry in enumerate(spec.get("job", spec.get("jobs", [])), 1):
+        job = dict(defaults, **entry)
+        job.setdefault("name", f"job{i}")
+        if "voltage" in entry:
+            job["voltages"] = [entry["voltage"]]
+        if str(job["led"]) not in LED_ALIASES:
+            raise ValueError(f"{job['name']}: 未知 LED 类型 {job['led']}")
+        unknown = [item for item in job["items"] if item not in SCOPE_MEASURE_ITEMS]
+        if unknown:
+            raise ValueError(f"{job['name']}: 未知测量项 {', '.join(unknown)}")
+        if job["trigger"]:
+            conflicts = [key for key, used in (("channels", list(job["channels"]) != [4]),
+                                               ("items", [i for i in job["items"] if i != "mean"]),
+                                               ("waveform", job["waveform"]), ("adaptive", job["adaptive"]),
+                                               ("measure", job["measure"] != "scope")) if used]
+            if conflicts:
+                raise ValueError(f"{job['name']}: trigger 只测量 CH4 均值, 不能与 {', '.join(conflicts)} 同时使用")
+        jobs.append(job)
+    return jobs
+
+
+def expand_runs(job: dict) -> list:
+    """作业展开为 (电压, 重复序号) 列表"""
+    return [(float(v), r) for v in job["voltages"] for r in range(1, int(job["repeat"]) + 1)]
+
+
+def run_options(job: dict, led_config: dict, bench) -> dict:
+    """由作业生成 run_tests 选项 (非交互)"""
+    settle = None
+    if not job["fixed_wait"] and bench.mode != "subprocess":
+        # 只读电源电流时稳定检测也用电源电流 (没有示波器探头)
+        source = "supply" if job["measure"] == "supply" else None
+        settle = settle_params(led_config["settle"], **dict({"source": source}, **job["settle"]))
+    items = ["mean"] + [i for i in job["items"] if i != "mean"]
+    options = {"settle": settle, "channels": [int(ch) for ch in job["channels"]], "items": items,
+               "waveform": job["waveform"], "waveform_pass": job["waveform_pass"], "interactive": False,
+               "pipeline": job["pipeline"]}
+    if job["trigger"] and bench.mode != "subprocess":
+        options["trigger"] = trigger_params(led_config["settle"], **job["trigger_params"])
+    if job["archive"]:
+        options["archive"] = archive_params(**job["archive_params"])
+    if job["measure"] != "scope" and bench.mode != "subprocess":
+        options["readback"] = readback_params(led_config["settle"], policy=job["measure"], **job["readback"])
+    if job["adaptive"]:
+        options["sampling"] = sampling_params(**job["sampling"])
+    return options
+
+
+def run_job(job: dict, resume: bool = False, server=None) -> list:
+    """执行一个作业的全部运行, 返回汇总行 (字典列表); 出错的运行记录错误后继续
+
+    server: 运行指标服务 (见 metrics.MetricsServer), 每个作业一组指标
+    """
+    led_config = LED_TYPES[LED_ALIASES[str(job["led"])]]
+    config_file = job["config"] or led_config["file"]
+    multiplier = led_config["channel_multiplier"]
+    runs = expand_runs(job)
+    rows = []
+
+    def record(voltage, repeat, status, error="", outcome=None, elapsed=0.0):
+        rows.append({"job": job["name"], "dut": job["dut"], "led": led_config["name"], "voltage": voltage,
+                     "repeat": repeat, "status": status, "passed": outcome["passed"] if outcome else "",
+                     "total": outcome["total"] if outcome else "", "elapsed": elapsed,
+                     "output_file": outcome["output_file"] if outcome else "", "error": error})
+
+    def fail_all(error):
+        print(f"  错误: {error}")
+        for voltage, repeat in runs:
+            record(voltage, repeat, "错误", error)
+        return rows
+
+    bin_config = load_test_config(config_file, multiplier)
+    if not bin_config:
+        return fail_all(f"无法加载配置文件 {config_file}")
+    bin_names = available_bins(bin_config)
+    test_bins = select_bins(bin_names, job["levels"]) if job["levels"] else bin_names
+    if not test_bins:
+        return fail_all(f"没有可测试的档位 {job['levels']}")
+    sim = dict({"config_file": config_file, "multiplier": multiplier}, **job["sim"])
+    try:
+        res_port = job["res_port"] or default_res_port(job["backend"])
+        if job["backend"] != "sim" and not check_device(res_port):
+            return fail_all(f"程控电阻 {res_port} 不存在")
+        scope_profile = profile_params(led_config["settle"], **dict(
+            {"channels": job["channels"], "items": ["mean"] + [i for i in job["items"] if i != "mean"]},
+            **job["scope_profile"]))
+        bench = open_bench(res_port, job["visa_address"], job["scope_address"], mode=job["backend"], sim=sim,
+                           scope_profile=scope_profile)
+    except AmbiguousDeviceError as e:
+        # 只影响本作业, 队列中的其他作业继续
+        return fail_all(f"设备无法确定: {e}")
+    except Exception as e:
+        return fail_all(f"设备打开失败: {e}")
+
+    store = ResultStore(job["db"]) if job["db"] else None
+    metrics = None
+    if server is not None:
+        metrics = server.add(RunMetrics({"job": job["name"], "dut": job["dut"], "led": led_config["name"]}))
+    try:
+        for voltage, repeat in runs:
+            print(f"\n### {job['name']}: DUT {job['dut'] or '-'}, {led_config['name']}, {voltage}V, "
+                  f"第 {repeat}/{job['repeat']} 次 ({bench.mode})")
+            options = run_options(job, led_config, bench)
+            options["tracer"] = Tracer() if job["trace"] else NULL_TRACER
+
+            # 每次运行独立的结果日志, 重复序号参与运行标识
+            rid = run_id(config_file, job["dut"], multiplier=multiplier, voltage=voltage,
+                         channels=options["channels"], repeat=repeat)
+            journal = Journal(journal_path(RESULTS_DIR, "bin_test", rid), resume=resume)
+            options["journal"] = journal
+            if resume:
+                options["done"] = journal.load()
+            if metrics is not None:
+                options["metrics"] = metrics
+            if store is not None:
+                options["store"] = store
+                options["store_run"] = store.add_run("batch", led_config["name"], job["dut"], voltage)
+
+            start = time.monotonic()
+            try:
+                outcome = run_tests(bench, test_bins, bin_config, voltage, options)
+            except Exception as e:
+                bench.set_output(False)
+                record(voltage, repeat, "错误", f"{type(e).__name__}: {e}", elapsed=time.monotonic() - start)
+                continue
+            finally:
+                journal.close()
+            elapsed = time.monotonic() - start
+            if outcome is None:
+                record(voltage, repeat, "错误", "电源初始化失败", elapsed=elapsed)
+            else:
+                record(voltage, repeat, "完成", outcome=outcome, elapsed=elapsed)
+    finally:
+        if store is not None:
+            store.close()
+        bench.close()
+    return rows
+
+
+def save_summary(rows: list, job_file: str) -> str:
+    """所有运行的汇总写入 CSV"""
+    output_file = reserve_path(f"{RESULTS_DIR}/bin_batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    done = sum(1 for r in rows if r["status"] == "完成")
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write("# BIN 批量测试汇总\n")
+        f.write(f"# 时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(f"# 作业文件: {os.path.abspath(os.path.expanduser(job_file))}\n")
+        f.write(f"# 完成: {done}/{len(rows)}\n")
+        f.write("\n")
+        f.write(SUMMARY_HEADER + "\n")
+        for r in rows:
+            error = str(r["error"]).replace(",", ";")
+            f.write(f"{r['job']},{r['dut']},{r['led']},{r['voltage']},{r['repeat']},{r['status']},{r['passed']},"
+                    f"{r['total']},{r['elapsed']:.1f},{r['output_file']},{error}\n")
+    return output_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BIN 测试批量运行 (无人值守)")
+    parser.add_argument("job_file", help="作业文件 (.toml / .yaml)")
+    parser.add_argument("--resume", action="store_true", help="从结果日志继续, 跳过已记录的测试点")
+    parser.add_argument("--dry-run", action="store_true", help="只列出将要执行的运行")
+    parser.add_argument("--metrics-port", type=int,
+                        help=f"在该端口提供运行指标 /metrics (Prometheus 文本格式, 例如 {DEFAULT_METRICS_PORT})")
+    parser.add_argument("--metrics-host", default="127.0.0.1", help="指标监听地址 (默认 127.0.0.1)")
+    args = parser.parse_args()
+
+    try:
+        jobs = load_job_file(args.job_file)
+    except (OSError, ValueError) as e:
+        print(f"错误: 无法读取作业文件: {e}")
+        sys.exit(1)
+
+    total_runs = sum(len(expand_runs(job)) for job in jobs)
+    print(f"作业: {len(jobs)} 个, 共 {total_runs} 次运行")
+    for job in jobs:
+        voltages = ", ".join(f"{v}V" for v in job["voltages"])
+        print(f"  {job['name']}: DUT {job['dut'] or '-'}, {job['led']}, 档位 {job['levels'] or '全部'}, "
+              f"电压 {voltages}, 重复 {job['repeat']}, {job['backend']}")
+    if args.dry_run:
+        return
+
+    server = start_server(args.metrics_port, args.metrics_host) if args.metrics_port is not None else None
+    rows = []
+    start = time.monotonic()
+    try:
+        for job in jobs:
+            rows.extend(run_job(job, args.resume, server))
+    except KeyboardInterrupt:
+        print("\n已中断, 保存已完成运行的汇总 (可使用 --resume 继续)")
+    finally:
+        if server is not None:
+            server.close()
+    elapsed = time.monotonic() - start
+
+    output_file = save_summary(rows, args.job_file)
+    done = sum(1 for r in rows if r["status"] == "完成")
+    print(f"\n批量测试结束: {done}/{len(rows)} 次运行完成, 耗时 {elapsed:.1f}s")
+    for r in rows:
+        if r["status"] != "完成":
+            print(f"  {r['job']} {r['voltage']}V #{r['repeat']}: {r['error']}")
+    print(f"汇总已保存到: {output_file}")
+    if done < len(rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+上电特性测量 - 按实测的冲击和稳定时间设置等待
+
+DUT 的上电稳定过程事先未知，所以各测试流程使用保守的固定等待。本脚本对每个
+BIN 档位 (典型值电阻) 上电若干次，用示波器 CH4 单次触发 (低电平上升沿) 采集
+上电过程的完整波形，计算:
+
+- 冲击峰值和过冲 (峰值相对最终值)
+- 10% -> 90% 上升时间
+- 进入最终值 ±band 并保持的稳定时间
+
+时间均从触发点 (电流开始上升) 算起。各档位取最坏值，按全部档位的最长稳定
+时间 × margin 生成该 LED 类型的时序配置并保存 (settle.TIMING_PROFILE_FILE):
+
+- 稳定检测: 上电后开始轮询前的等待 min_on 和超时 timeout
+- 单次触发采集: 触发后测量窗口的开始时间
+
+之后 run_bin_test / batch / sweep / threshold / station 的 settle_params 和
+trigger_params 自动使用该配置 (命令行参数仍可覆盖)。
+
+用法:
+    python3 characterize.py --led 1
+    python3 characterize.py --led 2 --levels 1,2 --band 0.01 --repeat 5
+    python3 characterize.py --backend sim --sim-inrush 0.2 --levels 1
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime
+
+from discovery import AmbiguousDeviceError
+from instruments import DaemonBusyError, open_bench
+from run_bin_test import (LED_TYPES, RESULTS_DIR, available_bins, check_device, default_res_port,
+                          load_test_config, reserve_path, select_bins, set_resistance)
+from settle import SETTLE_DEFAULTS, TIMING_PROFILE_FILE, TRIGGER_DEFAULTS, save_timing_profile, settle_off
+from timing import NULL_TRACER, Tracer
+
+# 默认测量参数
+#   span: 触发后采集时长 (s), 需覆盖整个稳定过程
+#   level_ratio: 触发电平, 预期电流的比例 (低电平使触发点接近电流开始上升)
+#   band: 稳定判定容差带, 最终值的比例
+#   repeat: 每个档位上电次数
+#   margin: 实测最长稳定时间的余量倍数
+#   timeout: 上电后等待触发的超时 (s)
+CHARACTERIZE_DEFAULTS = {
+    "span": 1.0,
+    "level_ratio": 0.05,
+    "band": 0.01,
+    "repeat": 3,
+    "margin": 1.5,
+    "timeout": 3.0,
+}
+
+
+def capture_power_on(bench, config: dict, voltage: float, params: dict, settle: dict,
+                     tracer=NULL_TRACER) -> dict:
+    """一次上电并采集波形, 返回 waveform.power_on_metrics 的结果, 失败返回 None"""
+    import waveform
+
+    with tracer.span("supply_off"):
+        if not bench.set_output(False):
+            return None
+    with tracer.span("off_wait"):
+        settle_off(bench, settle)
+    with tracer.span("arm_capture"):
+        if not bench.arm_capture(4, params["level_ratio"] * config["current"], (0.0, params["span"])):
+            return None
+    with tracer.span("supply_on"):
+        if not bench.set_output(True, voltage):
+            return None
+    with tracer.span("capture"):
+        wf = bench.read_capture_waveform(4, params["timeout"])
+    if wf is None:
+        return None
+    return waveform.power_on_metrics(wf["samples"], wf["sample_rate"], wf["trigger_index"], params["band"])
+
+
+def characterize_level(bench, config: dict, voltage: float, params: dict, settle: dict,
+                       tracer=NULL_TRACER) -> dict:
+    """对一个档位上电 repeat 次, 返回各项的最坏值 (另含 "captures": 成功次数), 全部失败返回 None"""
+    with tracer.span("set_resistance", ohms=config["resistance"]):
+        if not set_resistance(bench, config["resistance"]):
+            return None
+    runs = []
+    for i in range(params["repeat"]):
+        metrics = capture_power_on(bench, config, voltage, params, settle, tracer)
+        if metrics is None:
+            print(f"  第 {i + 1} 次采集失败")
+            continue
+        runs.append(metrics)
+        rise = f"{metrics['rise_time'] * 1000:.1f}ms" if metrics["rise_time"] is not None else "--"
+        print(f"  第 {i + 1} 次: 峰值 {metrics['peak']:.1f} (过冲 {metrics['overshoot']:+.1%}), "
+              f"上升 {rise}, 稳定 {metrics['settle_time'] * 1000:.1f}ms")
+    if not runs:
+        return None
+    rises = [r["rise_time"] for r in runs if r["rise_time"] is not None]
+    return {
+        "final": sum(r["final"] for r in runs) / len(runs),
+        "peak": max(r["peak"] for r in runs),
+        "overshoot": max(r["overshoot"] for r in runs),
+        "rise_time": max(rises) if rises else None,
+        "settle_time": max(r["settle_time"] for r in runs),
+        "captures": len(runs),
+    }
+
+
+def derive_timing(levels: dict, led_type: str, params: dict) -> dict:
+    """按最长稳定时间 × margin 生成 settle / trigger 的覆盖参数"""
+    worst = max(level["settle_time"] for level in levels.values())
+    wait = round(worst * params["margin"], 3)
+    start, end = TRIGGER_DEFAULTS[led_type]["window"]
+    return {
+        "settle": {"min_on": wait, "timeout": max(SETTLE_DEFAULTS[led_type]["timeout"], round(2 * wait, 3))},
+        "trigger": {"window": [wait, round(wait + end - start, 3)]},
+    }
+
+
+def save_levels(levels: dict, led_name: str, params: dict, timing: dict) -> str:
+    output_file = reserve_path(f"{RESULTS_DIR}/bin_characterize_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write("# BIN 上电特性测量 (时间从触发点算起)\n")
+        f.write(f"# 时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(f"# LED类型: {led_name}\n")
+        f.write(f"# 稳定容差带: ±{params['band']:.1%}, 每档上电 {params['repeat']} 次, 余量 ×{params['margin']:g}\n")
+        f.write(f"# 时序配置: 上电等待 {timing['settle']['min_on']}s, "
+                f"触发窗口 {timing['trigger']['window'][0]}-{timing['trigger']['window'][1]}s\n")
+        f.write("\n")
+        f.write("档位,电阻(Ω),最终电流(mA),冲击峰值(mA),过冲(%),上升时间(ms),稳定时间(ms),采集次数\n")
+        for name, level in levels.items():
+            rise = f"{level['rise_time'] * 1000:.2f}" if level["rise_time"] is not None else ""
+            f.write(f"{name},{level['resistance']},{level['final']:.2f},{level['peak']:.2f},"
+                    f"{level['overshoot'] * 100:.2f},{rise},{level['settle_time'] * 1000:.2f},{level['captures']}\n")
+    return output_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BIN 上电冲击与稳定特性测量")
+    parser.add_argument("--led", choices=sorted(LED_TYPES), default="1", help="LED 类型: 1 大灯, 2 信号灯")
+    parser.add_argument("--config", help="BIN 配置文件 (默认按 LED 类型选择)")
+    parser.add_argument("--levels", default="", help="测量档位, 逗号分隔 (留空测量全部)")
+    parser.add_argument("--voltage", type=float, default=13.5, help="电源电压 (默认 13.5V)")
+    parser.add_argument("--band", type=float, help=f"稳定容差带, 最终值的比例 (默认 {CHARACTERIZE_DEFAULTS['band']})")
+    parser.add_argument("--span", type=float, help=f"触发后采集时长 (s, 默认 {CHARACTERIZE_DEFAULTS['span']})")
+    parser.add_argument("--repeat", type=int, help=f"每个档位上电次数 (默认 {CHARACTERIZE_DEFAULTS['repeat']})")
+    parser.add_argument("--margin", type=float, help=f"稳定时间余量倍数 (默认 {CHARACTERIZE_DEFAULTS['margin']})")
+    parser.add_argument("--no-save", action="store_true", help="只输出结果, 不保存时序配置")
+    parser.add_argument("--profile-file", help=f"时序配置文件 (默认 {TIMING_PROFILE_FILE}; 模拟后端不指定时不保存)")
+    parser.add_argument("--backend", choices=["session", "daemon", "sim"], default="session",
+                        help="设备控制方式 (默认 session; 子进程方式不支持波形采集)")
+    parser.add_argument("-p", "--res-port", help="程控电阻串口 (默认取发现缓存, 否则 /dev/ttyUSB0)")
+    parser.add_argument("-a", "--visa-address", help="电源 VISA 地址 (留空自动搜索)")
+    parser.add_argument("--dut", default="", help="DUT 序列号 (记录在时序配置中)")
+    parser.add_argument("--no-trace", action="store_true", help="不记录步骤耗时和追踪文件")
+    parser.add_argument("--sim-latency", type=float, default=1.0, help="模拟设备延迟倍数 (0 为全速)")
+    parser.add_argument("--sim-inrush", type=float, help="模拟上电冲击峰值, 档位电流的比例")
+    args = parser.parse_args()
+
+    params = dict(CHARACTERIZE_DEFAULTS)
+    params.update({k: v for k, v in {"band": args.band, "span": args.span, "repeat": args.repeat,
+                                     "margin": args.margin}.items() if v is not None})
+    led_config = LED_TYPES[args.led]
+    led_type = led_config["settle"]
+    config_file = args.config or led_config["file"]
+    bin_config = load_test_config(config_file, led_config["channel_multiplier"])
+    if not bin_config:
+        print("错误: 无法加载配置文件")
+        sys.exit(1)
+    bin_names = available_bins(bin_config)
+    test_bins = select_bins(bin_names, args.levels.split(",")) if args.levels else bin_names
+    if not test_bins:
+        print("错误: 没有可测量的档位")
+        sys.exit(1)
+    try:
+        args.res_port = args.res_port or default_res_port(args.backend)
+        if args.backend != "sim" and not check_device(args.res_port):
+            print(f"错误: 程控电阻 {args.res_port} 不存在")
+            sys.exit(1)
+
+        sim = {"config_file": config_file, "multiplier": led_config["channel_multiplier"], "latency": args.sim_latency,
+               "inrush": args.sim_inrush}
+        bench = open_bench(args.res_port, args.visa_address, mode=args.backend, sim=sim)
+    except (AmbiguousDeviceError, DaemonBusyError) as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+    if bench.mode == "subprocess":
+        bench.close()
+        print("错误: 子进程方式不支持波形采集, 需要 pyvisa 会话")
+        sys.exit(1)
+    # 断电等待使用内置默认值, 不受已有时序配置影响
+    settle = dict(SETTLE_DEFAULTS[led_type])
+    tracer = NULL_TRACER if args.no_trace else Tracer()
+
+    print(f"上电特性测量: {len(test_bins)} 个档位 × {params['repeat']} 次 ({bench.mode}), "
+          f"稳定容差带 ±{params['band']:.1%}")
+    start = time.monotonic()
+    levels = {}
+    try:
+        for bin_name in test_bins:
+            config = bin_config.get(f"{bin_name}_典型值")
+            if config is None:
+                continue
+            print(f"\n  [{bin_name}] {config['resistance']}Ω, 预期 {config['current']}...")
+            level = characterize_level(bench, config, args.voltage, params, settle, tracer)
+            if level is None:
+                print(f"  [{bin_name}] 没有成功的采集")
+                continue
+            levels[bin_name] = dict(level, resistance=config["resistance"])
+    finally:
+        bench.set_output(False)
+        bench.close()
+    if not levels:
+        print("错误: 没有成功测量的档位")
+        sys.exit(1)
+
+    timing = derive_timing(levels, led_type, params)
+    print(f"\n上电特性 (时间从触发点算起), 耗时 {time.monotonic() - start:.1f}s:")
+    print(f"{'档位':<14} {'峰值':>8} {'过冲':>7} {'上升(ms)':>9} {'稳定(ms)':>9}")
+    for name, level in levels.items():
+        rise = f"{level['rise_time'] * 1000:>9.1f}" if level["rise_time"] is not None else f"{'--':>9}"
+        print(f"{name:<14} {level['peak']:>8.1f} {level['overshoot']:>+7.1%} {rise} {level['settle_time'] * 1000:>9.1f}")
+    print(f"时序配置: 上电等待 {timing['settle']['min_on']}s (超时 {timing['settle']['timeout']}s), "
+          f"触发窗口 {timing['trigger']['window'][0]}-{timing['trigger']['window'][1]}s")
+    output_file = save_levels(levels, led_config["name"], params, timing)
+    print(f"结果已保存到: {output_file}")
+
+    profile_file = args.profile_file or (None if args.backend == "sim" else TIMING_PROFILE_FILE)
+    if args.no_save or profile_file is None:
+        print("时序配置未保存")
+    else:
+        save_timing_profile(led_type, dict(timing, measured_at=datetime.now().isoformat(timespec="seconds"),
+                                           dut=args.dut, voltage=args.voltage, band=params["band"],
+                                           levels=levels), profile_file)
+        print(f"时序配置已保存: {profile_file} ({led_type}), 之后的运行按此设置等待时间")
+
+    if tracer.spans:
+        print("\n步骤耗时:")
+        tracer.print_summary()
+        print(f"追踪文件: {', '.join(tracer.export(output_file))}")
+
+
+if __name__ == "__main__":
+    main()
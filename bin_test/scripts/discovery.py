@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+仪器发现缓存 - 按 USB VID/PID/序列号识别设备, 角色 -> 地址缓存在磁盘上
+
+原先每次运行都要扫描全部 VISA 资源 (子进程方式下还要启动 power_ctrl_cli.py -l)，
+程控电阻串口则靠手工输入 /dev/ttyUSB0，重新插拔后端口号变化就会接错设备。
+
+本模块为每个角色 (power / scope / resistor, 多夹具时可用 resistor.A 之类的名称)
+记录设备的 USB 指纹 (VID、PID、序列号) 和最后一次的地址:
+
+- 启动时只读取 /sys/bus/usb 校验缓存 (不打开任何设备): 指纹仍在则直接使用;
+  串口设备换了 ttyUSB 编号时按指纹找到新的端口
+- 缓存未命中时才完整扫描 (VISA 资源列表 / 串口列表), 并更新缓存
+
+串口转换芯片的 VID/PID 不能区分具体仪器, 程控电阻必须指定端口
+(assign 或在 run_bin_test.py 中输入), scan 不会自动指定; 之后按序列号跟踪,
+没有序列号的转换芯片按 USB 端口位置 (sysfs 路径, 如 1-1.2) 跟踪, 换插口后需重新指定。
+多个设备都与缓存的指纹相符时抛出 AmbiguousDeviceError, 不会任选一个。
+
+用法:
+    python3 discovery.py list                       # 缓存的角色及当前状态
+    python3 discovery.py scan                       # 重新扫描全部角色
+    python3 discovery.py assign resistor /dev/ttyUSB0
+    python3 discovery.py forget resistor
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+from datetime import datetime
+
+DISCOVERY_CACHE = "~/.claude/skills/bin_test/result/devices.json"
+
+# 角色 -> 设备类型和候选厂商 ID (大写十六进制, 无 0x 前缀)
+#   visa: USB-TMC 设备, 地址形如 USB0::0x2EC7::0x6700::<序列号>::INSTR
+#   serial: USB 串口, VID 为串口转换芯片 (FTDI / CH340 / CP210x / PL2303)
+DEVICE_ROLES = {
+    "power": {"kind": "visa", "vids": ("2EC7",), "name": "ITECH 电源"},
+    "scope": {"kind": "visa", "vids": ("0B21",), "name": "Yokogawa 示波器"},
+    "resistor": {"kind": "serial", "vids": ("0403", "1A86", "10C4", "067B"), "name": "RM550 程控电阻"},
+}
+
+USB_SYSFS = "/sys/bus/usb/devices"
+TTY_SYSFS = "/sys/class/tty"
+SERIAL_PATTERNS = ("ttyUSB*", "ttyACM*")
+
+
+class AmbiguousDeviceError(RuntimeError):
+    """多个设备都符合角色的指纹或候选条件, 无法确定是哪一台"""
+
+
+VISA_USB_RE = re.compile(r"^USB\d*::(0x[0-9A-Fa-f]+|\d+)::(0x[0-9A-Fa-f]+|\d+)::([^:]+)::", re.IGNORECASE)
+
+
+def role_spec(role: str) -> dict:
+    """角色配置, resistor.A 这类带后缀的角色使用 resistor 的配置"""
+    spec = DEVICE_ROLES.get(role.split(".")[0])
+    if spec is None:
+        raise ValueError(f"未知设备角色: {role}")
+    return spec
+
+
+def _hex_id(value) -> str:
+    if isinstance(value, int):
+        return f"{value:04X}"
+    value = str(value).strip()
+    number = int(value, 16) if value.lower().startswith("0x") or not value.isdigit() else int(value)
+    return f"{number:04X}"
+
+
+def visa_fingerprint(address: str) -> dict:
+    """从 USB-TMC VISA 地址解析指纹, 非 USB 地址返回 None"""
+    match = VISA_USB_RE.match(address or "")
+    if not match:
+        return None
+    return {"vid": _hex_id(match.group(1)), "pid": _hex_id(match.group(2)), "serial": match.group(3)}
+
+
+def _read_attr(path: str) -> str:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def _usb_attrs(path: str) -> dict:
+    """sysfs USB 设备目录的指纹, usb_path 为端口位置 (目录名, 如 1-1.2)"""
+    return {"vid": _read_attr(os.path.join(path, "idVendor")).upper(),
+            "pid": _read_attr(os.path.join(path, "idProduct")).upper(),
+            "serial": _read_attr(os.path.join(path, "serial")),
+            "usb_path": os.path.basename(path)}
+
+
+def sysfs_available() -> bool:
+    return os.path.isdir(USB_SYSFS)
+
+
+def usb_present(fingerprint: dict) -> bool:
+    """指纹对应的 USB 设备是否已连接 (只读 sysfs)"""
+    for path in glob.glob(os.path.join(USB_SYSFS, "*")):
+        if _matches(_usb_attrs(path), fingerprint):
+            return True
+    return False
+
+
+def _tty_usb_attrs(name: str) -> dict:
+    """tty 设备所属 USB 设备的指纹, 不是 USB 串口返回 None"""
+    path = os.path.realpath(os.path.join(TTY_SYSFS, name, "device"))
+    while path not in ("/", ""):
+        if os.path.exists(os.path.join(path, "idVendor")):
+            return _usb_attrs(path)
+        path = os.path.dirname(path)
+    return None
+
+
+def _matches(attrs: dict, fingerprint: dict) -> bool:
+    """设备是否符合指纹: 有序列号时比较序列号, 没有时比较 USB 端口位置"""
+    if not attrs or attrs["vid"] != fingerprint["vid"] or attrs["pid"] != fingerprint["pid"]:
+        return False
+    if fingerprint.get("serial"):
+        return attrs["serial"] == fingerprint["serial"]
+    # 没有序列号: 同型号的转换芯片只能按插口区分, 缺少端口位置时不认为相符
+    return bool(fingerprint.get("usb_path")) and attrs.get("usb_path") == fingerprint["usb_path"]
+
+
+def _identity(device: dict) -> tuple:
+    return device["vid"], device["pid"], device.get("serial") or device.get("usb_path", "")
+
+
+def serial_ports() -> list:
+    """列出 USB 串口: [{"address", "vid", "pid", "serial", "usb_path"}]"""
+    if os.path.isdir(TTY_SYSFS):
+        ports = []
+        for pattern in SERIAL_PATTERNS:
+            for path in sorted(glob.glob(os.path.join(TTY_SYSFS, pattern))):
+                attrs = _tty_usb_attrs(os.path.basename(path))
+                if attrs:
+                    ports.append(dict(attrs, address=f"/dev/{os.path.basename(path)}"))
+        return ports
+    try:
+        from serial.tools import list_ports
+    except ImportError:
+        return []
+    return [{"address": p.device, "vid": _hex_id(p.vid), "pid": _hex_id(p.pid), "serial": p.serial_number or "",
+             "usb_path": (p.location or "").split(":")[0]}
+            for p in list_ports.comports() if p.vid is not None]
+
+
+def visa_resources(rm=None) -> list:
+    """列出 USB-TMC VISA 资源: [{"address", "vid", "pid", "serial"}] (需要 pyvisa)"""
+    try:
+        if rm is None:
+            import pyvisa
+
+            rm = pyvisa.ResourceManager()
+        resources = rm.list_resources()
+    except Exception as e:
+        print(f"  VISA 扫描失败: {e}")
+        return []
+    devices = []
+    for address in resources:
+        fingerprint = visa_fingerprint(address)
+        if fingerprint:
+            devices.append(dict(fingerprint, address=address))
+    return devices
+
+
+def locate(entry: dict) -> str:
+    """不扫描 VISA, 只按 sysfs 校验缓存项, 返回当前地址; 设备不在返回 None
+
+    无 sysfs (非 Linux) 时无法校验, 串口检查设备文件存在, VISA 地址直接信任缓存。
+    多个串口都符合指纹时抛出 AmbiguousDeviceError。
+    """
+    if not sysfs_available():
+        if entry["kind"] == "serial":
+            return entry["address"] if os.path.exists(entry["address"]) else None
+        return entry["address"]
+    if entry["kind"] == "visa":
+        return entry["address"] if usb_present(entry) else None
+    # 串口: 重新插拔后端口号会变化, 按指纹查找;
+    # 原端口也和其他端口一起比较, 序列号重复的转换芯片不会被当成同一台
+    found = [port["address"] for port in serial_ports() if _matches(port, entry)]
+    if len(found) > 1:
+        raise AmbiguousDeviceError(f"多个串口都符合缓存的指纹 ({', '.join(found)}), "
+                                   f"请用 discovery.py assign 指定端口")
+    return found[0] if found else None
+
+
+class DeviceCache:
+    """角色 -> 设备指纹和地址的磁盘缓存 (JSON)"""
+
+    def __init__(self, path: str = DISCOVERY_CACHE):
+        self.path = os.path.expanduser(path)
+        self.entries = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"  设备缓存无法读取, 将重新扫描: {e}")
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+    def _record(self, role: str, device: dict) -> dict:
+        entry = {"kind": role_spec(role)["kind"], "address": device["address"], "vid": device["vid"],
+                 "pid": device["pid"], "serial": device.get("serial", ""), "usb_path": device.get("usb_path", ""),
+                 "seen": datetime.now().isoformat(timespec="seconds")}
+        self.entries[role] = entry
+        self.save()
+        return entry
+
+    def _others(self, role: str) -> set:
+        """其他角色占用的设备 (避免两个角色解析到同一台设备)"""
+        return {_identity(e) for r, e in self.entries.items() if r != role}
+
+    def assign(self, role: str, address: str) -> dict:
+        """把地址指定给角色, 记录其指纹; 地址不是可识别的 USB 设备返回 None"""
+        if role_spec(role)["kind"] == "visa":
+            fingerprint = visa_fingerprint(address)
+            device = dict(fingerprint, address=address) if fingerprint else None
+        else:
+            device = next((p for p in serial_ports() if os.path.realpath(p["address"]) == os.path.realpath(address)),
+                          None)
+        if device is None:
+            return None
+        return self._record(role, device)
+
+    def forget(self, role: str) -> bool:
+        if self.entries.pop(role, None) is None:
+            return False
+        self.save()
+        return True
+
+    def scan(self, role: str, rm=None) -> dict:
+        """完整扫描并更新缓存, 找不到返回 None
+
+        串口角色只找回之前指定过的设备, 不会把任意转换芯片自动指定给它。
+        有多个候选无法区分时抛出 AmbiguousDeviceError。
+        """
+        spec = role_spec(role)
+        devices = visa_resources(rm) if spec["kind"] == "visa" else serial_ports()
+        taken = self._others(role)
+        candidates = [d for d in devices if d["vid"] in spec["vids"] and _identity(d) not in taken]
+        previous = self.entries.get(role)
+        same = [d for d in candidates if previous and _matches(d, previous)]
+        if spec["kind"] == "serial":
+            if not same:
+                print(f"  {spec['name']}: 未指定端口, 请用 discovery.py assign {role} <端口> 指定")
+                return None
+            candidates = same
+        else:
+            # 同一台设备 (指纹相同) 优先
+            candidates = same or candidates
+        if len(candidates) > 1:
+            raise AmbiguousDeviceError(f"{spec['name']}: 有多个候选设备 "
+                                       f"({', '.join(d['address'] for d in candidates)}), "
+                                       f"请用 discovery.py assign {role} <地址> 指定")
+        if not candidates:
+            return None
+        return self._record(role, candidates[0])
+
+    def resolve(self, role: str, rm=None, rescan: bool = True) -> str:
+        """角色的当前地址: 先校验缓存, 未命中时扫描 (rescan=False 不扫描)
+
+        无法确定是哪一台设备时抛出 AmbiguousDeviceError, 不会任选一个。
+        """
+        entry = self.entries.get(role)
+        if entry:
+            try:
+                address = locate(entry)
+            except AmbiguousDeviceError as e:
+                raise AmbiguousDeviceError(f"{role_spec(role)['name']}: {e}") from None
+            if address:
+                if address != entry["address"]:
+                    print(f"  {role_spec(role)['name']}: {entry['address']} -> {address} (按序列号跟踪)")
+                    self._record(role, dict(entry, address=address))
+                return address
+        if not rescan:
+            return None
+        entry = self.scan(role, rm)
+        return entry["address"] if entry else None
+
+
+def resolve(role: str, rm=None, rescan: bool = True, path: str = DISCOVERY_CACHE) -> str:
+    """角色的当前地址 (见 DeviceCache.resolve)
+
+    缓存读写出错时返回 None; 无法区分设备时抛出 AmbiguousDeviceError。
+    """
+    try:
+        return DeviceCache(path).resolve(role, rm, rescan)
+    except OSError as e:
+        print(f"  设备发现失败: {e}")
+        return None
+
+
+def remember(role: str, address: str, path: str = DISCOVERY_CACHE) -> bool:
+    """记录手动指定的地址 (下次启动时按指纹跟踪)"""
+    try:
+        return DeviceCache(path).assign(role, address) is not None
+    except OSError as e:
+        print(f"  设备缓存写入失败: {e}")
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="仪器发现缓存 (USB VID/PID/序列号)")
+    parser.add_argument("--cache", default=DISCOVERY_CACHE, help=f"缓存文件 (默认 {DISCOVERY_CACHE})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="列出缓存的角色及当前状态")
+    scan = sub.add_parser("scan", help="重新扫描")
+    scan.add_argument("roles", nargs="*", help="角色 (默认全部)")
+    assign = sub.add_parser("assign", help="把地址指定给角色")
+    assign.add_argument("role")
+    assign.add_argument("address")
+    forget = sub.add_parser("forget", help="删除角色")
+    forget.add_argument("role")
+    args = parser.parse_args()
+
+    cache = DeviceCache(args.cache)
+    if args.command == "list":
+        if not cache.entries:
+            print("缓存为空")
+        for role, entry in sorted(cache.entries.items()):
+            try:
+                address = locate(entry)
+                state = "在线" if address == entry["address"] else (
+                    f"已移到 {address}" if address else "未连接")
+            except AmbiguousDeviceError as e:
+                state = f"无法区分: {e}"
+            print(f"{role:<12} {entry['address']:<44} {entry['vid']}:{entry['pid']} "
+                  f"{entry['serial'] or entry.get('usb_path') or '-':<16} {state}")
+    elif args.command == "scan":
+        for role in args.roles or list(DEVICE_ROLES):
+            try:
+                entry = cache.scan(role)
+            except (ValueError, AmbiguousDeviceError) as e:
+                print(f"错误: {e}")
+                continue
+            print(f"{role:<12} {entry['address'] if entry else '未找到'}")
+    elif args.command == "assign":
+        try:
+            entry = cache.assign(args.role, args.address)
+        except ValueError as e:
+            parser.error(str(e))
+        if entry is None:
+            parser.error(f"{args.address} 不是可识别的 USB 设备")
+        print(f"{args.role}: {entry['address']} ({entry['vid']}:{entry['pid']} "
+              f"{entry['serial'] or entry['usb_path'] or '-'})")
+    else:
+        print(f"{args.role}: {'已删除' if cache.forget(args.role) else '不在缓存中'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+仪器守护进程命令行客户端
+
+与各 skill 的 CLI 参数保持一致, 但指令发送给 instrument_daemon.py,
+不再每次打开/关闭设备。单条指令不申请租约, 有测试脚本独占设备时指令被拒绝。
+
+用法:
+    python3 instrument_client.py res -v 1000
+    python3 instrument_client.py power -v 13.5 -o on
+    python3 instrument_client.py power -o off
+    python3 instrument_client.py scope mean -c 4
+    python3 instrument_client.py scope shot -o screen.png
+    python3 instrument_client.py stop
+"""
+
+import argparse
+import sys
+
+from instrument_daemon import DEFAULT_SOCKET, DaemonBench
+
+
+def main():
+    parser = argparse.ArgumentParser(description="仪器守护进程客户端")
+    parser.add_argument("-s", "--socket", default=DEFAULT_SOCKET, help=f"套接字路径 (默认 {DEFAULT_SOCKET})")
+    sub = parser.add_subparsers(dest="device", required=True)
+
+    res = sub.add_parser("res", help="程控电阻")
+    res.add_argument("-v", "--value", required=True, help="电阻值, 支持数字或 OPEN")
+
+    power = sub.add_parser("power", help="电源")
+    power.add_argument("-v", "--voltage", type=float, help="设置电压 (V)")
+    power.add_argument("-o", "--output", choices=["on", "off"], help="打开或关闭输出")
+
+    scope = sub.add_parser("scope", help="示波器")
+    scope_sub = scope.add_subparsers(dest="action", required=True)
+    mean = scope_sub.add_parser("mean", help="读取通道均值")
+    mean.add_argument("-c", "--channel", type=int, default=4, help="通道号 (默认 4)")
+    shot = scope_sub.add_parser("shot", help="截图")
+    shot.add_argument("-o", "--output", default="screen.png", help="输出文件 (默认 screen.png)")
+
+    sub.add_parser("stop", help="停止守护进程")
+
+    args = parser.parse_args()
+
+    try:
+        bench = DaemonBench(args.socket, exclusive=False).open()
+    except OSError as e:
+        print(f"错误: 无法连接守护进程 {args.socket} ({e})", file=sys.stderr)
+        sys.exit(1)
+
+    with bench:
+        if args.device == "res":
+            ok = bench.set_resistance(args.value)
+        elif args.device == "power":
+            if args.output:
+                ok = bench.set_output(args.output == "on", args.voltage)
+            elif args.voltage is not None:
+                ok = bench.set_voltage(args.voltage)
+            else:
+                parser.error("power 需要 -v 或 -o 参数")
+        elif args.device == "scope" and args.action == "mean":
+            value = bench.measure_current(args.channel)
+            ok = value is not None
+            if ok:
+                print(value)
+        elif args.device == "scope":
+            path = bench.screenshot(args.output)
+            ok = path is not None
+            if ok:
+                print(path)
+        else:
+            ok = bench.call("shutdown") is None
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
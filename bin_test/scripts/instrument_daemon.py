@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+仪器守护进程 - 通过 Unix 域套接字共享设备连接
+
+守护进程持有电源/示波器的 VISA 句柄 (instruments.Bench)，程控电阻的设置
+也经由守护进程串行执行。各脚本作为客户端发送请求，每条指令只需一次套接字
+往返，多个脚本也不会再争抢同一台设备。
+
+测试脚本 (DaemonBench 默认) 连接后申请独占租约 (acquire), 持有期间其他客户端
+的设备指令被拒绝, 不会插入到某个测试点的断电、设电阻、上电、读数之间; 连接
+断开时租约自动释放。套接字文件权限为 0600, 只有启动守护进程的用户可以连接。
+
+协议: 每行一个 JSON 对象
+    请求: {"op": "set_resistance", "ohms": 1000}
+    应答: {"ok": true, "result": true} 或 {"ok": false, "error": "..."}
+
+支持的 op: ping, acquire, release, set_resistance, set_output, set_voltage, measure_current,
+measure_channels, waveform_stats, read_waveform, arm_capture, read_capture,
+read_capture_waveform, measure_supply_current, screenshot, shutdown
+
+用法:
+    python3 instrument_daemon.py -p /dev/ttyUSB0
+    python3 instrument_daemon.py -p /dev/ttyUSB0 -a 'USB0::0x2EC7::0x6700::...::INSTR'
+"""
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+from discovery import resolve
+from instruments import Bench, DaemonBusyError
+from scope_profile import SCOPE_PROFILES, profile_params
+
+# 默认套接字路径 (可通过环境变量覆盖)
+DEFAULT_SOCKET = os.environ.get("INSTRUMENT_DAEMON_SOCKET", "/tmp/instrument_daemon.sock")
+
+# 申请租约时默认最长等待时间 (s), 需小于客户端套接字超时
+LEASE_WAIT = 10.0
+
+# op -> (设备锁名称, Bench 方法名, 参数名列表)
+OPS = {
+    "set_resistance": ("resistor", "set_resistance", ["ohms"]),
+    "set_output": ("power", "set_output", ["on", "voltage"]),
+    "set_voltage": ("power", "set_voltage", ["voltage"]),
+    "measure_current": ("scope", "measure_current", ["channel"]),
+    "measure_channels": ("scope", "measure_channels", ["channels", "items"]),
+    "waveform_stats": ("scope", "waveform_stats", ["channel", "length", "settle_band"]),
+    "read_waveform": ("scope", "read_waveform", ["channel", "length"]),
+    "arm_capture": ("scope", "arm_capture", ["channel", "level", "window"]),
+    "read_capture": ("scope", "read_capture", ["channel", "timeout"]),
+    "read_capture_waveform": ("scope", "read_capture_waveform", ["channel", "timeout", "length"]),
+    "measure_supply_current": ("power", "measure_supply_current", []),
+    "screenshot": ("scope", "screenshot", ["path"]),
+}
+
+
+class InstrumentServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """每个客户端连接一个线程, 同一设备上的指令按设备锁串行执行
+
+    持有租约的客户端独占全部设备, 其他客户端的设备指令和 shutdown 返回错误。
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path: str, bench):
+        self.bench = bench
+        self.locks = {name: threading.Lock() for name in ("resistor", "power", "scope")}
+        self.lease = threading.Condition()
+        self.lease_owner = None
+        super().__init__(path, RequestHandler)
+
+    def server_bind(self):
+        # 绑定前收紧 umask, 套接字文件从创建起即为 0600
+        umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+
+    def acquire(self, client, wait: float) -> bool:
+        """client 申请独占租约, 最多等待 wait 秒"""
+        deadline = time.monotonic() + wait
+        with self.lease:
+            while self.lease_owner not in (None, client):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.lease.wait(remaining)
+            self.lease_owner = client
+            return True
+
+    def release(self, client):
+        with self.lease:
+            if self.lease_owner is client:
+                self.lease_owner = None
+                self.lease.notify_all()
+
+    def dispatch(self, request: dict, client=None) -> dict:
+        op = request.get("op")
+        if op == "ping":
+            return {"ok": True, "result": self.bench.mode}
+        if op == "acquire":
+            if self.acquire(client, float(request.get("wait", LEASE_WAIT))):
+                return {"ok": True, "result": True}
+            return {"ok": False, "error": "设备被其他客户端独占"}
+        if op == "release":
+            self.release(client)
+            return {"ok": True, "result": None}
+        if self.lease_owner not in (None, client):
+            return {"ok": False, "error": "设备被其他客户端独占"}
+        if op == "shutdown":
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return {"ok": True, "result": None}
+        if op not in OPS:
+            return {"ok": False, "error": f"未知指令: {op}"}
+
+        lock_name, method, params = OPS[op]
+        kwargs = {p: request[p] for p in params if p in request}
+        with self.locks[lock_name]:
+            try:
+                return {"ok": True, "result": getattr(self.bench, method)(**kwargs)}
+            except Exception as e:
+                return {"ok": False, "error": str(e)}
+
+
+def _jsonable(value):
+    """NumPy 数组/标量 (read_waveform 的采样点) 转为 JSON 列表/数值"""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"无法序列化 {type(value).__name__}")
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            for line in self.rfile:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    response = self.server.dispatch(json.loads(line), self)
+                except json.JSONDecodeError as e:
+                    response = {"ok": False, "error": f"无效请求: {e}"}
+                self.wfile.write(json.dumps(response, ensure_ascii=False, default=_jsonable).encode("utf-8") + b"\n")
+                self.wfile.flush()
+        finally:
+            # 客户端断开 (包括异常退出) 时释放其租约
+            self.server.release(self)
+
+
+class DaemonBench:
+    """守护进程客户端, 与 instruments.Bench 提供相同的方法
+
+    exclusive=True 时打开后申请独占租约, 直到 close() 为止其他客户端不能操作设备;
+    租约被占用时 open() 抛出 DaemonBusyError。
+    """
+
+    mode = "daemon"
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, timeout: float = 30.0, exclusive: bool = True):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.exclusive = exclusive
+        self.visa_address = None
+        self._sock = None
+        self._file = None
+        # 同一连接上的请求必须一问一答 (流水线方式下会有多个线程调用)
+        self._lock = threading.Lock()
+
+    def open(self):
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(self.timeout)
+        self._sock.connect(self.socket_path)
+        self._file = self._sock.makefile("rwb")
+        try:
+            self.call("ping")
+            if self.exclusive:
+                try:
+                    self.call("acquire", wait=LEASE_WAIT)
+                except RuntimeError as e:
+                    raise DaemonBusyError(f"仪器守护进程: {e}") from None
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    def close(self):
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
+            self._sock = None
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def call(self, op: str, **kwargs):
+        """发送一条请求并返回结果, 守护进程报错时抛出 RuntimeError"""
+        request = dict(kwargs, op=op)
+        with self._lock:
+            self._file.write(json.dumps(request).encode("utf-8") + b"\n")
+            self._file.flush()
+            line = self._file.readline()
+        if not line:
+            raise RuntimeError("守护进程已断开连接")
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise RuntimeError(response.get("error"))
+        return response.get("result")
+
+    def _call(self, op: str, default, **kwargs):
+        try:
+            return self.call(op, **kwargs)
+        except Exception as e:
+            print(f"  守护进程请求失败 ({op}): {e}")
+            return default
+
+    def set_resistance(self, ohms) -> bool:
+        return self._call("set_resistance", False, ohms=ohms)
+
+    def set_output(self, on: bool, voltage: float = None) -> bool:
+        return self._call("set_output", False, on=on, voltage=voltage)
+
+    def set_voltage(self, voltage: float) -> bool:
+        return self._call("set_voltage", False, voltage=voltage)
+
+    def measure_current(self, channel: int = 4) -> float:
+        return self._call("measure_current", None, channel=channel)
+
+    def measure_channels(self, channels: list, items: list = ("mean",)) -> dict:
+        record = self._call("measure_channels", None, channels=list(channels), items=list(items))
+        # JSON 对象的键为字符串, 还原为通道号
+        return {int(ch): values for ch, values in record.items()} if record else None
+
+    def waveform_stats(self, channel: int = 4, length: int = None, settle_band: float = None) -> dict:
+        # 波形在守护进程内统计, 只传回结果
+        return self._call("waveform_stats", None, channel=channel, length=length, settle_band=settle_band)
+
+    def read_waveform(self, channel: int = 4, length: int = None) -> dict:
+        # 采样点以 JSON 列表传输, 只用于失败点归档这类低频读取
+        wf = self._call("read_waveform", None, channel=channel, length=length)
+        if wf is not None:
+            import numpy as np
+
+            wf["samples"] = np.asarray(wf["samples"], dtype=float)
+        return wf
+
+    def arm_capture(self, channel: int, level: float, window: tuple) -> bool:
+        return self._call("arm_capture", False, channel=channel, level=level, window=list(window))
+
+    def read_capture(self, channel: int = 4, timeout: float = 5.0) -> float:
+        return self._call("read_capture", None, channel=channel, timeout=timeout)
+
+    def read_capture_waveform(self, channel: int = 4, timeout: float = 5.0, length: int = None) -> dict:
+        wf = self._call("read_capture_waveform", None, channel=channel, timeout=timeout, length=length)
+        if wf is not None:
+            import numpy as np
+
+            wf["samples"] = np.asarray(wf["samples"], dtype=float)
+        return wf
+
+    def measure_supply_current(self) -> float:
+        return self._call("measure_supply_current", None)
+
+    def screenshot(self, path: str) -> str:
+        return self._call("screenshot", None, path=os.path.abspath(os.path.expanduser(path)))
+
+
+def serve(socket_path: str, bench):
+    """在 socket_path 上提供服务, 直到收到 shutdown 或 Ctrl-C"""
+    if os.path.exists(socket_path):
+        # 清理上次异常退出留下的套接字文件 (若仍有守护进程在监听则拒绝启动)
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socket_path)
+            probe.close()
+            print(f"错误: 守护进程已在运行 ({socket_path})")
+            return False
+        except OSError:
+            os.unlink(socket_path)
+
+    server = InstrumentServer(socket_path, bench)
+    print(f"仪器守护进程已启动: {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="仪器守护进程 (Unix 域套接字)")
+    parser.add_argument("-p", "--port", help="程控电阻串口号 (例如 /dev/ttyUSB0, 留空取发现缓存)")
+    parser.add_argument("-a", "--address", help="电源 VISA 地址 (留空自动搜索 ITECH)")
+    parser.add_argument("--scope", help="示波器 VISA 地址 (留空自动搜索 Yokogawa)")
+    parser.add_argument("-s", "--socket", default=DEFAULT_SOCKET, help=f"套接字路径 (默认 {DEFAULT_SOCKET})")
+    parser.add_argument("--scope-profile", choices=sorted(SCOPE_PROFILES), default="headlight",
+                        help="示波器测量配置 (见 scope_profile.py, 默认 headlight)")
+    parser.add_argument("--scope-reapply", action="store_true", help="不读回示波器当前设置, 重新发送全部设置")
+    args = parser.parse_args()
+
+    try:
+        bench = Bench(args.port or resolve("resistor"), args.address, args.scope,
+                      scope_profile=profile_params(args.scope_profile), reapply=args.scope_reapply).open()
+    except Exception as e:
+        print(f"错误: 设备打开失败: {e}")
+        sys.exit(1)
+
+    print(f"电源: {bench.visa_address}")
+    try:
+        if not serve(args.socket, bench):
+            sys.exit(1)
+    finally:
+        bench.close()
+
+
+if __name__ == "__main__":
+    main()
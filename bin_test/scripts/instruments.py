@@ -0,0 +1,822 @@
+#!/usr/bin/env python3
+"""
+仪器会话层 - 在整个测试过程中保持设备连接
+
+run_bin_test.py 原先每个动作都通过 `uv run` 启动一个新进程，每次都要重新
+导入 pyvisa 并重新打开设备。本模块在进程内一次性打开：
+
+- 程控电阻 RM550 (串口, 使用 res_ctrl 中的 RM550 驱动, 不在本模块重写串口协议)
+- 电源 ITECH IT6722 (VISA)
+- 示波器 Yokogawa DLM (VISA)
+
+并在整个测试期间保持连接。找不到 res_ctrl 驱动时程控电阻仍每次调用
+resistance_cli.py (ResistorCli)。未指定 VISA 地址时按发现缓存 (discovery.py) 查找。
+若缺少依赖或设备打开失败，则回退到原来的子进程方式 (SubprocessBench)，两者
+对外提供相同的方法。
+"""
+
+import importlib
+import os
+import subprocess
+import sys
+import time
+
+from discovery import AmbiguousDeviceError, resolve
+
+# Skill scripts 目录路径 (子进程回退方式使用; res_ctrl 目录同时提供 RM550 驱动)
+PROGRAMMABLE_RESISTOR_SCRIPTS = "~/.claude/skills/programmable-resistor/scripts/res_ctrl"
+POWER_SUPPLY_SCRIPTS = "~/.claude/skills/power-supply/scripts/power_ctrl"
+OSCILLOSCOPE_SCRIPTS = "~/.claude/skills/oscilloscope/scripts/yokogawa"
+
+# res_ctrl 中的 RM550 驱动 (模块名, 类名)
+#   驱动类(port) 打开串口, set_resistance(阻值或 "OPEN") 失败时返回 False 或抛出异常, close() 关闭串口
+RM550_DRIVER = ("rm550", "RM550")
+
+# 默认测量通道
+DEFAULT_SCOPE_CHANNEL = 4
+
+# 示波器测量项 -> DLM 测量参数名
+SCOPE_MEASURE_ITEMS = {
+    "mean": "AVERage",
+    "min": "MINimum",
+    "max": "MAXimum",
+    "rms": "RMS",
+}
+
+
+# 单次触发采集 (DLM 通信接口指令)
+#   触发位置在屏幕 10% 处, 测量时间范围以格为单位 (屏幕为 -5 ~ +5 格)
+SCOPE_TRIGGER_POSITION = 10
+SCOPE_DIVISIONS = 10
+SCOPE_TDIV_STEPS = (1, 2, 5)
+SCOPE_RUN_BIT = 0x01  # :STATus:CONDition? 的 RUN 位
+# :SSTart? <等待时间>: 以单次触发模式开始采集并等待完成, 等待时间以 10 ms 为单位 (1 ~ 36000);
+#   采集完成应答 0, 超时应答 1
+SCOPE_SSTART_UNIT = 0.01
+SCOPE_SSTART_MAX = 36000
+# 单次触发采集会改变的设置, 布防前读回, 采集后按此顺序原样写回 (先触发源再电平, 最后触发模式)
+SCOPE_TRIGGER_STATE = (":TIMebase:TDIV", ":TRIGger:POSition", ":TRIGger:SIMPle:SOURce", ":TRIGger:SIMPle:SLOPe",
+                       ":TRIGger:SIMPle:LEVel", ":MEASure:TRANge", ":TRIGger:MODE")
+
+
+def scope_tdiv(span: float) -> float:
+    """覆盖 span 秒 (触发后) 所需的最小 1-2-5 时基 (s/div)"""
+    needed = span / (SCOPE_DIVISIONS * (1 - SCOPE_TRIGGER_POSITION / 100))
+    exponent = -9
+    while True:
+        for step in SCOPE_TDIV_STEPS:
+            tdiv = step * 10.0 ** exponent
+            if tdiv >= needed:
+                return tdiv
+        exponent += 1
+
+
+def run_command(cmd: str, cwd: str = None) -> bool:
+    """执行命令"""
+    try:
+        result = subprocess.run(cmd, shell=True, cwd=cwd, capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"  失败: {result.stderr}")
+            return False
+        return True
+    except Exception as e:
+        print(f"  错误: {e}")
+        return False
+
+
+class ResistorCli:
+    """RM550 程控电阻, 每次设置调用一次 res_ctrl 的 resistance_cli.py
+
+    CLI 由 res_ctrl 中的 RM550 驱动完成串口通信并以退出码报告结果; 设置失败
+    (包括设备无应答) 时返回 False, 不会在错误的阻值下继续测试。
+    """
+
+    def __init__(self, port: str):
+        self.port = port
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def set_resistance(self, ohms) -> bool:
+        scripts_path = os.path.expanduser(PROGRAMMABLE_RESISTOR_SCRIPTS)
+        return run_command(f"cd {scripts_path} && uv run resistance_cli.py -p {self.port} -v {ohms}")
+
+
+class ResistorSession:
+    """RM550 程控电阻串口会话, 串口在 open() 时由 res_ctrl 的 RM550 驱动打开一次
+
+    驱动负责串口协议和应答检查; 找不到驱动 (res_ctrl 未安装或缺少 pyserial) 时
+    回退为每次设置调用一次 resistance_cli.py (ResistorCli)。
+    """
+
+    def __init__(self, port: str):
+        self.port = port
+        self._driver = None
+        self._cli = None
+
+    def open(self):
+        scripts_path = os.path.expanduser(PROGRAMMABLE_RESISTOR_SCRIPTS)
+        if scripts_path not in sys.path:
+            sys.path.insert(0, scripts_path)
+        module_name, class_name = RM550_DRIVER
+        try:
+            driver_class = getattr(importlib.import_module(module_name), class_name)
+        except (ImportError, AttributeError) as e:
+            print(f"  未找到 res_ctrl RM550 驱动 ({e}), 程控电阻改用 resistance_cli.py")
+            self._cli = ResistorCli(self.port)
+            return
+        self._driver = driver_class(self.port)
+
+    def close(self):
+        if self._driver is not None:
+            try:
+                self._driver.close()
+            finally:
+                self._driver = None
+
+    def set_resistance(self, ohms) -> bool:
+        if self._driver is None:
+            return self._cli.set_resistance(ohms)
+        try:
+            return self._driver.set_resistance(ohms) is not False
+        except Exception as e:
+            print(f"  程控电阻设置失败: {e}")
+            return False
+
+
+class PowerSupplySession:
+    """ITECH IT6722 电源 VISA 会话 (SCPI)
+
+    会话缓存电源的设定状态 (电压、限流、输出), 与缓存相同的设定不再发送, 其余
+    设定合并为一次以分号连接的 SCPI 写入, 写入后查询错误队列 (SYST:ERR?), 电源
+    接受了设定才更新缓存。远程模式 (SYST:REM) 下前面板被锁定, 缓存只会因本会话
+    的写入而改变; 写入出错或被拒绝后缓存作废, 下次设定全部重新发送。
+    状态可能被其他程序改变时调用 resync() 从电源读回。
+    """
+
+    def __init__(self, visa_address: str = None, rm=None):
+        self.visa_address = visa_address
+        self._rm = rm
+        self._inst = None
+        # SCPI 命令 -> 最后写入 (或读回) 的值, 未知的状态不在其中
+        self._state = {}
+
+    def open(self):
+        import pyvisa
+
+        if self._rm is None:
+            self._rm = pyvisa.ResourceManager()
+        address = self.visa_address or resolve("power", self._rm)
+        if not address:
+            raise RuntimeError("未找到 ITECH 电源 VISA 设备")
+        self.visa_address = address
+        self._inst = self._rm.open_resource(address)
+        self._inst.write("SYST:REM")
+        self.resync()
+
+    def close(self):
+        if self._inst is not None:
+            try:
+                self._inst.write("SYST:LOC")
+            finally:
+                self._inst.close()
+                self._inst = None
+                self._state = {}
+
+    def write(self, cmd: str):
+        self._inst.write(cmd)
+
+    def query(self, cmd: str) -> str:
+        return self._inst.query(cmd).strip()
+
+    def check_error(self):
+        """读取错误队列, 有指令被电源拒绝 (如超出量程的电压) 时清空队列并抛出 RuntimeError"""
+        reply = self.query("SYST:ERR?")
+        if reply.split(",", 1)[0].strip() in ("0", "+0"):
+            return
+        errors = [reply]
+        # 一次合并写入可能产生多条错误, 读到 0 为止, 避免残留到下次检查
+        for _ in range(10):
+            more = self.query("SYST:ERR?")
+            if more.split(",", 1)[0].strip() in ("0", "+0"):
+                break
+            errors.append(more)
+        raise RuntimeError(f"电源拒绝指令: {'; '.join(errors)}")
+
+    def resync(self) -> dict:
+        """一次查询读回电压、限流和输出状态, 替换缓存; 读回失败时清空缓存 (下次全部发送)"""
+        self._state = {}
+        try:
+            volt, curr, outp = self.query("VOLT?;:CURR?;:OUTP?").split(";")
+            self._state = {"VOLT": float(volt), "CURR": float(curr), "OUTP": outp.strip().upper() in ("1", "ON")}
+        except Exception as e:
+            print(f"  电源状态读回失败 ({e}), 下次设定全部发送")
+        return dict(self._state)
+
+    def apply(self, voltage: float = None, current: float = None, output: bool = None) -> int:
+        """设定电压 / 限流 / 输出 (None 不改变), 只发送与缓存不同的设定, 返回发送的命令数
+
+        打开输出时先设定电压和限流, 关闭输出时先关闭输出。电源拒绝任何一条设定时
+        抛出 RuntimeError, 缓存清空 (不知道哪些设定已生效)。
+        """
+        wanted = {"VOLT": voltage, "CURR": current, "OUTP": output}
+        changes = {cmd: value for cmd, value in wanted.items()
+                   if value is not None and self._state.get(cmd) != value}
+        if not changes:
+            return 0
+        order = ["OUTP", "VOLT", "CURR"] if changes.get("OUTP") is False else ["VOLT", "CURR", "OUTP"]
+        commands = [f":{cmd} {('ON' if changes[cmd] else 'OFF') if cmd == 'OUTP' else changes[cmd]}"
+                    for cmd in order if cmd in changes]
+        try:
+            self.write(";".join(commands))
+            self.check_error()
+        except Exception:
+            self._state = {}
+            raise
+        self._state.update(changes)
+        return len(commands)
+
+    def set_voltage(self, voltage: float):
+        self.apply(voltage=voltage)
+
+    def set_current_limit(self, current: float):
+        self.apply(current=current)
+
+    def set_output(self, on: bool, voltage: float = None):
+        self.apply(voltage=voltage, output=on)
+
+    def measure_current(self) -> float:
+        return float(self.query("MEAS:CURR?"))
+
+    def measure_voltage(self) -> float:
+        return float(self.query("MEAS:VOLT?"))
+
+
+class ScopeSession:
+    """Yokogawa DLM 示波器 VISA 会话 (SCPI)
+
+    给出 profile (见 scope_profile.py) 时, 打开后应用一次测量配置: 一次查询读回
+    当前设置, 只发送不同的设置; reapply=True 时不读回, 全部重新发送。
+    """
+
+    def __init__(self, visa_address: str = None, rm=None, timeout_ms: int = 10000,
+                 profile: dict = None, reapply: bool = False):
+        self.visa_address = visa_address
+        self.timeout_ms = timeout_ms
+        self.profile = profile
+        self.reapply = reapply
+        self._rm = rm
+        self._inst = None
+        self._enabled_items = set()
+        # 布防前的触发相关设置 {指令: 值}, 未布防时为 None
+        self._saved_trigger = None
+        # read_waveform 的设置和换算参数 ((通道, 长度), end, range, offset, sample_rate)
+        self._wave_setup = None
+
+    def open(self):
+        import pyvisa
+
+        if self._rm is None:
+            self._rm = pyvisa.ResourceManager()
+        address = self.visa_address or resolve("scope", self._rm)
+        if not address:
+            raise RuntimeError("未找到 Yokogawa 示波器 VISA 设备")
+        self.visa_address = address
+        self._inst = self._rm.open_resource(address)
+        self._inst.timeout = self.timeout_ms
+        # 关闭应答头, 查询只返回数值
+        self._inst.write(":COMMunicate:HEADer OFF")
+        self._inst.write(":MEASure:MODE ON")
+        if self.profile:
+            self.apply_profile(self.profile, force=self.reapply)
+
+    def close(self):
+        if self._inst is not None:
+            self._inst.close()
+            self._inst = None
+
+    def write(self, cmd: str):
+        self._inst.write(cmd)
+
+    def query(self, cmd: str) -> str:
+        return self._inst.query(cmd).strip()
+
+    def check_error(self):
+        """读取错误队列, 有指令被示波器拒绝时抛出 RuntimeError (而不是在错误的设置下继续测量)"""
+        reply = self.query(":STATus:ERRor?")
+        code = reply.split(",", 1)[0].strip()
+        if code not in ("0", "+0"):
+            raise RuntimeError(f"示波器拒绝指令: {reply}")
+
+    def apply_profile(self, profile: dict, force: bool = False) -> int:
+        """应用测量配置, 返回发送的命令数
+
+        先用一次查询读回全部设置, 只发送与示波器当前状态不同的命令 (一次写入);
+        force=True 或读回失败时全部发送。发送后检查错误队列。
+        """
+        from scope_profile import profile_settings, setting_matches, setting_query
+
+        wanted = profile_settings(profile)
+        delta = dict(wanted)
+        if not force:
+            try:
+                replies = self.query(";".join(setting_query(k) for k in wanted)).split(";")
+                if len(replies) == len(wanted):
+                    delta = {k: cmd for (k, cmd), reply in zip(wanted.items(), replies)
+                             if not setting_matches(cmd, reply)}
+            except Exception as e:
+                print(f"  示波器设置读回失败 ({e}), 全部重新发送")
+                try:
+                    # 读回失败留下的错误不能算到下面的设置头上
+                    self.query(":STATus:ERRor?")
+                except Exception:
+                    pass
+        if delta:
+            self.write(";".join(delta.values()))
+            self.check_error()
+            self._wave_setup = None
+        # 测量项已读回为打开或刚刚打开, measure_channels 不必再发送
+        self._enabled_items.update((ch, item) for ch in profile["channels"] for item in profile["items"])
+        self.profile = profile
+        return len(delta)
+
+    def read_mean(self, channel: int = DEFAULT_SCOPE_CHANNEL) -> float:
+        return float(self.query(f":MEASure:CHANnel{channel}:AVERage:VALue?"))
+
+    def measure_channels(self, channels: list, items: list = ("mean",)) -> dict:
+        """一次 SCPI 事务读取多个通道的多个测量项
+
+        Returns:
+            {通道: {测量项: 数值}}, 例如 {1: {"mean": 0.70, "max": 0.72}, 4: {...}}
+        """
+        pairs = [(ch, item) for ch in channels for item in items]
+        # 首次使用的测量项需要先在示波器上打开
+        enable = [f":MEASure:CHANnel{ch}:{SCOPE_MEASURE_ITEMS[item]}:STATe ON"
+                  for ch, item in pairs if (ch, item) not in self._enabled_items]
+        if enable:
+            self.write(";".join(enable))
+            self._enabled_items.update(pairs)
+
+        query = ";".join(f":MEASure:CHANnel{ch}:{SCOPE_MEASURE_ITEMS[item]}:VALue?" for ch, item in pairs)
+        values = self.query(query).split(";")
+        if len(values) != len(pairs):
+            raise ValueError(f"应答数量不匹配: {len(values)}/{len(pairs)}")
+
+        record = {ch: {} for ch in channels}
+        for (ch, item), value in zip(pairs, values):
+            record[ch][item] = float(value)
+        return record
+
+    def read_block(self, channel: int = DEFAULT_SCOPE_CHANNEL, length: int = None, fresh: bool = False) -> dict:
+        """以二进制 WORD 格式读取一个波形块, 不换算
+
+        Args:
+            fresh: 先等待一次新的采集完成 (:SSTart?, 读完后恢复原触发模式并 :STARt), 并重新
+                   查询量程、偏移和采样率, 不沿用上一次的设置; 连续记录时每块都是不同的采集
+
+        Returns:
+            {"raw": int16 数组 (引用接收缓冲区), "scale", "offset": 物理值 = raw × scale + offset,
+             "sample_rate": 采样率 (S/s), "channel": 通道}
+        """
+        import numpy as np
+
+        import waveform
+
+        if fresh:
+            # :SSTart? 会把触发模式改为单次, 读完后恢复; 等待时间取 VISA 超时的一半
+            trigger_mode = self.query(":TRIGger:MODE?")
+            wait = min(SCOPE_SSTART_MAX, max(1, round(self.timeout_ms / 2000 / SCOPE_SSTART_UNIT)))
+            if self.query(f":SSTart? {wait}").strip() not in ("0", "+0"):
+                self.write(f":TRIGger:MODE {trigger_mode};:STARt")
+                raise RuntimeError("等待示波器采集超时")
+            self._wave_setup = None
+        # 同一通道和长度连续读取时, 设置和换算参数沿用上一次 (时基或配置改变时重新查询)
+        if self._wave_setup is None or self._wave_setup[0] != (channel, length):
+            self.write(f":WAVeform:TRACe {channel};:WAVeform:FORMat WORD;:WAVeform:BYTeorder LSBFirst")
+            total = int(float(self.query(":WAVeform:LENGth?")))
+            end = min(total, length) if length else total
+            self.write(f":WAVeform:STARt 0;:WAVeform:END {end - 1}")
+            range_, offset, sample_rate = (float(v) for v in self.query(
+                ":WAVeform:RANGe?;:WAVeform:OFFSet?;:WAVeform:SRATe?").split(";"))
+            self._wave_setup = ((channel, length), end, range_, offset, sample_rate)
+        _, end, range_, offset, sample_rate = self._wave_setup
+
+        self.write(":WAVeform:SEND?")
+        block = waveform.parse_block(self._inst.read_raw())
+        if fresh:
+            self.write(f":TRIGger:MODE {trigger_mode};:STARt")
+        return {"raw": np.frombuffer(block, dtype="<i2"), "scale": range_ / waveform.WORD_DIVISION,
+                "offset": offset, "sample_rate": sample_rate, "channel": channel}
+
+    def read_waveform(self, channel: int = DEFAULT_SCOPE_CHANNEL, length: int = None) -> dict:
+        """读取一个波形块并换算为物理值
+
+        Returns:
+            {"samples": NumPy 数组 (物理值), "sample_rate": 采样率 (S/s), "channel": 通道}
+        """
+        block = self.read_block(channel, length)
+        samples = block["raw"] * block["scale"] + block["offset"]
+        return {"samples": samples, "sample_rate": block["sample_rate"], "channel": channel}
+
+    def arm_single(self, channel: int, level: float, window: tuple):
+        """设置通道上升沿单次触发并开始等待触发
+
+        测量时间范围设为触发后 window = (开始, 结束) 秒, 时基按 window 选择。布防前读回
+        SCOPE_TRIGGER_STATE 中的设置, 由 disarm() 原样写回; 指令被拒绝时恢复并抛出 RuntimeError。
+        """
+        start, end = window
+        tdiv = scope_tdiv(end)
+        if self._saved_trigger is None:
+            values = self.query(";".join(f"{cmd}?" for cmd in SCOPE_TRIGGER_STATE)).split(";")
+            if len(values) != len(SCOPE_TRIGGER_STATE):
+                raise ValueError(f"触发设置应答数量不匹配: {len(values)}/{len(SCOPE_TRIGGER_STATE)}")
+            self._saved_trigger = dict(zip(SCOPE_TRIGGER_STATE, (v.strip() for v in values)))
+        # 触发点在 -5 + 10% × 10 格处
+        origin = -SCOPE_DIVISIONS / 2 + SCOPE_DIVISIONS * SCOPE_TRIGGER_POSITION / 100
+        self._wave_setup = None
+        try:
+            self.write(";".join([
+                f":TIMebase:TDIV {tdiv:g}",
+                f":TRIGger:POSition {SCOPE_TRIGGER_POSITION}",
+                f":TRIGger:SIMPle:SOURce {channel}",
+                ":TRIGger:SIMPle:SLOPe RISE",
+                f":TRIGger:SIMPle:LEVel {level:g}",
+                f":MEASure:TRANge {origin + start / tdiv:g},{origin + end / tdiv:g}",
+                ":TRIGger:MODE SINGle",
+            ]))
+            self.check_error()
+        except Exception:
+            # 布防失败时恢复原设置, 不把示波器留在单次触发状态
+            try:
+                self.disarm()
+            except Exception:
+                pass
+            raise
+        self.write(":STARt")
+
+    def wait_triggered(self, timeout: float) -> bool:
+        """等待单次采集完成 (RUN 位清零)"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not int(self.query(":STATus:CONDition?")) & SCOPE_RUN_BIT:
+                return True
+            time.sleep(0.01)
+        return False
+
+    def disarm(self):
+        """恢复布防前的时基、触发和测量范围设置, 并重新开始采集"""
+        if self._saved_trigger is None:
+            return
+        saved, self._saved_trigger = self._saved_trigger, None
+        self._wave_setup = None
+        self.write(";".join([f"{cmd} {value}" for cmd, value in saved.items()] + [":STARt"]))
+        self.check_error()
+
+    def read_triggered(self, channel: int, timeout: float) -> float:
+        """等待触发并读取测量时间范围内的均值, 超时返回 None; 之后恢复连续采集"""
+        try:
+            if not self.wait_triggered(timeout):
+                return None
+            return self.read_mean(channel)
+        finally:
+            self.disarm()
+
+    def read_triggered_waveform(self, channel: int, timeout: float, length: int = None) -> dict:
+        """等待触发并读取整个采集的原始波形, 超时返回 None; 之后恢复连续采集
+
+        Returns:
+            read_waveform 的结果, 另加 "trigger_index": 触发点在采样点中的位置
+        """
+        try:
+            if not self.wait_triggered(timeout):
+                return None
+            wf = self.read_waveform(channel, length)
+            total = int(float(self.query(":WAVeform:LENGth?")))
+            wf["trigger_index"] = int(total * SCOPE_TRIGGER_POSITION / 100)
+            return wf
+        finally:
+            self.disarm()
+
+    def screenshot(self, path: str) -> str:
+        """截图并保存为 PNG"""
+        self._inst.write(":IMAGe:FORMat PNG")
+        data = self._inst.query_binary_values(":IMAGe:SEND?", datatype="B", container=bytes)
+        abs_path = os.path.expanduser(path)
+        with open(abs_path, "wb") as f:
+            f.write(data)
+        return abs_path
+
+
+class Bench:
+    """进程内仪器会话集合, 整个测试期间保持连接
+
+    多个夹具共用一台示波器时, 可传入已打开的 scope 会话, 此时由调用方负责
+    打开和关闭该会话。
+    """
+
+    mode = "session"
+
+    def __init__(self, res_port: str = None, visa_address: str = None, scope_address: str = None,
+                 scope: ScopeSession = None, scope_profile: dict = None, reapply: bool = False):
+        self.res_port = res_port
+        self.resistor = ResistorSession(res_port) if res_port else None
+        self.power = PowerSupplySession(visa_address)
+        self.scope = scope or ScopeSession(scope_address, profile=scope_profile, reapply=reapply)
+        self._owns_scope = scope is None
+
+    def _sessions(self) -> list:
+        sessions = [self.resistor, self.power, self.scope if self._owns_scope else None]
+        return [s for s in sessions if s is not None]
+
+    @property
+    def visa_address(self) -> str:
+        return self.power.visa_address
+
+    def open(self):
+        import pyvisa
+
+        rm = pyvisa.ResourceManager()
+        self.power._rm = rm
+        self.scope._rm = self.scope._rm or rm
+        opened = []
+        try:
+            for session in self._sessions():
+                session.open()
+                opened.append(session)
+        except Exception:
+            for session in opened:
+                session.close()
+            raise
+        return self
+
+    def close(self):
+        for session in reversed(self._sessions()):
+            try:
+                session.close()
+            except Exception as e:
+                print(f"  关闭设备出错: {e}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def set_resistance(self, ohms) -> bool:
+        return self.resistor.set_resistance(ohms)
+
+    def set_output(self, on: bool, voltage: float = None) -> bool:
+        try:
+            self.power.set_output(on, voltage)
+            return True
+        except Exception as e:
+            print(f"  电源控制错误: {e}")
+            return False
+
+    def set_voltage(self, voltage: float) -> bool:
+        try:
+            self.power.set_voltage(voltage)
+            return True
+        except Exception as e:
+            print(f"  电源控制错误: {e}")
+            return False
+
+    def measure_current(self, channel: int = DEFAULT_SCOPE_CHANNEL) -> float:
+        try:
+            return self.scope.read_mean(channel)
+        except Exception as e:
+            print(f"  示波器读取错误: {e}")
+            return None
+
+    def measure_channels(self, channels: list, items: list = ("mean",)) -> dict:
+        try:
+            return self.scope.measure_channels(channels, items)
+        except Exception as e:
+            print(f"  示波器读取错误: {e}")
+            return None
+
+    def waveform_stats(self, channel: int = DEFAULT_SCOPE_CHANNEL, length: int = None,
+                       settle_band: float = None) -> dict:
+        """采集一个波形块并在本地计算统计量 (见 waveform.waveform_stats)"""
+        try:
+            import waveform
+
+            wf = self.scope.read_waveform(channel, length)
+            band = settle_band if settle_band is not None else waveform.DEFAULT_SETTLE_BAND
+            return waveform.waveform_stats(wf["samples"], wf["sample_rate"], band)
+        except Exception as e:
+            print(f"  波形采集错误: {e}")
+            return None
+
+    def read_waveform(self, channel: int = DEFAULT_SCOPE_CHANNEL, length: int = None) -> dict:
+        """读取一个原始波形块 (见 ScopeSession.read_waveform), 出错返回 None"""
+        try:
+            return self.scope.read_waveform(channel, length)
+        except Exception as e:
+            print(f"  波形采集错误: {e}")
+            return None
+
+    def arm_capture(self, channel: int, level: float, window: tuple) -> bool:
+        """在上电前设置示波器单次触发 (见 ScopeSession.arm_single)"""
+        try:
+            self.scope.arm_single(channel, level, tuple(window))
+            return True
+        except Exception as e:
+            print(f"  示波器触发设置错误: {e}")
+            return False
+
+    def read_capture(self, channel: int = DEFAULT_SCOPE_CHANNEL, timeout: float = 5.0) -> float:
+        """读取触发后测量窗口内的均值, 未触发或出错返回 None"""
+        try:
+            value = self.scope.read_triggered(channel, timeout)
+            if value is None:
+                print(f"  示波器 {timeout}s 内未触发")
+            return value
+        except Exception as e:
+            print(f"  示波器读取错误: {e}")
+            return None
+
+    def read_capture_waveform(self, channel: int = DEFAULT_SCOPE_CHANNEL, timeout: float = 5.0,
+                              length: int = None) -> dict:
+        """读取触发后的整个波形 (见 ScopeSession.read_triggered_waveform), 未触发或出错返回 None"""
+        try:
+            wf = self.scope.read_triggered_waveform(channel, timeout, length)
+            if wf is None:
+                print(f"  示波器 {timeout}s 内未触发")
+            return wf
+        except Exception as e:
+            print(f"  波形采集错误: {e}")
+            return None
+
+    def measure_supply_current(self) -> float:
+        try:
+            return self.power.measure_current()
+        except Exception as e:
+            print(f"  电源电流读取错误: {e}")
+            return None
+
+    def screenshot(self, path: str) -> str:
+        try:
+            return self.scope.screenshot(path)
+        except Exception as e:
+            print(f"  截图错误: {e}")
+            return None
+
+
+class SubprocessBench:
+    """子进程回退方式: 每个动作调用一次各 skill 的 CLI (uv run)"""
+
+    mode = "subprocess"
+
+    def __init__(self, res_port: str = None, visa_address: str = None, scope_address: str = None):
+        self.res_port = res_port
+        self.visa_address = visa_address
+        self.scope_address = scope_address
+        # 最后一次成功设定的电压, 相同时上电不再传 -v (每个 CLI 调用都是一次独立连接)
+        self._voltage = None
+
+    def open(self):
+        # 只使用发现缓存 (子进程方式通常没有 pyvisa, 无法扫描), 未命中时由各 CLI 自行搜索
+        self.visa_address = self.visa_address or resolve("power", rescan=False)
+        return self
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _addr_arg(self) -> str:
+        return f"-a '{self.visa_address}'" if self.visa_address else ""
+
+    def set_resistance(self, ohms) -> bool:
+        return ResistorCli(self.res_port).set_resistance(ohms)
+
+    def set_output(self, on: bool, voltage: float = None) -> bool:
+        scripts_path = os.path.expanduser(POWER_SUPPLY_SCRIPTS)
+        volt_arg = f"-v {voltage}" if voltage is not None and voltage != self._voltage else ""
+        cmd = f"cd {scripts_path} && uv run power_ctrl_cli.py {self._addr_arg()} {volt_arg} -o {'on' if on else 'off'}"
+        ok = run_command(cmd)
+        if volt_arg:
+            self._voltage = voltage if ok else None
+        return ok
+
+    def set_voltage(self, voltage: float) -> bool:
+        scripts_path = os.path.expanduser(POWER_SUPPLY_SCRIPTS)
+        cmd = f"cd {scripts_path} && uv run power_ctrl_cli.py {self._addr_arg()} -v {voltage}"
+        ok = run_command(cmd)
+        self._voltage = voltage if ok else None
+        return ok
+
+    def measure_current(self, channel: int = DEFAULT_SCOPE_CHANNEL) -> float:
+        scripts_path = os.path.expanduser(OSCILLOSCOPE_SCRIPTS)
+        cmd = f"cd {scripts_path} && uv run yokogawa_pyvisa.py mean -c {channel}"
+        try:
+            result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=10)
+            if result.returncode == 0:
+                return float(result.stdout.strip())
+            print(f"  自动读取失败: {result.stderr or result.stdout}")
+        except Exception as e:
+            print(f"  读取失败: {e}")
+        return None
+
+    def measure_channels(self, channels: list, items: list = ("mean",)) -> dict:
+        """子进程方式只支持 mean, 每个通道调用一次 CLI"""
+        if set(items) - {"mean"}:
+            print("  子进程方式仅支持读取均值")
+            return None
+        record = {}
+        for ch in channels:
+            value = self.measure_current(ch)
+            if value is None:
+                return None
+            record[ch] = {"mean": value}
+        return record
+
+    def waveform_stats(self, channel: int = DEFAULT_SCOPE_CHANNEL, length: int = None,
+                       settle_band: float = None) -> dict:
+        print("  子进程方式不支持波形采集")
+        return None
+
+    def read_waveform(self, channel: int = DEFAULT_SCOPE_CHANNEL, length: int = None) -> dict:
+        print("  子进程方式不支持波形采集")
+        return None
+
+    def arm_capture(self, channel: int, level: float, window: tuple) -> bool:
+        print("  子进程方式不支持触发采集")
+        return False
+
+    def read_capture(self, channel: int = DEFAULT_SCOPE_CHANNEL, timeout: float = 5.0) -> float:
+        return None
+
+    def read_capture_waveform(self, channel: int = DEFAULT_SCOPE_CHANNEL, timeout: float = 5.0,
+                              length: int = None) -> dict:
+        return None
+
+    def measure_supply_current(self) -> float:
+        # power_ctrl_cli.py -m 的输出面向人工阅读, 子进程方式下不提供电源电流回读
+        return None
+
+    def screenshot(self, path: str) -> str:
+        scripts_path = os.path.expanduser(OSCILLOSCOPE_SCRIPTS)
+        abs_path = os.path.abspath(os.path.expanduser(path))
+        cmd = f"cd {scripts_path} && uv run yokogawa_pyvisa.py shot -o {abs_path}"
+        return abs_path if run_command(cmd) else None
+
+
+class DaemonBusyError(RuntimeError):
+    """仪器守护进程在运行, 但设备被其他客户端独占"""
+
+
+def open_bench(res_port: str = None, visa_address: str = None, scope_address: str = None,
+               mode: str = "session", sim: dict = None, replay: dict = None, scope_profile: dict = None,
+               reapply: bool = False):
+    """打开仪器
+
+    Args:
+        mode: "session" 进程内保持连接 (失败时自动回退到子进程方式);
+              "daemon" 连接 instrument_daemon.py (未运行时回退到进程内会话);
+              "subprocess" 每个动作调用一次 CLI;
+              "sim" 模拟仪器 (见 sim.py);
+              "replay" 回放录制的仪器记录 (见 replay.py)
+        sim: 模拟参数 (仅 mode="sim"), 传给 sim.SimBench, 至少包含 config_file
+        replay: 回放参数 (仅 mode="replay"), 传给 replay.ReplayBench, 至少包含 path
+        scope_profile: 示波器测量配置 (见 scope_profile.profile_params), 仅 mode="session";
+                       reapply=True 时不读回当前设置, 全部重新发送
+    """
+    if mode == "replay":
+        from replay import ReplayBench
+
+        return ReplayBench(**(replay or {})).open()
+    if mode == "sim":
+        from sim import SimBench
+
+        return SimBench(res_port=res_port or "SIM", **(sim or {})).open()
+    if mode == "daemon":
+        from instrument_daemon import DaemonBench
+
+        try:
+            return DaemonBench().open()
+        except OSError as e:
+            print(f"  无法连接仪器守护进程 ({e}), 改用进程内会话")
+            mode = "session"
+        # 守护进程在运行但设备被其他客户端占用 (DaemonBusyError) 时不能绕过它直接打开设备,
+        # 异常交给调用方: 命令行退出, 批量测试只让本作业失败
+    if mode == "session":
+        bench = Bench(res_port, visa_address, scope_address, scope_profile=scope_profile, reapply=reapply)
+        try:
+            return bench.open()
+        except ImportError as e:
+            print(f"  缺少依赖 ({e.name}), 回退到子进程方式")
+        except AmbiguousDeviceError:
+            # 发现缓存无法确定是哪一台设备, 不能任选一个, 也不能回退后再猜
+            raise
+        except Exception as e:
+            print(f"  设备会话打开失败 ({e}), 回退到子进程方式")
+    return SubprocessBench(res_port, visa_address, scope_address).open()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+测试结果日志 - 每个测试点完成后立即追加并落盘
+
+结果原先只保存在内存中，测试结束时才写 CSV；USB 掉线或 Ctrl-C 会丢失
+全部结果。Journal 在每个测试点测量完成后追加一行 JSON 并 fsync，
+--resume 时读取同一配置和 DUT 的日志，跳过已记录的测试点。
+
+日志文件按运行标识命名: <结果目录>/journal/<前缀>_<run_id>.jsonl，
+run_id 由 BIN 配置文件内容、DUT 序列号和影响结果的运行参数计算得出。
+"""
+
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+
+
+def run_id(config_file: str, dut: str = "", **params) -> str:
+    """同一配置文件内容、DUT 和运行参数得到相同的标识"""
+    h = hashlib.sha1()
+    with open(os.path.expanduser(config_file), "rb") as f:
+        h.update(f.read())
+    h.update(json.dumps({"dut": dut, **params}, sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()[:12]
+
+
+def journal_path(results_dir: str, prefix: str, rid: str) -> str:
+    return os.path.join(os.path.expanduser(results_dir), "journal", f"{prefix}_{rid}.jsonl")
+
+
+def _drop_torn_tail(path: str):
+    """截掉中断时写了一半的末行 (最后一个换行之后的内容), 之后追加的记录从新的一行开始"""
+    try:
+        f = open(path, "rb+")
+    except FileNotFoundError:
+        return
+    with f:
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        while pos > 0:
+            start = max(0, pos - 4096)
+            f.seek(start)
+            newline = f.read(pos - start).rfind(b"\n")
+            if newline >= 0:
+                pos = start + newline + 1
+                break
+            pos = start
+        if pos < end:
+            f.truncate(pos)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class Journal:
+    """追加写入的测试点日志, 每条记录写入后 fsync"""
+
+    def __init__(self, path: str, resume: bool = False):
+        """
+        Args:
+            resume: True 时保留已有记录 (截掉写了一半的末行); False 时已有日志改名归档, 从空日志开始
+        """
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if not resume and os.path.exists(path) and os.path.getsize(path) > 0:
+            stamp = datetime.fromtimestamp(os.path.getmtime(path)).strftime("%Y%m%d_%H%M%S")
+            os.replace(path, f"{os.path.splitext(path)[0]}.{stamp}.jsonl")
+        if resume:
+            _drop_torn_tail(path)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def load(self) -> dict:
+        """读取已记录的测试点 {key: record}, 忽略中断时写了一半的末行"""
+        records = {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                records[record["key"]] = record
+        return records
+
+    def append(self, key: str, **fields):
+        record = {"key": key, "time": time.time(), **fields}
+        self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
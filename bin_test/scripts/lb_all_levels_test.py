@@ -1,26 +1,50 @@
 #!/usr/bin/env python3
 """LB所有档位电流测试 - 只测试典型值"""
 
+import argparse
 import subprocess
 import time
-import os
 from datetime import datetime
 
+from discovery import AmbiguousDeviceError, remember, resolve
+from instruments import DaemonBusyError, open_bench
+from journal import Journal, journal_path, run_id
+from pipeline import start
+from result_store import ResultStore
+from run_bin_test import reserve_path
+from settle import settle_off, settle_on, settle_params
+from timing import Tracer
+
 # 配置
 CONFIG_FILE = "/home/bonbon/my_skills/bin_test/config/bin_res_lbhb.txt"
-RES_PORT = "/dev/ttyUSB0"
+# 程控电阻串口 (None 取发现缓存中按序列号跟踪的端口, 否则 /dev/ttyUSB0)
+RES_PORT = None
 VOLTAGE = 13.5
-
-# 设备脚本路径
-RES_SCRIPTS = "/home/bonbon/.claude/skills/programmable-resistor/scripts/res_ctrl"
+# 设备控制方式: session / daemon / subprocess / sim (见 instruments.open_bench)
+BACKEND = "session"
+# 上下电等待: True 使用固定等待 (断电 2s, 上电后 1.5s), False 使用自适应稳定检测
+FIXED_WAIT = False
+SETTLE = settle_params("headlight")
+# 流水线: 在断电等待期间设置电阻 (DUT 只在上电时读取电阻)
+PIPELINE = True
+
+# 结果目录 (结果日志保存在其下的 journal 目录)
+RESULTS_DIR = "/home/bonbon/.claude/skills/bin_test/result"
+# 结果库 (None 不写入)
+RESULT_DB = f"{RESULTS_DIR}/results.db"
+
+# 设备脚本路径 (仅用于子进程方式下的电源地址发现)
 PWR_SCRIPTS = "/home/bonbon/.claude/skills/power-supply/scripts/power_ctrl"
-OSC_SCRIPTS = "/home/bonbon/.claude/skills/oscilloscope/scripts/yokogawa"
 
 def discover_power_address():
-    """自动发现电源VISA地址"""
+    """自动发现电源VISA地址 (先查发现缓存, 未命中时调用 power_ctrl_cli.py -l 并记录)"""
+    address = resolve("power", rescan=False)
+    if address:
+        return address
     result = subprocess.run(f"cd {PWR_SCRIPTS} && uv run power_ctrl_cli.py -l", shell=True, capture_output=True, text=True)
     for line in result.stdout.split('\n'):
         if 'ITECH' in line or '2EC7' in line:
+            remember("power", line.strip())
             return line.strip()
     return None
 
@@ -43,65 +67,128 @@ def load_config():
             levels.append({"resistance": centre, "current": current})
     return levels
 
-def set_resistance(ohms):
+def set_resistance(bench, ohms, tracer, track="main"):
     """设置电阻"""
-    cmd = f"cd {RES_SCRIPTS} && uv run resistance_cli.py -p {RES_PORT} -v {ohms}"
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-    return result.returncode == 0
+    with tracer.span("set_resistance", track=track, ohms=ohms):
+        return bench.set_resistance(ohms)
 
-def power_cycle(pwr_address):
-    """电源循环"""
+def power_cycle(bench, tracer, settle=None, during_off=None):
+    """电源循环, 返回上电稳定耗时 (s), 失败返回 None
+
+    during_off: 与断电等待并行执行的步骤 (设置电阻), 返回 False 时不再上电
+    """
     # 关闭
-    subprocess.run(f"cd {PWR_SCRIPTS} && uv run power_ctrl_cli.py -a '{pwr_address}' -o off", shell=True, capture_output=True)
-    time.sleep(2)
+    with tracer.span("supply_off"):
+        bench.set_output(False)
+    pending = start(during_off) if during_off else None
+    with tracer.span("off_wait"):
+        if settle:
+            settle_off(bench, settle)
+        else:
+            time.sleep(2)
+    if pending is not None and pending.result() is False:
+        return None
     # 开启
-    result = subprocess.run(f"cd {PWR_SCRIPTS} && uv run power_ctrl_cli.py -a '{pwr_address}' -v {VOLTAGE} -o on", shell=True, capture_output=True, text=True)
-    return result.returncode == 0
+    with tracer.span("supply_on"):
+        if not bench.set_output(True, VOLTAGE):
+            return None
+    with tracer.span("settle"):
+        if settle:
+            on = settle_on(bench, settle)
+            if not on["stable"]:
+                print(f"  警告: {settle['timeout']}s 内电流未稳定")
+            return on["settle_time"]
+        time.sleep(1.5)
+        return 1.5
 
-def measure_current():
+def measure_current(bench, tracer):
     """测量CH4电流"""
-    result = subprocess.run(f"cd {OSC_SCRIPTS} && uv run yokogawa_pyvisa.py mean -c 4", shell=True, capture_output=True, text=True)
-    try:
-        return float(result.stdout.strip())
-    except:
-        return None
+    with tracer.span("scope_read"):
+        return bench.measure_current(4)
 
 def main():
-    # 自动发现电源地址
-    pwr_address = discover_power_address()
-    if not pwr_address:
-        print("错误: 无法找到电源设备，请检查USB连接")
-        return
-    print(f"发现电源: {pwr_address}")
+    parser = argparse.ArgumentParser(description="LB 所有档位电流测试 (典型值)")
+    parser.add_argument("--dut", default="", help="DUT 序列号 (用于结果日志和 --resume)")
+    parser.add_argument("--resume", action="store_true", help="从同一配置和 DUT 的结果日志继续, 跳过已测量的档位")
+    args = parser.parse_args()
 
+    # 打开设备会话 (失败时回退到子进程方式)
+    try:
+        res_port = RES_PORT or (BACKEND != "sim" and resolve("resistor")) or "/dev/ttyUSB0"
+        bench = open_bench(res_port, mode=BACKEND, sim={"config_file": CONFIG_FILE})
+    except (AmbiguousDeviceError, DaemonBusyError) as e:
+        raise SystemExit(f"错误: {e}")
+    if bench.mode == "subprocess":
+        # 子进程方式: 自动发现电源地址 (守护进程和模拟方式下电源由 bench 持有)
+        bench.visa_address = bench.visa_address or discover_power_address()
+        if not bench.visa_address:
+            print("错误: 无法找到电源设备，请检查USB连接")
+            return
+    print(f"发现电源: {bench.visa_address or '由守护进程持有'} ({bench.mode})")
+    # 子进程方式下无法快速轮询, 使用固定等待
+    settle = None if FIXED_WAIT or bench.mode == "subprocess" else SETTLE
+    # 结果日志: 每个档位测量完成后立即落盘
+    rid = run_id(CONFIG_FILE, args.dut, voltage=VOLTAGE, typical_only=True)
+    journal = Journal(journal_path(RESULTS_DIR, "lb_all_levels", rid), resume=args.resume)
+    done = journal.load() if args.resume else {}
+    if args.resume:
+        print(f"继续测试: 已记录 {len(done)} 个档位 ({journal.path})")
+    store = ResultStore(RESULT_DB) if RESULT_DB else None
+    try:
+        run_levels(bench, settle, journal, done, store, args.dut)
+    finally:
+        journal.close()
+        if store is not None:
+            store.close()
+        bench.close()
+
+def run_levels(bench, settle=None, journal=None, done=None, store=None, dut=""):
+    """测试所有档位典型值并保存结果
+
+    Args:
+        journal: 结果日志, 每个测量完成的档位立即追加
+        done: 已记录的档位 {key: 日志记录}, 直接使用记录结果
+        store: 结果库 (见 result_store.ResultStore), 每个测量完成的档位同时写入
+        dut: DUT 序列号, 写入结果库
+    """
     levels = load_config()
     print(f"加载了 {len(levels)} 个档位\n")
 
     results = []
     start_time = datetime.now()
+    tracer = Tracer()
+    done = done or {}
+    store_run = store.add_run("lb_all_levels", "大灯", dut, VOLTAGE) if store is not None else None
 
     for i, level in enumerate(levels):
         level_num = i + 1
         res = level["resistance"]
         expected = level["current"]
+        key = f"BIN_LEVEL_{level_num}"
+
+        if key in done:
+            results.append(done[key]["result"])
+            print(f"[{level_num:2d}/{len(levels)}] {key} 已记录, 跳过")
+            continue
 
         print(f"[{level_num:2d}/{len(levels)}] 测试 BIN_LEVEL_{level_num} - 电阻 {res}Ω, 预期 {expected}mA")
 
-        # 设置电阻
-        if not set_resistance(res):
+        # 设置电阻 (流水线方式下在断电等待期间设置)
+        if not PIPELINE and not set_resistance(bench, res, tracer):
             print(f"  失败: 电阻设置失败")
             results.append({"level": level_num, "res": res, "expected": expected, "measured": 0, "pass": False})
             continue
+        during_off = (lambda: set_resistance(bench, res, tracer, "resistor")) if PIPELINE else None
 
-        # 电源循环
-        if not power_cycle(pwr_address):
-            print(f"  失败: 电源循环失败")
+        # 电源循环 (含上电稳定等待)
+        settle_time = power_cycle(bench, tracer, settle, during_off)
+        if settle_time is None:
+            print(f"  失败: {'电阻设置或' if PIPELINE else ''}电源循环失败")
             results.append({"level": level_num, "res": res, "expected": expected, "measured": 0, "pass": False})
             continue
 
         # 测量
-        time.sleep(1.5)
-        measured = measure_current()
+        measured = measure_current(bench, tracer)
 
         if measured is None:
             print(f"  失败: 电流测量失败")
@@ -114,9 +201,16 @@ def main():
 
         error = ((measured - expected) / expected * 100) if expected > 0 else 0
         status = "通过" if passed else "失败"
-        print(f"  结果: {measured:.1f}mA (预期 {expected}mA ±{tolerance:.1f}, 误差 {error:+.1f}%) [{status}]")
+        print(f"  结果: {measured:.1f}mA (预期 {expected}mA ±{tolerance:.1f}, 误差 {error:+.1f}%) [{status}] 稳定 {settle_time:.2f}s")
 
-        results.append({"level": level_num, "res": res, "expected": expected, "measured": measured, "pass": passed})
+        results.append({"level": level_num, "res": res, "expected": expected, "measured": measured, "pass": passed,
+                        "settle": settle_time})
+        if journal is not None:
+            with tracer.span("result_write"):
+                journal.append(key, result=results[-1])
+        if store is not None:
+            with tracer.span("result_write"):
+                store.add_point(store_run, key, "典型值", res, expected, measured, passed, settle_time)
 
     # 输出结果汇总
     print("\n" + "="*70)
@@ -138,17 +232,23 @@ def main():
     print(f"耗时: {datetime.now() - start_time}")
 
     # 保存结果
-    output_file = f"/home/bonbon/.claude/skills/bin_test/result/lb_all_levels_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
-    with open(output_file, 'w') as f:
+    output_file = reserve_path(f"{RESULTS_DIR}/lb_all_levels_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    with tracer.span("result_write"), open(output_file, 'w') as f:
         f.write("# LB BIN测试结果\n")
         f.write(f"# 时间: {datetime.now()}\n")
-        f.write(f"\nLevel,Resistance(Ω),Expected(mA),Measured(mA),Error(%),Result\n")
+        f.write(f"\nLevel,Resistance(Ω),Expected(mA),Measured(mA),Error(%),Result,Settle(s)\n")
         for r in results:
             error = ((r["measured"] - r["expected"]) / r["expected"] * 100) if r["expected"] > 0 else 0
             status = "PASS" if r["pass"] else "FAIL"
-            f.write(f"BIN_LEVEL_{r['level']},{r['res']},{r['expected']},{r['measured']:.2f},{error:+.2f},{status}\n")
+            settle = f"{r['settle']:.2f}" if r.get("settle") is not None else ""
+            f.write(f"BIN_LEVEL_{r['level']},{r['res']},{r['expected']},{r['measured']:.2f},{error:+.2f},{status},{settle}\n")
     print(f"\n结果已保存到: {output_file}")
+    if store is not None:
+        store.set_source_file(store_run, output_file)
+
+    print("\n步骤耗时:")
+    tracer.print_summary()
+    print(f"追踪文件: {', '.join(tracer.export(output_file))}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+长时间波形记录 - 连续读取示波器波形块并追加到内存映射文件
+
+浸泡 (soak) 和闪烁 (flicker) 分析需要数分钟的 CH4 数据，而单次测量只得到一个
+均值。本模块连续读取波形块 (ScopeSession.read_block, 不换算的 int16)，原样
+追加到二进制文件; 读取时用 np.memmap 映射文件，只加载所需时间段，记录多久
+内存占用都不变。
+
+每块都等待一次新的采集 (read_block(fresh=True)) 并重新查询量程和采样率: 读取比
+采集快时不会把同一次采集写入多次, 记录中途量程或采样率被改动时停止记录。与上一块
+完全相同的块 (仍是同一次采集) 被丢弃。
+
+文件格式 (.bincap):
+    0 - HEADER_SIZE     b"BINCAP1\\n" + 4 字节小端头长度 + JSON 头, 以 0 填充
+                        {"dtype": "<i2", "scale", "offset", "sample_rate", "channel", "started_at"}
+    HEADER_SIZE -       采样点 (dtype), 物理值 = 原始值 × scale + offset
+    <文件>.blocks       每个波形块一行 (float64 × 2): 块开始的主机时间 (开始等待该次采集时, s, 相对第一块), 第一个采样点序号
+
+记录时间轴: 采样点按 sample_rate 连续排列。示波器两次采集之间有空档, 因此第 n 个采样点
+的时刻为 n / sample_rate 的 "采集时间"; 对应的实际时间见 .blocks。记录被中断 (Ctrl+C
+或断电) 时已写入的块仍可读取。
+
+用法:
+    python3 longcapture.py record -o soak.bincap --duration 600
+    python3 longcapture.py info soak.bincap
+    python3 longcapture.py slice soak.bincap --start 120 --end 121 -o flicker.npy
+    python3 longcapture.py record --backend sim -o /tmp/sim.bincap --duration 5
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+MAGIC = b"BINCAP1\n"
+HEADER_SIZE = 4096
+
+# 统计时每次映射的采样点数 (限制大范围统计的内存占用)
+STATS_CHUNK = 1 << 22
+
+
+def write_header(f, header: dict):
+    data = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    if len(MAGIC) + 4 + len(data) > HEADER_SIZE:
+        raise ValueError("文件头过长")
+    f.write((MAGIC + struct.pack("<I", len(data)) + data).ljust(HEADER_SIZE, b"\0"))
+
+
+def read_header(f) -> dict:
+    head = f.read(HEADER_SIZE)
+    if not head.startswith(MAGIC):
+        raise ValueError("不是长时间波形记录文件")
+    (length,) = struct.unpack("<I", head[len(MAGIC):len(MAGIC) + 4])
+    return json.loads(head[len(MAGIC) + 4:len(MAGIC) + 4 + length].decode("utf-8"))
+
+
+class CaptureWriter:
+    """追加写入波形块; 第一个块决定文件头 (量程、采样率)"""
+
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        self.header = None
+        self.samples = 0
+        self.blocks = 0
+        self._file = None
+        self._index = None
+        self._t0 = None
+
+    def append(self, block: dict, started_at: float = None):
+        """追加一个 read_block 结果; 量程或采样率与文件头不同时抛出 ValueError
+
+        started_at: 开始读取该块的主机时间 (time.monotonic(), 在等待采集之前), 默认为当前时间
+        """
+        started_at = time.monotonic() if started_at is None else started_at
+        if self._file is None:
+            self._open(block, started_at)
+        elif (block["scale"], block["offset"], block["sample_rate"]) != \
+                (self.header["scale"], self.header["offset"], self.header["sample_rate"]):
+            raise ValueError("示波器量程或采样率已改变, 停止记录")
+        raw = np.ascontiguousarray(block["raw"], dtype=self.header["dtype"])
+        self._index.write(struct.pack("<dd", started_at - self._t0, self.samples))
+        self._file.write(memoryview(raw).cast("B"))
+        self._file.flush()
+        self._index.flush()
+        self.samples += raw.size
+        self.blocks += 1
+
+    def _open(self, block: dict, started_at: float):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.header = {"dtype": "<i2", "scale": block["scale"], "offset": block["offset"],
+                       "sample_rate": block["sample_rate"], "channel": block["channel"],
+                       "started_at": datetime.now().isoformat(timespec="seconds")}
+        self._file = open(self.path, "wb")
+        write_header(self._file, self.header)
+        self._index = open(f"{self.path}.blocks", "wb")
+        self._t0 = started_at
+
+    def close(self):
+        for f in (self._file, self._index):
+            if f is not None:
+                f.close()
+        self._file = self._index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class CaptureReader:
+    """按时间段读取 .bincap 文件 (np.memmap, 只加载所需部分)
+
+    用法:
+        with CaptureReader("soak.bincap") as cap:
+            x = cap.slice(120.0, 121.0)     # 物理值 (float64)
+            t = cap.times(120.0, 121.0)     # 对应的采集时间 (s)
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        with open(self.path, "rb") as f:
+            self.header = read_header(f)
+        dtype = np.dtype(self.header["dtype"])
+        # 按文件大小计算采样点数 (记录中断时末尾可能有不完整的采样点)
+        count = (os.path.getsize(self.path) - HEADER_SIZE) // dtype.itemsize
+        self.raw = (np.memmap(self.path, dtype=dtype, mode="r", offset=HEADER_SIZE, shape=(count,))
+                    if count > 0 else np.empty(0, dtype=dtype))
+        self.sample_rate = float(self.header["sample_rate"])
+        self.scale = float(self.header["scale"])
+        self.offset = float(self.header["offset"])
+
+    def __len__(self) -> int:
+        return self.raw.size
+
+    @property
+    def duration(self) -> float:
+        """采集时间总长 (s)"""
+        return self.raw.size / self.sample_rate
+
+    @property
+    def blocks(self) -> np.ndarray:
+        """[(块开始的主机时间 (s), 第一个采样点序号), ...]"""
+        try:
+            index = np.fromfile(f"{self.path}.blocks", dtype="<f8")
+        except OSError:
+            return np.empty((0, 2))
+        return index[:index.size // 2 * 2].reshape(-1, 2)
+
+    def _range(self, start: float, end: float) -> tuple:
+        i0 = max(0, int(start * self.sample_rate))
+        i1 = self.raw.size if end is None else min(self.raw.size, int(np.ceil(end * self.sample_rate)))
+        return i0, max(i0, i1)
+
+    def slice(self, start: float = 0.0, end: float = None) -> np.ndarray:
+        """采集时间 [start, end) 的物理值"""
+        i0, i1 = self._range(start, end)
+        return self.raw[i0:i1] * self.scale + self.offset
+
+    def times(self, start: float = 0.0, end: float = None) -> np.ndarray:
+        """slice 对应的采集时间 (s)"""
+        i0, i1 = self._range(start, end)
+        return np.arange(i0, i1) / self.sample_rate
+
+    def stats(self, start: float = 0.0, end: float = None) -> dict:
+        """分段统计 {"mean", "std", "min", "max", "samples"}, 内存占用与时间段长度无关"""
+        i0, i1 = self._range(start, end)
+        n, total, squares = 0, 0.0, 0.0
+        lo, hi = np.inf, -np.inf
+        for a in range(i0, i1, STATS_CHUNK):
+            chunk = self.raw[a:min(i1, a + STATS_CHUNK)] * self.scale + self.offset
+            n += chunk.size
+            total += float(chunk.sum())
+            squares += float(np.square(chunk).sum())
+            lo, hi = min(lo, float(chunk.min())), max(hi, float(chunk.max()))
+        if n == 0:
+            return {"mean": None, "std": None, "min": None, "max": None, "samples": 0}
+        mean = total / n
+        return {"mean": mean, "std": max(0.0, squares / n - mean * mean) ** 0.5, "min": lo, "max": hi, "samples": n}
+
+    def close(self):
+        self.raw = np.empty(0, dtype=self.raw.dtype)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def record(scope, path: str, duration: float, channel: int = 4, length: int = None,
+           progress: float = 10.0) -> CaptureWriter:
+    """连续读取波形块写入 path, 直到 duration 秒或 Ctrl+C
+
+    Args:
+        scope: 示波器会话 (instruments.ScopeSession 或 sim.SimScopeSession), 需提供 read_block
+        progress: 进度输出间隔 (s)
+    """
+    writer = CaptureWriter(path)
+    start = time.monotonic()
+    next_report = start + progress
+    previous = None
+    duplicates = 0
+    try:
+        while time.monotonic() - start < duration:
+            started_at = time.monotonic()
+            block = scope.read_block(channel, length, fresh=True)
+            if previous is not None and np.array_equal(block["raw"], previous):
+                duplicates += 1
+                continue
+            writer.append(block, started_at)
+            previous = block["raw"]
+            now = time.monotonic()
+            if now >= next_report:
+                next_report = now + progress
+                print(f"  {now - start:.0f}s: {writer.blocks} 块, {writer.samples} 点 "
+                      f"({writer.samples / writer.header['sample_rate']:.2f}s 采集时间)")
+    except KeyboardInterrupt:
+        print("  记录被中断, 已写入的数据保留")
+    except (ValueError, RuntimeError) as e:
+        print(f"  {e}")
+    finally:
+        writer.close()
+    if duplicates:
+        print(f"  丢弃 {duplicates} 个重复的波形块 (同一次采集)")
+    return writer
+
+
+def open_scope(args):
+    """按后端打开示波器会话, 返回 (scope, 关闭函数)"""
+    if args.backend == "sim":
+        from run_bin_test import LED_TYPES, load_test_config
+        from sim import SimBench
+
+        led_config = LED_TYPES["1"]
+        bench = SimBench(led_config["file"], latency=args.sim_latency).open()
+        # 模拟 DUT 以第一个档位的典型值上电
+        config = next(iter(load_test_config(led_config["file"]).values()))
+        bench.set_resistance(config["resistance"])
+        bench.set_output(True, 13.5)
+        return bench.scope, bench.close
+
+    from instruments import ScopeSession
+
+    scope = ScopeSession(args.scope)
+    scope.open()
+    return scope, scope.close
+
+
+def main():
+    parser = argparse.ArgumentParser(description="长时间波形记录 (内存映射文件)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="连续记录示波器波形块")
+    rec.add_argument("-o", "--output", required=True, help="记录文件 (.bincap)")
+    rec.add_argument("-d", "--duration", type=float, default=60.0, help="记录时长 (s, 默认 60; Ctrl+C 提前结束)")
+    rec.add_argument("-c", "--channel", type=int, default=4, help="通道 (默认 4)")
+    rec.add_argument("--length", type=int, help="每块采样点数 (默认示波器当前记录长度)")
+    rec.add_argument("--scope", help="示波器 VISA 地址 (留空取发现缓存)")
+    rec.add_argument("--backend", choices=["session", "sim"], default="session",
+                     help="session 直接打开示波器 (仪器守护进程运行时需先停止), sim 模拟示波器")
+    rec.add_argument("--sim-latency", type=float, default=1.0, help="模拟设备延迟倍数")
+
+    info = sub.add_parser("info", help="显示记录文件信息和统计")
+    info.add_argument("file")
+
+    cut = sub.add_parser("slice", help="取出一段时间的物理值")
+    cut.add_argument("file")
+    cut.add_argument("--start", type=float, default=0.0, help="开始的采集时间 (s)")
+    cut.add_argument("--end", type=float, help="结束的采集时间 (s, 默认到末尾)")
+    cut.add_argument("-o", "--output", help="保存为 .npy (时间, 物理值 两列); 不指定时只输出统计")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        try:
+            scope, close = open_scope(args)
+        except Exception as e:
+            print(f"错误: 示波器打开失败: {e}")
+            sys.exit(1)
+        print(f"记录 CH{args.channel} {args.duration:g}s -> {args.output} (Ctrl+C 结束)")
+        try:
+            writer = record(scope, args.output, args.duration, args.channel, args.length)
+        finally:
+            close()
+        if not writer.blocks:
+            print("错误: 没有记录到数据")
+            sys.exit(1)
+        print(f"已记录 {writer.blocks} 块, {writer.samples} 点 -> {writer.path}")
+        return
+
+    try:
+        cap = CaptureReader(args.file)
+    except (OSError, ValueError) as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+    with cap:
+        if args.command == "info":
+            h = cap.header
+            print(f"文件: {cap.path}")
+            print(f"开始: {h['started_at']}, 通道 CH{h['channel']}, {h['dtype']} × {h['scale']:g} + {h['offset']:g}")
+            print(f"采样率: {cap.sample_rate:g} S/s, {len(cap)} 点, 采集时间 {cap.duration:.3f}s")
+            blocks = cap.blocks
+            if len(blocks):
+                print(f"波形块: {len(blocks)} 个, 实际时间 {blocks[-1][0]:.1f}s")
+            start, end = 0.0, None
+        else:
+            start, end = args.start, args.end
+        st = cap.stats(start, end)
+        if st["samples"] == 0:
+            print("该时间段没有数据")
+            return
+        print(f"统计: 均值 {st['mean']:.4g}, 标准差 {st['std']:.4g}, 最小 {st['min']:.4g}, "
+              f"最大 {st['max']:.4g} ({st['samples']} 点)")
+        if args.command == "slice" and args.output:
+            np.save(args.output, np.column_stack((cap.times(start, end), cap.slice(start, end))))
+            print(f"已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
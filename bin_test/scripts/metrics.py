@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+运行指标 - 本地 HTTP 端点输出 Prometheus 文本格式
+
+长时间运行时除了控制台输出没有其他反馈。本模块统计:
+
+- 完成的测试点 (通过 / 失败 / 设备错误) 和计划测试点数
+- 每小时测试点数、按已测测试点平均耗时估算的剩余时间 (ETA)
+- 各步骤耗时直方图 (来自 timing.Tracer 的 span) 和整个测试点的耗时直方图
+- 设备错误计数 (按电阻 / 电源 / 示波器)
+
+并在 http://127.0.0.1:<端口>/metrics 上输出, 多个工站可由同一个 Prometheus
+(或直接 curl) 采集。多夹具工站每个夹具一组指标 (fixture 标签)。
+
+用法:
+    python3 run_bin_test.py --metrics-port 9470
+    curl -s localhost:9470/metrics
+"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_METRICS_PORT = 9470
+
+# 直方图桶 (s)
+STEP_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0)
+POINT_BUCKETS = (0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 20.0, 60.0)
+
+# 测试点结果 -> 出错的设备 (结果文本见 run_bin_test.run_tests / station.Fixture.test_point)
+ERROR_INSTRUMENTS = {
+    "电阻设置失败": "resistor",
+    "上下电失败": "power",
+    "电流测量失败": "scope",
+}
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+class Histogram:
+    """累积直方图 (Prometheus 语义: 每个桶计 <= 上限的观测数)"""
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def lines(self, name: str, labels: dict) -> list:
+        lines = [f"{name}_bucket{_labels(dict(labels, le=f'{bound:g}'))} {n}"
+                 for bound, n in zip(self.buckets, self.counts)]
+        lines.append(f"{name}_bucket{_labels(dict(labels, le='+Inf'))} {self.count}")
+        lines.append(f"{name}_sum{_labels(labels)} {self.sum:.6f}")
+        lines.append(f"{name}_count{_labels(labels)} {self.count}")
+        return lines
+
+
+class RunMetrics:
+    """一个运行 (或一个夹具) 的指标, 线程安全
+
+    Args:
+        labels: 附加到每个指标的标签, 例如 {"dut": "SN1", "led": "大灯"}
+        track: 只统计该 track (及其子 track, 如 A.resistor) 的 span, None 统计全部
+    """
+
+    def __init__(self, labels: dict = None, track: str = None):
+        self.labels = dict(labels or {})
+        self.track = track
+        self.started_at = time.time()
+        self.planned = 0
+        self.results = {"pass": 0, "fail": 0, "error": 0}
+        self.errors = {}
+        self.steps = {}
+        self.point_durations = Histogram(POINT_BUCKETS)
+        self.last_point_at = None
+        self._lock = threading.Lock()
+
+    def plan(self, points: int):
+        """增加计划测试点数 (批量运行每次运行开始时调用)"""
+        with self._lock:
+            self.planned += points
+
+    def observe_span(self, span: dict):
+        """timing.Tracer 的 span 回调"""
+        track = span["track"]
+        if self.track is not None and track != self.track and not track.startswith(f"{self.track}."):
+            return
+        with self._lock:
+            self.steps.setdefault(span["name"], Histogram(STEP_BUCKETS)).observe(span["duration"])
+
+    def point_done(self, result: str, duration: float = None):
+        """记录一个测试点
+
+        Args:
+            result: "pass" / "fail", 或设备错误的结果文本 (见 ERROR_INSTRUMENTS)
+            duration: 该测试点耗时 (s), 用于直方图和 ETA
+        """
+        with self._lock:
+            if result in ("pass", "fail"):
+                self.results[result] += 1
+            else:
+                self.results["error"] += 1
+                instrument = ERROR_INSTRUMENTS.get(result, "other")
+                self.errors[instrument] = self.errors.get(instrument, 0) + 1
+            if duration is not None:
+                self.point_durations.observe(duration)
+            self.last_point_at = time.time()
+
+    def snapshot(self) -> dict:
+        """{"done", "planned", "per_hour", "eta"}: ETA 按已测测试点平均耗时估算, 无法估算时为 None"""
+        with self._lock:
+            done = sum(self.results.values())
+            measured = self.point_durations
+            elapsed = time.time() - self.started_at
+            per_hour = done / elapsed * 3600 if elapsed > 0 else 0.0
+            remaining = max(0, self.planned - done)
+            eta = remaining * measured.sum / measured.count if measured.count else None
+            return {"done": done, "planned": self.planned, "per_hour": per_hour, "eta": eta}
+
+    def render(self) -> dict:
+        """{指标名: Prometheus 文本格式的样本行} (不含 HELP/TYPE)"""
+        snap = self.snapshot()
+        labels = self.labels
+        with self._lock:
+            samples = {
+                "bin_test_points_total": [f"bin_test_points_total{_labels(dict(labels, result=r))} {n}"
+                                          for r, n in self.results.items()],
+                "bin_test_points_planned": [f"bin_test_points_planned{_labels(labels)} {self.planned}"],
+                "bin_test_points_per_hour": [f"bin_test_points_per_hour{_labels(labels)} {snap['per_hour']:.2f}"],
+                "bin_test_instrument_errors_total": [
+                    f"bin_test_instrument_errors_total{_labels(dict(labels, instrument=i))} {self.errors.get(i, 0)}"
+                    for i in sorted(set(ERROR_INSTRUMENTS.values()) | set(self.errors))],
+                "bin_test_step_duration_seconds": [
+                    line for step, hist in self.steps.items()
+                    for line in hist.lines("bin_test_step_duration_seconds", dict(labels, step=step))],
+                "bin_test_point_duration_seconds": self.point_durations.lines("bin_test_point_duration_seconds",
+                                                                              labels),
+                "bin_test_run_start_timestamp_seconds": [
+                    f"bin_test_run_start_timestamp_seconds{_labels(labels)} {self.started_at:.3f}"],
+            }
+            if self.last_point_at is not None:
+                samples["bin_test_last_point_timestamp_seconds"] = [
+                    f"bin_test_last_point_timestamp_seconds{_labels(labels)} {self.last_point_at:.3f}"]
+        if snap["eta"] is not None:
+            samples["bin_test_eta_seconds"] = [f"bin_test_eta_seconds{_labels(labels)} {snap['eta']:.1f}"]
+        return samples
+
+
+# 指标名 -> (类型, 说明)
+METRICS_HELP = {
+    "bin_test_points_total": ("counter", "已完成的测试点 (result: pass / fail / error)"),
+    "bin_test_points_planned": ("gauge", "计划测试点数"),
+    "bin_test_points_per_hour": ("gauge", "每小时测试点数 (自运行开始)"),
+    "bin_test_eta_seconds": ("gauge", "剩余测试点的预计耗时 (按已测测试点平均耗时)"),
+    "bin_test_instrument_errors_total": ("counter", "设备错误次数"),
+    "bin_test_step_duration_seconds": ("histogram", "各步骤耗时"),
+    "bin_test_point_duration_seconds": ("histogram", "每个测试点耗时"),
+    "bin_test_run_start_timestamp_seconds": ("gauge", "运行开始时间 (Unix 时间戳)"),
+    "bin_test_last_point_timestamp_seconds": ("gauge", "最近一个测试点完成时间 (Unix 时间戳)"),
+}
+
+
+def render(runs: list) -> str:
+    """多组指标合并为一个 Prometheus 文本"""
+    merged = {}
+    for run in runs:
+        for name, lines in run.render().items():
+            merged.setdefault(name, []).extend(lines)
+    out = []
+    for name, (kind, help_text) in METRICS_HELP.items():
+        if name not in merged:
+            continue
+        out.append(f"# HELP {name} {help_text}")
+        out.append(f"# TYPE {name} {kind}")
+        out.extend(merged[name])
+    return "\n".join(out) + "\n"
+
+
+class MetricsServer:
+    """在后台线程中提供 /metrics"""
+
+    def __init__(self, port: int = DEFAULT_METRICS_PORT, host: str = "127.0.0.1"):
+        self.runs = []
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = render(list(metrics.runs)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, fmt, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.address = f"http://{host}:{self._server.server_address[1]}/metrics"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def add(self, run: RunMetrics) -> RunMetrics:
+        self.runs.append(run)
+        return run
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def start_server(port: int, host: str = "127.0.0.1") -> MetricsServer:
+    """启动指标服务, 端口被占用等错误时打印并返回 None (测试照常进行)"""
+    try:
+        server = MetricsServer(port, host)
+    except OSError as e:
+        print(f"  指标端口 {port} 无法监听: {e}")
+        return None
+    print(f"  运行指标: {server.address}")
+    return server
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+测试步骤流水线 - 相邻测试点之间重叠互不依赖的步骤
+
+同一 DUT 上的顺序不变 (断电 -> 上电 -> 稳定 -> 测量)，但以下步骤与之并行:
+
+- 设置电阻: DUT 只在上电时读取 BIN 电阻，断电后即可在断电等待期间设置
+- 写结果: 测试点 N 的结果日志 (fsync) 和结果库写入在后台线程中执行，
+  与测试点 N+1 的上下电和稳定等待重叠
+
+后台任务按提交顺序在单个线程中执行，因此同一设备或同一文件不会被并发访问。
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class StepWorker:
+    """单线程后台执行器: 任务按提交顺序执行
+
+    任务出错时打印并继续执行后面的任务, 但保留第一个异常, 由 drain() / close()
+    重新抛出, 调用方不会把后台写入失败的运行当作成功。
+    """
+
+    def __init__(self, name: str = "worker"):
+        self.name = name
+        self.error = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def _run(self, func, args, kwargs):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            print(f"  后台任务出错 ({self.name}): {e}")
+            with self._lock:
+                self.error = self.error or e
+            return None
+
+    def submit(self, func, *args, **kwargs) -> Future:
+        future = self._executor.submit(self._run, func, args, kwargs)
+        with self._lock:
+            self._pending = [f for f in self._pending if not f.done()] + [future]
+        return future
+
+    def drain(self):
+        """等待已提交的任务全部完成, 有任务出过错时抛出第一个异常"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for future in pending:
+            future.result()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        try:
+            self.drain()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def start(func, *args, **kwargs) -> Future:
+    """在新线程中开始执行 func, 返回 Future (用于与当前步骤重叠的单个任务)"""
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(func(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
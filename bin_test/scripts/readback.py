@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+电源电流回读 - 示波器之外的第二条测量路径
+
+IT6722 可以测量自身输出电流 (MEAS:CURR?)，通过已打开的电源会话读取，不需要
+示波器往返。电源电流 (A) 按线性校准换算为主通道电流 (与 BIN 配置中的预期电流
+同单位):
+
+    通道电流 = gain × 电源电流 + offset
+
+测量策略:
+    scope        只读示波器 (原方式)
+    supply       只读电源电流 (没有示波器探头的大灯运行)
+    fallback     先读电源电流, 读取失败时改读示波器
+    cross-check  两者都读, 按示波器判定; 偏差超过 cross_tol 时标记 (探头问题)
+"""
+
+MEASURE_POLICIES = ("scope", "supply", "fallback", "cross-check")
+
+# 按 LED 类型的默认参数
+#   gain / offset: 电源电流 (A) -> 通道电流的换算 (默认 1000, 即 A -> mA)
+#   cross_tol: 交叉校验允许的相对偏差
+# DUT 自身的静态电流或驱动效率使两者不成比例时, 应按实测标定 gain / offset
+READBACK_DEFAULTS = {
+    "headlight": {"policy": "scope", "gain": 1000.0, "offset": 0.0, "cross_tol": 0.05},
+    "sigled": {"policy": "scope", "gain": 1000.0, "offset": 0.0, "cross_tol": 0.05},
+}
+
+
+def readback_params(led_type: str = "headlight", **overrides) -> dict:
+    """LED 类型的默认参数, 并用 overrides 中非 None 的值覆盖"""
+    params = dict(READBACK_DEFAULTS.get(led_type, READBACK_DEFAULTS["headlight"]))
+    params.update({k: v for k, v in overrides.items() if v is not None})
+    if params["policy"] not in MEASURE_POLICIES:
+        raise ValueError(f"未知测量策略: {params['policy']}")
+    return params
+
+
+def supply_channel_current(bench, params: dict) -> float:
+    """读取电源电流并换算为通道电流, 失败返回 None"""
+    amps = bench.measure_supply_current()
+    if amps is None:
+        return None
+    return params["gain"] * amps + params["offset"]
+
+
+def read_current(bench, params: dict, channel: int = 4) -> dict:
+    """按测量策略读取一次电流
+
+    Returns:
+        {"value": 用于判定的读数 (失败为 None), "source": "scope" / "supply",
+         "scope", "supply": 各来源的读数 (未读或失败为 None),
+         "deviation": 交叉校验的相对偏差, "mismatch": 偏差是否超过 cross_tol}
+    """
+    policy = params["policy"]
+    reading = {"value": None, "source": None, "scope": None, "supply": None, "deviation": None, "mismatch": False}
+    if policy != "scope":
+        reading["supply"] = supply_channel_current(bench, params)
+    if policy == "scope" or policy == "cross-check" or (policy == "fallback" and reading["supply"] is None):
+        reading["scope"] = bench.measure_current(channel)
+
+    if policy == "supply" or (policy == "fallback" and reading["supply"] is not None):
+        reading["value"], reading["source"] = reading["supply"], "supply"
+    else:
+        reading["value"], reading["source"] = reading["scope"], "scope"
+
+    if policy == "cross-check" and reading["scope"] is not None and reading["supply"] is not None:
+        reference = max(abs(reading["scope"]), 1e-9)
+        reading["deviation"] = (reading["supply"] - reading["scope"]) / reference
+        reading["mismatch"] = abs(reading["deviation"]) > params["cross_tol"]
+    return reading
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+仪器 I/O 录制与回放 - 无硬件复现真实运行
+
+RecordingBench 包装任意 Bench (session / daemon / subprocess / sim)，把每次电阻、
+电源、示波器调用的参数、返回值和时间写入压缩的记录文件 (gzip JSONL)。
+ReplayBench 读取记录文件，按原速度或全速把返回值确定地回放给测试流程，
+用于在数秒内重跑编排和结果处理逻辑 (verify_result / save_results 等)。
+
+回放匹配: 每次 set_output 开始一个新的段 (一次上下电的前后)，同一段内按
+(操作, 参数, 所在步骤 span) 依次取出记录的返回值。稳定检测的读数次数因而
+不会影响测量读数; 读数比记录多时重复该步骤最后一个读数。
+
+记录文件格式:
+    第一行 {"transcript": 1, "mode": 原后端, "visa_address", "started_at"}
+    之后每行 {"t": 开始时间 (s), "dt": 耗时 (s), "op", "args", "result", "seg", "step"}
+    NumPy 数组 (read_waveform 的采样点) 以 {"ndarray": base64 float32} 保存
+
+用法:
+    python3 run_bin_test.py --record run.jsonl.gz                     # 录制
+    python3 run_bin_test.py --backend replay --replay run.jsonl.gz    # 全速回放
+    python3 run_bin_test.py --backend replay --replay run.jsonl.gz --replay-speed original
+"""
+
+import base64
+import gzip
+import inspect
+import json
+import os
+import threading
+import time
+import zlib
+from datetime import datetime
+
+from timing import NULL_TRACER
+
+TRANSCRIPT_VERSION = 1
+
+# 录制的 Bench 方法 -> 回放记录缺失时的返回值
+RECORDED_OPS = {
+    "set_resistance": False,
+    "set_output": False,
+    "set_voltage": False,
+    "measure_current": None,
+    "measure_channels": None,
+    "waveform_stats": None,
+    "read_waveform": None,
+    "arm_capture": False,
+    "read_capture": None,
+    "read_capture_waveform": None,
+    "measure_supply_current": None,
+    "screenshot": None,
+}
+
+# 1x1 像素 PNG, 回放截图使用 (记录中不保存图像)
+_PNG_1X1 = bytes.fromhex(
+    "89504e470d0a1a0a0000000d49484452000000010000000108000000003a7e9b55"
+    "0000000a49444154789c636000000002000148afa4710000000049454e44ae426082"
+)
+
+
+def _encode(value):
+    """返回值转为 JSON (NumPy 数组转 base64 float32)"""
+    if hasattr(value, "dtype") and hasattr(value, "tobytes"):
+        import numpy as np
+
+        data = np.asarray(value, dtype="<f4").tobytes()
+        return {"ndarray": base64.b64encode(data).decode("ascii")}
+    if isinstance(value, dict):
+        return {str(k): _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def _decode(op: str, value):
+    if isinstance(value, dict):
+        if set(value) == {"ndarray"}:
+            import numpy as np
+
+            return np.frombuffer(base64.b64decode(value["ndarray"]), dtype="<f4").astype(float)
+        value = {k: _decode(op, v) for k, v in value.items()}
+        if op == "measure_channels":
+            # JSON 对象的键是字符串, 通道号还原为 int
+            value = {int(k): v for k, v in value.items()}
+        return value
+    return value
+
+
+def _bind_args(method, args: tuple, kwargs: dict) -> dict:
+    """位置参数和关键字参数统一为 {参数名: 值} (含默认值), 录制和回放按此匹配"""
+    try:
+        bound = inspect.signature(method).bind(*args, **kwargs)
+    except (TypeError, ValueError):
+        return {"args": list(args), **kwargs}
+    bound.apply_defaults()
+    return {k: list(v) if isinstance(v, tuple) else v for k, v in bound.arguments.items()}
+
+
+def _key(op: str, args: dict) -> str:
+    if op == "screenshot":
+        # 截图路径带时间戳, 不参与匹配
+        args = {}
+    return f"{op} {json.dumps(args, sort_keys=True, ensure_ascii=False)}"
+
+
+class RecordingBench:
+    """包装一个 Bench, 把每次调用写入记录文件; 其余属性和方法直接转发"""
+
+    def __init__(self, bench, path: str, tracer=NULL_TRACER):
+        self.bench = bench
+        self.path = os.path.expanduser(path)
+        self.tracer = tracer
+        self._file = None
+        self._t0 = None
+        self._segment = 0
+        self._lock = threading.Lock()
+
+    @property
+    def mode(self) -> str:
+        return self.bench.mode
+
+    @property
+    def visa_address(self) -> str:
+        return self.bench.visa_address
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._file = gzip.open(self.path, "wt", encoding="utf-8")
+        self._t0 = time.perf_counter()
+        self._write({"transcript": TRANSCRIPT_VERSION, "mode": self.bench.mode,
+                     "visa_address": self.bench.visa_address,
+                     "started_at": datetime.now().isoformat(timespec="seconds")})
+        return self
+
+    def close(self):
+        try:
+            self.bench.close()
+        finally:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _write(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._file.write(line + "\n")
+            # 每条记录都刷新到文件, 运行中断时记录仍可读取
+            self._file.flush()
+
+    def __getattr__(self, name):
+        attr = getattr(self.bench, name)
+        if name not in RECORDED_OPS:
+            return attr
+
+        def call(*args, **kwargs):
+            bound = _bind_args(attr, args, kwargs)
+            if name == "set_output":
+                self._segment += 1
+            segment, step = self._segment, self.tracer.current()
+            start = time.perf_counter()
+            result = attr(*args, **kwargs)
+            end = time.perf_counter()
+            self._write({"t": round(start - self._t0, 6), "dt": round(end - start, 6), "op": name, "args": bound,
+                         "result": _encode(result), "seg": segment, "step": step})
+            return result
+
+        return call
+
+
+def load_transcript(path: str) -> tuple:
+    """读取记录文件, 返回 (文件头, 调用记录列表); 运行中断留下的不完整结尾被忽略"""
+    lines = []
+    try:
+        with gzip.open(os.path.expanduser(path), "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    lines.append(json.loads(line))
+    except (EOFError, zlib.error, json.JSONDecodeError):
+        if not lines:
+            raise ValueError(f"记录文件无法读取: {path}")
+    if not lines or lines[0].get("transcript") != TRANSCRIPT_VERSION:
+        raise ValueError(f"不是仪器记录文件: {path}")
+    return lines[0], lines[1:]
+
+
+class ReplayBench:
+    """按记录文件回放的 Bench
+
+    Args:
+        path: 记录文件 (RecordingBench 生成)
+        speed: "fast" 不等待; "original" 每次调用按记录的耗时等待
+    """
+
+    mode = "replay"
+
+    def __init__(self, path: str, speed: str = "fast", tracer=NULL_TRACER):
+        if speed not in ("fast", "original"):
+            raise ValueError(f"未知回放速度: {speed}")
+        self.path = path
+        self.speed = speed
+        self.tracer = tracer
+        self.header, records = load_transcript(path)
+        self.visa_address = self.header.get("visa_address")
+        self.res_port = "REPLAY"
+        self.misses = 0
+        # (段, 操作+参数) -> 记录列表 (按时间顺序), 以及已回放的位置
+        self._records = {}
+        for record in records:
+            self._records.setdefault((record["seg"], _key(record["op"], record["args"])), []).append(record)
+        self._used = set()
+        self._segment = 0
+        self._lock = threading.Lock()
+
+    @property
+    def fast(self) -> bool:
+        return self.speed == "fast"
+
+    def open(self):
+        return self
+
+    def close(self):
+        if self.misses:
+            print(f"  回放: {self.misses} 次调用在记录中没有对应 (流程与录制时不同)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _next(self, op: str, args: dict, step: str) -> dict:
+        """取出本段内该调用的下一条记录; 同一步骤的记录已用完时重复最后一条"""
+        candidates = self._records.get((self._segment, _key(op, args)), [])
+        same_step = [r for r in candidates if step is None or r["step"] is None or r["step"] == step]
+        with self._lock:
+            for record in same_step:
+                if id(record) not in self._used:
+                    self._used.add(id(record))
+                    return record
+        return same_step[-1] if same_step else None
+
+    def _replay(self, op: str, args: dict):
+        if op == "set_output":
+            self._segment += 1
+        record = self._next(op, args, self.tracer.current())
+        if record is None:
+            self.misses += 1
+            print(f"  回放记录中没有 {op}({args}), 段 {self._segment}")
+            return RECORDED_OPS[op]
+        if not self.fast:
+            time.sleep(record["dt"])
+        if op == "screenshot" and record["result"]:
+            abs_path = os.path.abspath(os.path.expanduser(args["path"]))
+            with open(abs_path, "wb") as f:
+                f.write(_PNG_1X1)
+            return abs_path
+        return _decode(op, record["result"])
+
+    # 与 instruments.Bench 相同的方法签名 (回放按参数名匹配)
+    def set_resistance(self, ohms) -> bool:
+        return self._replay("set_resistance", {"ohms": ohms})
+
+    def set_output(self, on: bool, voltage: float = None) -> bool:
+        return self._replay("set_output", {"on": on, "voltage": voltage})
+
+    def set_voltage(self, voltage: float) -> bool:
+        return self._replay("set_voltage", {"voltage": voltage})
+
+    def measure_current(self, channel: int = 4) -> float:
+        return self._replay("measure_current", {"channel": channel})
+
+    def measure_channels(self, channels: list, items: list = ("mean",)) -> dict:
+        return self._replay("measure_channels", {"channels": list(channels), "items": list(items)})
+
+    def waveform_stats(self, channel: int = 4, length: int = None, settle_band: float = None) -> dict:
+        return self._replay("waveform_stats", {"channel": channel, "length": length, "settle_band": settle_band})
+
+    def read_waveform(self, channel: int = 4, length: int = None) -> dict:
+        return self._replay("read_waveform", {"channel": channel, "length": length})
+
+    def arm_capture(self, channel: int, level: float, window: tuple) -> bool:
+        return self._replay("arm_capture", {"channel": channel, "level": level, "window": list(window)})
+
+    def read_capture(self, channel: int = 4, timeout: float = 5.0) -> float:
+        return self._replay("read_capture", {"channel": channel, "timeout": timeout})
+
+    def read_capture_waveform(self, channel: int = 4, timeout: float = 5.0, length: int = None) -> dict:
+        return self._replay("read_capture_waveform", {"channel": channel, "timeout": timeout, "length": length})
+
+    def measure_supply_current(self) -> float:
+        return self._replay("measure_supply_current", {})
+
+    def screenshot(self, path: str) -> str:
+        return self._replay("screenshot", {"path": path})
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+BIN 测试结果库 (SQLite)
+
+各次测试的结果原先分散在 result/*.csv 中，格式也各不相同。本模块把结果
+写入一个带类型列和索引的 SQLite 数据库，跨数千次运行的查询 (例如某档位
+一个月内的漂移) 可以在毫秒级返回。
+
+表结构:
+    runs    每次运行: 运行器、LED 类型、DUT、电压、开始时间、来源文件
+    points  每个测试点: 档位、电阻类型、电阻、预期/实测电流、误差、结果、稳定耗时
+            (DUT、LED 类型和测量时间冗余保存, 便于按索引直接查询)
+
+用法:
+    python3 result_store.py import ~/.claude/skills/bin_test/result/*.csv
+    python3 result_store.py drift BIN_LEVEL_12 --since 2026-09-01
+    python3 result_store.py runs
+"""
+
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+DEFAULT_DB = "~/.claude/skills/bin_test/result/results.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id          INTEGER PRIMARY KEY,
+    runner      TEXT NOT NULL,
+    led_type    TEXT,
+    dut         TEXT NOT NULL DEFAULT '',
+    voltage     REAL,
+    started_at  TEXT NOT NULL,
+    source_file TEXT UNIQUE
+);
+CREATE TABLE IF NOT EXISTS points (
+    id          INTEGER PRIMARY KEY,
+    run_id      INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    dut         TEXT NOT NULL DEFAULT '',
+    led_type    TEXT,
+    fixture     TEXT,
+    bin_level   INTEGER NOT NULL,
+    res_type    TEXT NOT NULL,
+    resistance  INTEGER,
+    voltage     REAL,
+    expected    REAL,
+    measured    REAL,
+    error_pct   REAL,
+    passed      INTEGER NOT NULL,
+    settle_time REAL,
+    measured_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_points_dut ON points(dut, measured_at);
+CREATE INDEX IF NOT EXISTS idx_points_level ON points(bin_level, measured_at);
+CREATE INDEX IF NOT EXISTS idx_points_date ON points(measured_at);
+"""
+
+# 后续版本增加的 points 列, 打开旧数据库时自动补上
+POINT_COLUMNS_ADDED = {
+    "samples": "INTEGER",   # 读数次数 (自适应重复采样)
+    "std": "REAL",          # 读数标准差
+}
+
+# CSV 中的结果文字
+PASS_WORDS = ("通过", "PASS", "Pass")
+
+
+def level_number(bin_name: str) -> int:
+    """BIN_LEVEL_12 -> 12"""
+    return int(str(bin_name).rsplit("_", 1)[-1])
+
+
+def _source_path(path: str) -> str:
+    """来源文件的规范路径 (解析符号链接), 同一文件只对应一条运行记录"""
+    return os.path.realpath(os.path.expanduser(path)) if path else None
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ResultStore:
+    """结果库连接"""
+
+    def __init__(self, path: str = DEFAULT_DB):
+        self.path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # 流水线方式下由后台写入线程使用 (同一时刻只有一个线程访问)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.executescript(SCHEMA)
+        existing = {row["name"] for row in self.conn.execute("PRAGMA table_info(points)")}
+        for column, sql_type in POINT_COLUMNS_ADDED.items():
+            if column not in existing:
+                self.conn.execute(f"ALTER TABLE points ADD COLUMN {column} {sql_type}")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def add_run(self, runner: str, led_type: str = None, dut: str = "", voltage: float = None,
+                started_at: datetime = None, source_file: str = None) -> int:
+        cur = self.conn.execute(
+            "INSERT INTO runs (runner, led_type, dut, voltage, started_at, source_file) VALUES (?, ?, ?, ?, ?, ?)",
+            (runner, led_type, dut or "", voltage, (started_at or datetime.now()).isoformat(sep=" "),
+             _source_path(source_file)),
+        )
+        self.conn.commit()
+        return cur.lastrowid
+
+    def set_source_file(self, run_id: int, source_file: str):
+        self.conn.execute("UPDATE runs SET source_file = ? WHERE id = ?", (_source_path(source_file), run_id))
+        self.conn.commit()
+
+    def add_point(self, run_id: int, bin_name: str, res_type: str, resistance, expected, measured,
+                  passed: bool, settle_time: float = None, measured_at: datetime = None, fixture: str = None,
+                  voltage: float = None, samples: int = None, std: float = None, commit: bool = True):
+        run = self.conn.execute("SELECT dut, led_type, voltage FROM runs WHERE id = ?", (run_id,)).fetchone()
+        expected = _float(expected)
+        measured = _float(measured)
+        error_pct = (measured - expected) / expected * 100 if expected and measured is not None else None
+        self.conn.execute(
+            "INSERT INTO points (run_id, dut, led_type, fixture, bin_level, res_type, resistance, voltage,"
+            " expected, measured, error_pct, passed, settle_time, measured_at, samples, std)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (run_id, run["dut"], run["led_type"], fixture, level_number(bin_name), res_type,
+             int(resistance) if resistance not in (None, "", "-") else None,
+             voltage if voltage is not None else run["voltage"], expected, measured, error_pct,
+             1 if passed else 0, _float(settle_time), (measured_at or datetime.now()).isoformat(sep=" "),
+             samples, _float(std)),
+        )
+        if commit:
+            self.conn.commit()
+
+    def level_history(self, bin_name: str, since: str = None, until: str = None, dut: str = None,
+                      res_type: str = None) -> list:
+        """某档位的历史测量值 (按时间排序)"""
+        sql = "SELECT measured_at, dut, res_type, resistance, expected, measured, error_pct, passed FROM points" \
+              " WHERE bin_level = ?"
+        params = [level_number(bin_name)]
+        for column, op, value in (("measured_at", ">=", since), ("measured_at", "<", until),
+                                  ("dut", "=", dut), ("res_type", "=", res_type)):
+            if value:
+                sql += f" AND {column} {op} ?"
+                params.append(value)
+        return self.conn.execute(sql + " ORDER BY measured_at", params).fetchall()
+
+    def level_drift(self, bin_name: str, since: str = None, until: str = None, dut: str = None) -> list:
+        """某档位按天汇总的误差 (均值/最小/最大) 与通过率"""
+        sql = "SELECT substr(measured_at, 1, 10) AS day, COUNT(*) AS n, AVG(error_pct) AS mean_err," \
+              " MIN(error_pct) AS min_err, MAX(error_pct) AS max_err, AVG(passed) AS pass_rate" \
+              " FROM points WHERE bin_level = ? AND error_pct IS NOT NULL"
+        params = [level_number(bin_name)]
+        for column, op, value in (("measured_at", ">=", since), ("measured_at", "<", until), ("dut", "=", dut)):
+            if value:
+                sql += f" AND {column} {op} ?"
+                params.append(value)
+        return self.conn.execute(sql + " GROUP BY day ORDER BY day", params).fetchall()
+
+    def runs(self) -> list:
+        return self.conn.execute(
+            "SELECT r.id, r.runner, r.led_type, r.dut, r.started_at, r.source_file,"
+            " COUNT(p.id) AS points, SUM(p.passed) AS passed"
+            " FROM runs r LEFT JOIN points p ON p.run_id = r.id GROUP BY r.id ORDER BY r.started_at"
+        ).fetchall()
+
+    def import_csv(self, path: str) -> int:
+        """导入一个已有的结果 CSV (bin_test_result / lb_all_levels / bin_station_result), 返回导入的点数
+
+        同一文件只导入一次。
+        """
+        abs_path = _source_path(path)
+        if self.conn.execute("SELECT 1 FROM runs WHERE source_file = ?", (abs_path,)).fetchone():
+            return 0
+
+        meta, rows = read_result_csv(abs_path)
+        points = [p for p in map(normalize_row, rows) if p is not None]
+        if not points:
+            return 0
+
+        name = os.path.basename(abs_path)
+        runner = "lb_all_levels" if name.startswith("lb_all_levels") else \
+            "station" if name.startswith("bin_station") else "bin_test"
+        led_type = meta.get("LED类型") or ("大灯" if runner == "lb_all_levels" else None)
+        started_at = parse_time(meta.get("时间")) or datetime.fromtimestamp(os.path.getmtime(abs_path))
+        voltage = meta.get("电源电压", "").rstrip("Vv")
+        run_id = self.add_run(runner, led_type, voltage=float(voltage) if voltage else None,
+                              started_at=started_at, source_file=abs_path)
+
+        for point in points:
+            self.add_point(run_id, measured_at=started_at, commit=False, **point)
+        self.conn.commit()
+        return len(points)
+
+
+def parse_time(text: str) -> datetime:
+    if not text:
+        return None
+    for fmt in ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(text.strip(), fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def read_result_csv(path: str) -> tuple:
+    """读取结果 CSV: 返回 (# 注释中的元数据 {键: 值}, 数据行字典列表)"""
+    meta = {}
+    lines = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            stripped = line.strip()
+            if stripped.startswith("#"):
+                key, _, value = stripped.lstrip("# ").partition(":")
+                meta[key.strip()] = value.strip()
+            elif stripped:
+                lines.append(stripped)
+    return meta, list(csv.DictReader(lines))
+
+
+def normalize_row(row: dict) -> dict:
+    """把不同格式的 CSV 行统一为 add_point 参数, 汇总行等无效行返回 None"""
+    bin_name = row.get("档位") or row.get("Level") or ""
+    if not bin_name.startswith("BIN_LEVEL_"):
+        return None
+    result = row.get("结果") or row.get("Result") or ""
+    return {
+        "bin_name": bin_name,
+        "res_type": row.get("类型") or "典型值",
+        "resistance": row.get("电阻(Ω)") or row.get("Resistance(Ω)"),
+        "expected": row.get("预期电流(mA)") or row.get("Expected(mA)"),
+        "measured": row.get("实测电流(mA)") or row.get("Measured(mA)"),
+        "passed": result in PASS_WORDS,
+        "settle_time": row.get("稳定耗时(s)") or row.get("Settle(s)"),
+        "fixture": row.get("夹具"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BIN 测试结果库")
+    parser.add_argument("--db", default=DEFAULT_DB, help=f"数据库路径 (默认 {DEFAULT_DB})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    imp = sub.add_parser("import", help="导入已有的结果 CSV")
+    imp.add_argument("files", nargs="+")
+
+    drift = sub.add_parser("drift", help="档位误差按天汇总")
+    drift.add_argument("level", help="档位, 例如 BIN_LEVEL_12 或 12")
+    drift.add_argument("--since", help="开始日期 (YYYY-MM-DD)")
+    drift.add_argument("--until", help="结束日期 (不含)")
+    drift.add_argument("--dut", help="DUT 序列号")
+
+    sub.add_parser("runs", help="列出所有运行")
+    args = parser.parse_args()
+
+    with ResultStore(args.db) as store:
+        if args.command == "import":
+            total = 0
+            for path in args.files:
+                try:
+                    count = store.import_csv(path)
+                except (OSError, ValueError, csv.Error) as e:
+                    print(f"  跳过 {path}: {e}", file=sys.stderr)
+                    continue
+                print(f"  {path}: {count} 个测试点")
+                total += count
+            print(f"共导入 {total} 个测试点")
+        elif args.command == "drift":
+            level = args.level if args.level.upper().startswith("BIN_LEVEL_") else f"BIN_LEVEL_{args.level}"
+            print(f"{'日期':<12} {'点数':>6} {'平均误差%':>10} {'最小%':>8} {'最大%':>8} {'通过率':>8}")
+            for r in store.level_drift(level, args.since, args.until, args.dut):
+                print(f"{r['day']:<12} {r['n']:>6} {r['mean_err']:>+10.2f} {r['min_err']:>+8.2f} "
+                      f"{r['max_err']:>+8.2f} {r['pass_rate'] * 100:>7.1f}%")
+        else:
+            for r in store.runs():
+                print(f"{r['id']:>5} {r['started_at'][:19]} {r['runner']:<14} {r['led_type'] or '-':<6} "
+                      f"{r['dut'] or '-':<12} {r['passed'] or 0}/{r['points']}  {r['source_file'] or ''}")
+
+
+if __name__ == "__main__":
+    main()
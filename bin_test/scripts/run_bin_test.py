@@ -12,30 +12,46 @@ BIN Test Runner - BIN电阻档位自动测试工具
 - 设置电阻: 使用 @programmable-resistor skill
 - 电源控制: 使用 @power-supply skill
 - 电流测量: 使用 @oscilloscope skill (通道4)
+
+设备在整个测试期间保持连接 (见 instruments.py; 找不到 res_ctrl 驱动时程控电阻仍调用 CLI)，
+使用 --backend subprocess 可回退到每个动作调用一次 CLI 的方式。
 """
 
-import subprocess
+import argparse
 import sys
 import time
 import os
 
-# Skill scripts 目录路径
-PROGRAMMABLE_RESISTOR_SCRIPTS = "~/.claude/skills/programmable-resistor/scripts/res_ctrl"
-POWER_SUPPLY_SCRIPTS = "~/.claude/skills/power-supply/scripts/power_ctrl"
-OSCILLOSCOPE_SCRIPTS = "~/.claude/skills/oscilloscope/scripts/yokogawa"
+from archive import EvidenceArchiver, archive_params
+from discovery import AmbiguousDeviceError, remember, resolve
+from instruments import SCOPE_MEASURE_ITEMS, DaemonBusyError, open_bench
+from journal import Journal, journal_path, run_id
+from metrics import DEFAULT_METRICS_PORT, RunMetrics, start_server
+from pipeline import StepWorker, start
+from readback import MEASURE_POLICIES, read_current, readback_params
+from replay import RecordingBench
+from result_store import ResultStore
+from sampling import SAMPLING_DEFAULTS, adaptive_sample, in_guard_band, sampling_params
+from scope_profile import profile_params
+from settle import settle_off, settle_on, settle_params, timing_profile, trigger_params
+from timing import NULL_TRACER, Tracer
 
 # 配置文件和测试结果目录
 CONFIG_DIR = "~/.claude/skills/bin_test/config"
 RESULTS_DIR = "~/.claude/skills/bin_test/result"
+RESULT_DB = f"{RESULTS_DIR}/results.db"
 
 # 默认配置文件路径 (skill/config 目录)
 DEFAULT_CONFIG_FILE = f"{CONFIG_DIR}/bin_res_lbhb.txt"
 DEFAULT_SIGLED_FILE = f"{CONFIG_DIR}/bin_res_sigled.txt"
 
+# 波形模式写入结果文件的统计列
+WAVEFORM_COLUMNS = ["std", "p5", "p95", "ripple", "settle_time"]
+
 # LED 类型配置
 LED_TYPES = {
-    "1": {"name": "大灯", "file": DEFAULT_CONFIG_FILE, "channel_multiplier": 1},
-    "2": {"name": "信号灯", "file": DEFAULT_SIGLED_FILE, "channel_multiplier": 64},
+    "1": {"name": "大灯", "file": DEFAULT_CONFIG_FILE, "channel_multiplier": 1, "settle": "headlight"},
+    "2": {"name": "信号灯", "file": DEFAULT_SIGLED_FILE, "channel_multiplier": 64, "settle": "sigled"},
 }
 
 
@@ -69,134 +85,208 @@ def load_bin_config(config_file: str) -> dict:
                 min_r = int(res_parts[1].strip())
                 max_r = int(res_parts[2].strip())
                 current = int(parts[1].strip())
+            except (ValueError, IndexError):
+                continue
 
-                # 容差 ±5%
-                tolerance = current * 0.05
-
-                # 生成档位名称 (按顺序: BIN_LEVEL_1_典型值, BIN_LEVEL_1_最小值, BIN_LEVEL_1_最大值, ...)
-                bin_num = len(config) // 3 + 1
-                res_type_idx = len(config) % 3
-                res_types = ["典型值", "最小值", "最大值"]
-                res_type = res_types[res_type_idx]
-                bin_name = f"BIN_LEVEL_{bin_num}"
+            # 容差 ±5%
+            tolerance = current * 0.05
 
+            # 每行为一个档位, 生成 3 个测试点 (BIN_LEVEL_1_典型值, BIN_LEVEL_1_最小值, BIN_LEVEL_1_最大值, ...)
+            bin_name = f"BIN_LEVEL_{len(config) // 3 + 1}"
+            for res_type, resistance in (("典型值", centre), ("最小值", min_r), ("最大值", max_r)):
                 config[f"{bin_name}_{res_type}"] = {
                     "bin_name": bin_name,
                     "res_type": res_type,
-                    "resistance": centre if res_type == "典型值" else (min_r if res_type == "最小值" else max_r),
+                    "resistance": resistance,
                     "current": current,
                     "tolerance": tolerance,
                 }
-            except (ValueError, IndexError):
-                continue
 
     return config
 
 
-def run_command(cmd: str, cwd: str = None) -> bool:
-    """执行命令"""
-    try:
-        result = subprocess.run(cmd, shell=True, cwd=cwd, capture_output=True, text=True)
-        if result.returncode != 0:
-            print(f"  失败: {result.stderr}")
-            return False
-        return True
-    except Exception as e:
-        print(f"  错误: {e}")
-        return False
+def load_test_config(config_file: str, channel_multiplier: int = 1) -> dict:
+    """加载 BIN 配置并应用通道倍数 (信号灯需要乘以64), 失败返回 None"""
+    bin_config = load_bin_config(config_file)
+    if bin_config and channel_multiplier > 1:
+        for key in bin_config:
+            bin_config[key]["current"] *= channel_multiplier
+            bin_config[key]["tolerance"] *= channel_multiplier
+    return bin_config
+
+
+def available_bins(bin_config: dict) -> list:
+    """配置中的档位名称, 按档位号排序"""
+    return sorted({c["bin_name"] for c in bin_config.values()}, key=lambda x: int(x.split('_')[-1]))
+
+
+def select_bins(bin_names: list, levels) -> list:
+    """按档位列表选择 (数字或 BIN_LEVEL_X), 无效档位忽略"""
+    test_bins = []
+    for b in levels:
+        b = str(b).strip().upper()
+        # 尝试匹配 BIN_LEVEL_X 格式
+        if "BIN_LEVEL_" not in b and b.isdigit():
+            b = f"BIN_LEVEL_{b}"
+        if b in bin_names:
+            test_bins.append(b)
+    return test_bins
 
 
 def check_device(path: str) -> bool:
     """检查设备文件是否存在"""
-    return subprocess.run(f"test -e {path}", shell=True).returncode == 0
+    return os.path.exists(path)
+
 
+def default_res_port(backend: str) -> str:
+    """程控电阻默认串口: 发现缓存中按序列号跟踪的端口, 否则 /dev/ttyUSB0"""
+    cached = None if backend in ("sim", "replay") else resolve("resistor")
+    return cached or "/dev/ttyUSB0"
 
-def set_resistance(port: str, ohms: int) -> bool:
+
+def set_resistance(bench, ohms: int) -> bool:
     """设置程控电阻值
 
-    Note: 此函数调用底层脚本，实际使用时应通过 @programmable-resistor skill 执行
+    Note: 此函数通过仪器会话执行 (回退方式下调用 @programmable-resistor skill 脚本)
     """
     print(f"  设置电阻: {ohms}Ω")
-    scripts_path = os.path.expanduser(PROGRAMMABLE_RESISTOR_SCRIPTS)
-    cmd = f"cd {scripts_path} && uv run resistance_cli.py -p {port} -v {ohms}"
-    return run_command(cmd)
+    return bench.set_resistance(ohms)
+
+
+def off_wait(bench, settle: dict = None, tracer=NULL_TRACER, during_off=None) -> float:
+    """断电等待, 返回等待时间 (s)
+
+    Args:
+        during_off: 与断电等待并行执行的步骤 (例如设置电阻), 返回 False 表示失败;
+                    失败时本函数返回 None
+    """
+    pending = start(during_off) if during_off else None
+    with tracer.span("off_wait"):
+        if settle:
+            off_time = settle_off(bench, settle)["settle_time"]
+        else:
+            time.sleep(2)
+            off_time = 2.0
+    if pending is not None and pending.result() is False:
+        return None
+    return off_time
 
 
-def power_cycle(visa_address: str = None, voltage: float = 13.5) -> bool:
+def power_cycle(bench, voltage: float = 13.5, settle: dict = None, tracer=NULL_TRACER, during_off=None) -> dict:
     """电源上下电
 
     Args:
-        visa_address: VISA 资源地址 (留空则自动搜索第一个设备)
+        bench: 仪器会话 (见 instruments.open_bench)
         voltage: 设置电压值 (V)
+        settle: 稳定检测参数 (见 settle.settle_params), 为 None 时使用固定等待 (断电 2s, 上电 1s)
+        tracer: 步骤计时 (见 timing.Tracer)
+        during_off: 与断电等待并行执行的步骤 (见 off_wait)
 
-    Note: 此函数调用底层脚本，实际使用时应通过 @power-supply skill 执行
-    """
-    scripts_path = os.path.expanduser(POWER_SUPPLY_SCRIPTS)
-
-    # 构建命令（添加 VISA 地址参数）
-    addr_arg = f"-a {visa_address}" if visa_address else ""
+    Returns:
+        {"off_time": 断电等待 (s), "settle_time": 上电稳定耗时 (s), "stable": 是否稳定}, 失败返回 None
 
+    Note: 此函数通过仪器会话执行 (回退方式下调用 @power-supply skill 脚本)
+    """
     print("  关闭电源...")
-    off_cmd = f"cd {scripts_path} && uv run power_ctrl_cli.py {addr_arg} -o off"
-    if not run_command(off_cmd):
-        return False
+    with tracer.span("supply_off"):
+        if not bench.set_output(False):
+            return None
 
-    time.sleep(2)
+    off_time = off_wait(bench, settle, tracer, during_off)
+    if off_time is None:
+        return None
 
     print("  打开电源...")
-    on_cmd = f"cd {scripts_path} && uv run power_ctrl_cli.py {addr_arg} -v {voltage} -o on"
-    if not run_command(on_cmd):
-        return False
+    with tracer.span("supply_on"):
+        if not bench.set_output(True, voltage):
+            return None
+
+    if settle:
+        with tracer.span("settle") as attrs:
+            on = settle_on(bench, settle)
+            attrs["stable"] = on["stable"]
+        if not on["stable"]:
+            print(f"  警告: {settle['timeout']}s 内电流未稳定")
+        print(f"  稳定耗时: 断电 {off_time:.2f}s, 上电 {on['settle_time']:.2f}s ({on['samples']} 次读数)")
+        return {"off_time": off_time, "settle_time": on["settle_time"], "stable": on["stable"]}
+
+    with tracer.span("settle"):
+        time.sleep(1)
+    return {"off_time": off_time, "settle_time": 1.0, "stable": True}
+
+
+def triggered_cycle(bench, voltage: float, config: dict, trigger: dict, settle: dict = None,
+                    tracer=NULL_TRACER, during_off=None) -> dict:
+    """上下电并用示波器单次触发测量
+
+    断电等待后先在 CH4 上升沿布防单次触发 (电平为预期电流 × level_ratio)，再上电；
+    测量值为触发后 window 时间范围内的均值，不再固定等待，也不会读到上一个测试点的波形。
 
-    time.sleep(1)
-    return True
+    Args:
+        during_off: 与断电等待并行执行的步骤 (见 off_wait)
 
+    Returns:
+        {"off_time", "settle_time": 上电到读数完成的耗时 (s), "current": 均值 (未触发为 None)},
+        电源控制或触发设置失败返回 None
+    """
+    print("  关闭电源...")
+    with tracer.span("supply_off"):
+        if not bench.set_output(False):
+            return None
+
+    off_time = off_wait(bench, settle, tracer, during_off)
+    if off_time is None:
+        return None
 
-def init_power_supply(visa_address: str = None, voltage: float = 13.5) -> bool:
+    level = config["current"] * trigger["level_ratio"]
+    with tracer.span("arm"):
+        if not bench.arm_capture(4, level, trigger["window"]):
+            return None
+
+    print(f"  打开电源 (触发电平 {level:g}, 窗口 {trigger['window'][0]}-{trigger['window'][1]}s)...")
+    start = time.monotonic()
+    with tracer.span("supply_on"):
+        if not bench.set_output(True, voltage):
+            return None
+    with tracer.span("capture"):
+        current = bench.read_capture(4, trigger["timeout"])
+    settle_time = time.monotonic() - start
+    if current is not None:
+        print(f"  触发读数: {current}, 上电到读数 {settle_time:.2f}s")
+    return {"off_time": off_time, "settle_time": settle_time, "current": current}
+
+
+def init_power_supply(bench, voltage: float = 13.5) -> bool:
     """初始化电源（打开输出）
 
     Args:
-        visa_address: VISA 资源地址 (留空则自动搜索第一个设备)
+        bench: 仪器会话 (见 instruments.open_bench)
         voltage: 设置电压值 (V)
     """
-    scripts_path = os.path.expanduser(POWER_SUPPLY_SCRIPTS)
-    addr_arg = f"-a {visa_address}" if visa_address else ""
+    return bench.set_output(True, voltage)
 
-    cmd = f"cd {scripts_path} && uv run power_ctrl_cli.py {addr_arg} -v {voltage} -o on"
-    return run_command(cmd)
 
-
-def close_power_supply(visa_address: str = None) -> bool:
+def close_power_supply(bench) -> bool:
     """关闭电源（关闭输出）"""
-    scripts_path = os.path.expanduser(POWER_SUPPLY_SCRIPTS)
-    addr_arg = f"-a {visa_address}" if visa_address else ""
-
-    cmd = f"cd {scripts_path} && uv run power_ctrl_cli.py {addr_arg} -o off"
-    return run_command(cmd)
+    return bench.set_output(False)
 
 
-def measure_current() -> float:
+def measure_current(bench, interactive: bool = True) -> float:
     """使用示波器通道4测量电流平均值
 
-    Note: 此函数调用底层脚本，实际使用时应通过 @oscilloscope skill 执行
+    Note: 此函数通过仪器会话执行 (回退方式下调用 @oscilloscope skill 脚本)
+
+    Args:
+        interactive: 读取失败时提示手动输入; False 时返回 None (无人值守运行)
     """
-    scripts_path = os.path.expanduser(OSCILLOSCOPE_SCRIPTS)
     print("  正在通过示波器通道4读取电流均值...")
-    cmd = f"cd {scripts_path} && uv run yokogawa_pyvisa.py mean -c 4"
-    try:
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=10)
-        if result.returncode == 0:
-            output = result.stdout.strip()
-            try:
-                value = float(output)
-                print(f"  示波器读数: {value}")
-                return value
-            except ValueError:
-                pass
-
-        print(f"  自动读取失败: {result.stderr or output}")
-    except Exception as e:
-        print(f"  读取失败: {e}")
+    value = bench.measure_current(4)
+    if value is not None:
+        print(f"  示波器读数: {value}")
+        return value
+    if not interactive:
+        print("  示波器读取失败")
+        return None
 
     print("  请手动输入电流值:")
     while True:
@@ -207,6 +297,139 @@ def measure_current() -> float:
             print("  无效输入，请输入数字")
 
 
+def measure_readback(bench, params: dict, detail: dict, interactive: bool = True) -> float:
+    """按测量策略 (见 readback.py) 读取电流, 电源/示波器读数和交叉校验偏差写入 detail["columns"]
+
+    Args:
+        interactive: 读取失败时提示手动输入; False 时返回 None
+    """
+    print(f"  正在读取电流 ({params['policy']})...")
+    reading = read_current(bench, params)
+    columns = {"读数来源": reading["source"] or ""}
+    if reading["supply"] is not None:
+        columns["电源换算电流"] = f"{reading['supply']:.4g}"
+    if params["policy"] == "cross-check":
+        columns["示波器电流"] = "" if reading["scope"] is None else f"{reading['scope']:.4g}"
+        columns["来源偏差%"] = "" if reading["deviation"] is None else f"{reading['deviation'] * 100:+.2f}"
+        if reading["mismatch"]:
+            detail["mismatch"] = True
+            print(f"  警告: 电源换算电流 {reading['supply']:.1f} 与示波器 {reading['scope']:.1f} "
+                  f"偏差 {reading['deviation'] * 100:+.1f}%, 请检查探头")
+    detail.setdefault("columns", {}).update(columns)
+
+    if reading["value"] is not None:
+        print(f"  读数 ({reading['source']}): {reading['value']:.4g}")
+        return reading["value"]
+    if not interactive:
+        print("  电流读取失败")
+        return None
+    print("  电流读取失败, 请手动输入电流值:")
+    while True:
+        try:
+            return float(input("  > ").strip())
+        except ValueError:
+            print("  无效输入，请输入数字")
+
+
+def measure_waveform(bench, channel: int = 4) -> dict:
+    """读取通道原始波形块并在本地统计, 失败返回 None (调用方回退到示波器 Mean)"""
+    print(f"  正在读取示波器通道{channel}波形...")
+    stats = bench.waveform_stats(channel)
+    if stats is not None:
+        print(f"  均值 {stats['mean']:.4g}, 标准差 {stats['std']:.3g}, p5/p95 {stats['p5']:.4g}/{stats['p95']:.4g}, "
+              f"纹波 {stats['ripple']:.3g}, 稳定 {stats['settle_time'] * 1000:.1f}ms ({stats['samples']} 点)")
+    return stats
+
+
+def measure_channels(bench, channels: list, items: list, interactive: bool = True) -> dict:
+    """一次查询读取多个示波器通道的测量项, 失败时对主通道 (第一个) 手动输入均值
+
+    Args:
+        interactive: False 时读取失败返回 None, 不提示输入
+
+    Returns:
+        {通道: {测量项: 数值}}
+    """
+    print(f"  正在通过示波器读取 CH{', CH'.join(str(ch) for ch in channels)} ({', '.join(items)})...")
+    record = bench.measure_channels(channels, items)
+    if record is not None:
+        for ch in channels:
+            values = ", ".join(f"{item}={value}" for item, value in record[ch].items())
+            print(f"  CH{ch}: {values}")
+        return record
+    if not interactive:
+        print("  多通道读取失败")
+        return None
+
+    print(f"  多通道读取失败, 请手动输入 CH{channels[0]} 电流值:")
+    while True:
+        try:
+            return {channels[0]: {"mean": float(input("  > ").strip())}}
+        except ValueError:
+            print("  无效输入，请输入数字")
+
+
+def measure_point(bench, config: dict, options: dict, detail: dict) -> tuple:
+    """按运行选项测量一个测试点并判定
+
+    Args:
+        detail: 该测试点的附加信息, 测量项写入 detail["columns"]
+
+    Returns:
+        (主通道电流, 是否通过), 非交互运行时读取失败返回 (None, False)
+    """
+    channels = options.get("channels") or [4]
+    items = options.get("items") or ["mean"]
+    interactive = options.get("interactive", True)
+
+    stats = measure_waveform(bench) if options.get("waveform") else None
+    if stats is not None:
+        current = stats["mean"]
+        detail["columns"] = {f"WF_{name}": f"{stats[name]:.4g}" for name in WAVEFORM_COLUMNS}
+        passed = verify_result(current, config["current"], config["tolerance"])
+        if passed and options.get("waveform_pass") == "distribution":
+            from waveform import distribution_passed
+
+            passed = distribution_passed(stats, config["current"], config["tolerance"])
+            if not passed:
+                print(f"  分布判定失败: p5={stats['p5']:.1f}, p95={stats['p95']:.1f}")
+        return current, passed
+
+    if channels == [4] and items == ["mean"]:
+        readback = options.get("readback")
+        if readback and readback["policy"] != "scope":
+            current = measure_readback(bench, readback, detail, interactive)
+            read = lambda: read_current(bench, readback)["value"]
+        else:
+            current = measure_current(bench, interactive)
+            read = lambda: bench.measure_current(4)
+        if current is None:
+            return None, False
+        sampling = options.get("sampling")
+        if sampling:
+            # 临界读数: 重复读数直到置信区间能判定
+            sample = adaptive_sample(read, config["current"], config["tolerance"], first=current, **sampling)
+            detail.update(samples=sample["samples"], std=sample["std"])
+            detail.setdefault("columns", {}).update({"读数次数": sample["samples"], "不同读数": sample["distinct"],
+                                                     "标准差": f"{sample['std']:.3g}",
+                                                     "置信区间": f"{sample['ci']:.3g}"})
+            if sample["samples"] > 1:
+                print(f"  临界读数, 共 {sample['samples']} 次 ({sample['distinct']} 个不同读数): "
+                      f"均值 {sample['value']:.2f}, 标准差 {sample['std']:.3g}, "
+                      f"置信区间 ±{sample['ci']:.3g}{'' if sample['decided'] else ' (未能判定)'}")
+            current = sample["value"]
+        return current, verify_result(current, config["current"], config["tolerance"])
+
+    record = measure_channels(bench, channels, items, interactive)
+    if record is None:
+        return None, False
+    detail["columns"] = {f"CH{ch}_{item}": value for ch, values in record.items() for item, value in values.items()}
+    # 每个通道都需通过 (多探头或多个 DUT)
+    passed = all(verify_result(values["mean"], config["current"], config["tolerance"])
+                 for values in record.values())
+    return record[channels[0]]["mean"], passed
+
+
 def verify_result(current: float, expected: float, tolerance: float) -> bool:
     """验证电流是否在 ±5% 误差范围内"""
     min_c = expected - tolerance
@@ -219,7 +442,108 @@ def verify_result(current: float, expected: float, tolerance: float) -> bool:
     return passed
 
 
+def parse_items(spec: str) -> list:
+    """解析测量项列表, mean 始终在第一位 (判定使用)"""
+    items = ["mean"] + [i.strip() for i in spec.split(",") if i.strip() and i.strip() != "mean"]
+    unknown = [i for i in items if i not in SCOPE_MEASURE_ITEMS]
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            f"未知测量项: {', '.join(unknown)} (可选 {', '.join(SCOPE_MEASURE_ITEMS)})")
+    return items
+
+
+def parse_channels(spec: str) -> list:
+    try:
+        return [int(ch) for ch in spec.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"通道应为逗号分隔的数字: {spec}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="BIN 档位测试工具")
+    parser.add_argument("--backend", choices=["session", "daemon", "subprocess", "sim", "replay"], default="session",
+                        help="设备控制方式: session 保持连接 (默认), daemon 使用仪器守护进程, "
+                             "subprocess 每个动作调用一次 CLI, sim 模拟仪器, replay 回放仪器记录 (需 --replay)")
+    parser.add_argument("--dut", default="", help="DUT 序列号 (用于结果日志和 --resume)")
+    parser.add_argument("--resume", action="store_true",
+                        help="从同一配置和 DUT 的结果日志继续, 跳过已测量的测试点")
+    parser.add_argument("--db", default=RESULT_DB, help=f"结果库路径 (默认 {RESULT_DB})")
+    parser.add_argument("--no-db", action="store_true", help="不写入结果库")
+    parser.add_argument("--no-trace", action="store_true", help="不记录步骤耗时和追踪文件")
+    parser.add_argument("--sim-latency", type=float, default=1.0,
+                        help="模拟仪器延迟倍数 (默认 1.0, 0 为全速)")
+    parser.add_argument("--sim-noise", type=float, help="模拟 DUT 相对噪声 (默认 0.003)")
+    parser.add_argument("--sim-seed", type=int, help="模拟噪声随机种子")
+    parser.add_argument("--record", metavar="PATH",
+                        help="把全部仪器调用 (参数、返回值、耗时) 录制到记录文件 (gzip JSONL, 例如 run.jsonl.gz)")
+    parser.add_argument("--replay", metavar="PATH", help="回放的记录文件 (--backend replay)")
+    parser.add_argument("--replay-speed", choices=["fast", "original"], default="fast",
+                        help="回放速度: fast 全速, 不做上下电等待 (默认); original 按记录的耗时")
+    parser.add_argument("--fixed-wait", action="store_true",
+                        help="使用固定等待 (断电 2s, 上电 1s) 代替自适应稳定检测")
+    parser.add_argument("--settle-source", choices=["scope", "supply"],
+                        help="稳定检测读数来源 (默认示波器均值)")
+    parser.add_argument("--settle-tol", type=float, help="稳定检测相对容差 (例如 0.01)")
+    parser.add_argument("--settle-samples", type=int, help="连续稳定读数个数")
+    parser.add_argument("--settle-interval", type=float, help="轮询间隔 (s)")
+    parser.add_argument("--acq-period", type=float,
+                        help="示波器采集周期上限 (s), 读数不变时至少间隔这么久才视为新的采集")
+    parser.add_argument("--settle-timeout", type=float, help="稳定检测超时 (s)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="自适应重复采样: 读数落在容差限附近的保护带内时重复读数, 直到置信区间能判定")
+    parser.add_argument("--guard", type=float, help="保护带宽度, 容差的比例 (默认 0.2)")
+    parser.add_argument("--max-samples", type=int, help="临界点最多读数次数 (默认 10)")
+    parser.add_argument("--confidence", type=float, choices=[0.95, 0.99], help="置信水平 (默认 0.95)")
+    parser.add_argument("--sequential", action="store_true",
+                        help="各步骤严格依次执行 (默认在断电等待期间设置电阻, 结果在后台写入)")
+    parser.add_argument("--measure", choices=MEASURE_POLICIES, default="scope",
+                        help="电流测量策略: scope 示波器 (默认), supply 电源电流回读, fallback 电源失败时读示波器, "
+                             "cross-check 两者都读并按示波器判定, 偏差过大时告警")
+    parser.add_argument("--supply-gain", type=float, help="电源电流 (A) -> 通道电流的换算系数 (默认 1000)")
+    parser.add_argument("--supply-offset", type=float, help="电源电流换算偏置 (默认 0)")
+    parser.add_argument("--cross-tol", type=float, help="交叉校验允许的相对偏差 (默认 0.05)")
+    parser.add_argument("--no-archive", action="store_true",
+                        help="失败或保护带内的测试点不保存示波器截图和波形")
+    parser.add_argument("--metrics-port", type=int,
+                        help=f"在该端口提供运行指标 /metrics (Prometheus 文本格式, 例如 {DEFAULT_METRICS_PORT})")
+    parser.add_argument("--metrics-host", default="127.0.0.1",
+                        help="指标监听地址 (默认 127.0.0.1, 0.0.0.0 允许其他机器采集)")
+    parser.add_argument("--trigger", action="store_true",
+                        help="上电前布防示波器 CH4 上升沿单次触发, 测量触发后窗口内的均值 (代替上电等待)")
+    parser.add_argument("--trigger-window", help="触发后测量窗口 开始,结束 (s), 例如 0.1,0.3")
+    parser.add_argument("--trigger-level", type=float, help="触发电平, 预期电流的比例 (默认 0.5)")
+    parser.add_argument("--channels", type=parse_channels, default=[4],
+                        help="测量通道, 逗号分隔 (默认 4); 多个通道在一次查询中读取, 每个通道都需通过")
+    parser.add_argument("--items", type=parse_items, default=["mean"],
+                        help="测量项, 逗号分隔: mean,min,max,rms (默认 mean, 判定始终使用 mean)")
+    parser.add_argument("--scope-tdiv", type=float, help="示波器时基 (s/div), 默认保持示波器当前设置")
+    parser.add_argument("--scope-average", type=int, help="示波器平均次数 (1 为普通采集), 默认保持当前设置")
+    parser.add_argument("--scope-rlength", type=int, help="示波器记录长度 (点), 默认保持当前设置")
+    parser.add_argument("--scope-reapply", action="store_true",
+                        help="不读回示波器当前设置, 直接重新发送全部设置")
+    parser.add_argument("--waveform", action="store_true",
+                        help="读取 CH4 原始波形块并在本地统计 (需要 numpy), 代替示波器 Mean")
+    parser.add_argument("--waveform-pass", choices=["mean", "distribution"], default="mean",
+                        help="波形模式判定方式: mean 均值在容差内 (默认), distribution 另需 p5/p95 在容差内")
+    args = parser.parse_args()
+    if args.trigger:
+        # 触发采集只测量 CH4 触发窗口内的均值, 其他测量选项不起作用
+        conflicts = [flag for flag, used in (("--channels", args.channels != [4]), ("--items", args.items != ["mean"]),
+                                             ("--waveform", args.waveform), ("--adaptive", args.adaptive),
+                                             ("--measure", args.measure != "scope")) if used]
+        if conflicts:
+            parser.error(f"--trigger 只测量 CH4 均值, 不能与 {', '.join(conflicts)} 同时使用")
+    if (args.backend == "replay") != bool(args.replay):
+        parser.error("--backend replay 与 --replay 需同时使用")
+    if args.record and args.replay:
+        parser.error("--record 与 --replay 不能同时使用")
+    return args
+
+
 def main():
+    args = parse_args()
+    offline = args.backend in ("sim", "replay")
+
     print("=" * 60)
     print("BIN 档位测试工具")
     print("(每个档位测试: 典型值、最小值、最大值)")
@@ -228,17 +552,27 @@ def main():
     # 设备连接检查
     print("\n[1/5] 检查设备连接...")
 
-    # 程控电阻使用串口
-    res_port = input("  程控电阻串口号 (默认 /dev/ttyUSB0): ").strip() or "/dev/ttyUSB0"
+    # 程控电阻使用串口 (默认取发现缓存中按序列号跟踪的端口)
+    try:
+        default_port = default_res_port(args.backend)
+    except AmbiguousDeviceError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+    res_port = input(f"  程控电阻串口号 (默认 {default_port}): ").strip() or default_port
 
     # 电源使用 VISA 地址（自动发现）
     print("  电源使用 VISA 自动发现 (ITECH IT6722)")
     pwr_visa_address = input("  或手动输入 VISA 地址 (留空自动搜索): ").strip()
 
-    if not check_device(res_port):
+    if not offline and not check_device(res_port):
         print(f"  警告: 程控电阻 {res_port} 不存在")
         print("  请使用 @device-control skill 连接设备")
         sys.exit(1)
+    if not offline and res_port != resolve("resistor", rescan=False):
+        # 记录设备指纹, 重新插拔后端口号变化时自动跟踪
+        remember("resistor", res_port)
+    if not offline and pwr_visa_address:
+        remember("power", pwr_visa_address)
 
     print("  设备检查通过")
 
@@ -260,40 +594,26 @@ def main():
     config_file = input(f"  配置文件路径 (默认 {led_config['file']}): ").strip() or led_config['file']
     channel_multiplier = led_config["channel_multiplier"]
 
-    bin_config = load_bin_config(config_file)
+    bin_config = load_test_config(config_file, channel_multiplier)
 
     if not bin_config:
         print("  错误: 无法加载配置文件")
         sys.exit(1)
 
-    # 应用通道倍数 (信号灯需要乘以64)
     if channel_multiplier > 1:
-        for key in bin_config:
-            bin_config[key]["current"] *= channel_multiplier
-            bin_config[key]["tolerance"] *= channel_multiplier
         print(f"  已应用通道倍数: {channel_multiplier}x")
 
     print(f"  已加载 {len(bin_config)} 个测试点")
 
     # 获取档位列表
-    bin_names = set()
-    for key in bin_config.keys():
-        bin_names.add(bin_config[key]["bin_name"])
-    bin_names = sorted(bin_names, key=lambda x: int(x.split('_')[-1]))
+    bin_names = available_bins(bin_config)
 
     print("  可用档位:", ", ".join(bin_names))
 
     bins = input("  输入测试档位 (逗号分隔, 留空测试全部): ").strip().upper()
 
     if bins:
-        test_bins = []
-        for b in bins.split(","):
-            b = b.strip()
-            # 尝试匹配 BIN_LEVEL_X 格式
-            if "BIN_LEVEL_" not in b and b.isdigit():
-                b = f"BIN_LEVEL_{b}"
-            if b in bin_names:
-                test_bins.append(b)
+        test_bins = select_bins(bin_names, bins.split(","))
     else:
         test_bins = bin_names
 
@@ -307,45 +627,267 @@ def main():
     # 初始化电源
     print("\n[4/5] 初始化电源...")
     voltage = float(input("  输入电源电压 (默认 13.5V): ").strip() or "13.5")
-    if not init_power_supply(pwr_visa_address, voltage):
-        print("  电源初始化失败")
+    sim = {"config_file": config_file, "multiplier": channel_multiplier, "latency": args.sim_latency,
+           "noise": args.sim_noise, "seed": args.sim_seed}
+    replay = {"path": args.replay, "speed": args.replay_speed}
+    channels, items = args.channels, args.items
+    # 示波器测量配置: 打开时应用一次, 之后只发送变化的设置
+    scope_profile = profile_params(led_config["settle"], channels=channels, items=items, tdiv=args.scope_tdiv,
+                                   average=args.scope_average, record_length=args.scope_rlength)
+    try:
+        bench = open_bench(res_port, pwr_visa_address or None, mode=args.backend, sim=sim, replay=replay,
+                           scope_profile=scope_profile, reapply=args.scope_reapply)
+    except (AmbiguousDeviceError, DaemonBusyError) as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+    print(f"  设备控制方式: {bench.mode}")
+
+    # 稳定检测 (子进程方式下每次读数都要启动新进程, 无法快速轮询, 使用固定等待)
+    settle = None
+    if not args.fixed_wait and bench.mode != "subprocess":
+        settle = settle_params(led_config["settle"], source=args.settle_source or ("supply" if args.measure == "supply" else None), rel_tol=args.settle_tol,
+                               samples=args.settle_samples, interval=args.settle_interval,
+                               timeout=args.settle_timeout, acq_period=args.acq_period)
+        if bench.mode == "replay" and bench.fast:
+            # 全速回放: 读数来自记录, 不需要真实的等待时间
+            settle.update(interval=0, min_off=0, min_on=0, acq_period=0)
+    print(f"  上下电等待: {'自适应稳定检测 (' + settle['source'] + ')' if settle else '固定等待'}")
+    measured = timing_profile(led_config["settle"])
+    if measured and (settle or args.trigger):
+        print(f"  上电时序: 按特性测量 ({measured['measured_at']}), 上电等待 {measured['settle']['min_on']}s")
+
+    options = {"settle": settle, "channels": channels, "items": items,
+               "waveform": args.waveform, "waveform_pass": args.waveform_pass,
+               "tracer": NULL_TRACER if args.no_trace else Tracer(), "pipeline": not args.sequential,
+               "archive": None if args.no_archive else archive_params()}
+    if args.record:
+        bench = RecordingBench(bench, args.record, options["tracer"]).open()
+        print(f"  仪器记录: {bench.path}")
+    elif bench.mode == "replay":
+        bench.tracer = options["tracer"]
+        print(f"  回放记录: {args.replay} ({bench.header['mode']} 录制于 {bench.header['started_at']},"
+              f" {args.replay_speed})")
+    if args.trigger:
+        if bench.mode == "subprocess":
+            print("  子进程方式不支持触发采集, 使用常规上下电")
+        else:
+            window = tuple(float(t) for t in args.trigger_window.split(",")) if args.trigger_window else None
+            options["trigger"] = trigger_params(led_config["settle"], window=window, level_ratio=args.trigger_level)
+            print(f"  触发采集: 窗口 {options['trigger']['window'][0]}-{options['trigger']['window'][1]}s")
+    if args.measure != "scope" and bench.mode == "subprocess":
+        print("  子进程方式不支持电源电流回读, 使用示波器")
+    elif args.measure != "scope":
+        options["readback"] = readback_params(led_config["settle"], policy=args.measure, gain=args.supply_gain,
+                                              offset=args.supply_offset, cross_tol=args.cross_tol)
+        print(f"  电流测量: {args.measure} (电源电流 × {options['readback']['gain']:g}"
+              f" + {options['readback']['offset']:g})")
+    if args.adaptive:
+        options["sampling"] = sampling_params(guard=args.guard, max_samples=args.max_samples,
+                                              confidence=args.confidence, acq_period=args.acq_period)
+        if bench.mode == "replay" and bench.fast:
+            options["sampling"]["acq_period"] = 0
+
+    # 结果日志: 每个测试点测量完成后立即落盘
+    rid = run_id(config_file, args.dut, multiplier=channel_multiplier, voltage=voltage, channels=channels)
+    journal = Journal(journal_path(RESULTS_DIR, "bin_test", rid), resume=args.resume)
+    options["journal"] = journal
+    if args.resume:
+        options["done"] = journal.load()
+        print(f"  继续测试: 已记录 {len(options['done'])} 个测试点 ({journal.path})")
+
+    # 结果库: 每个测试点同时写入 SQLite, 便于跨运行查询
+    store = None
+    if not args.no_db:
+        store = ResultStore(args.db)
+        options["store"] = store
+        options["store_run"] = store.add_run("bin_test", led_config["name"], args.dut, voltage)
+
+    # 运行指标: 本地 HTTP 端点 (Prometheus 文本格式)
+    server = start_server(args.metrics_port, args.metrics_host) if args.metrics_port is not None else None
+    if server is not None:
+        options["metrics"] = server.add(RunMetrics({"dut": args.dut, "led": led_config["name"]}))
+
+    try:
+        if run_tests(bench, test_bins, bin_config, voltage, options) is None:
+            sys.exit(1)
+    except RuntimeError as e:
+        print(f"\n错误: {e}")
         sys.exit(1)
+    finally:
+        journal.close()
+        if store is not None:
+            store.close()
+        if server is not None:
+            server.close()
+        bench.close()
+
+
+def run_tests(bench, test_bins: list, bin_config: dict, voltage: float, options: dict = None):
+    """执行测试、输出并保存结果
+
+    Args:
+        options: 运行选项
+            settle: 稳定检测参数 (None 为固定等待)
+            channels: 测量通道列表 (默认 [4])
+            items: 测量项列表 (默认 ["mean"])
+            waveform: 是否使用波形块统计 (默认 False)
+            waveform_pass: 波形模式判定方式 "mean" / "distribution"
+            sampling: 自适应重复采样参数 (见 sampling.sampling_params), 仅单通道均值测量
+            readback: 电源电流回读参数 (见 readback.readback_params), 仅单通道均值测量
+            trigger: 单次触发采集参数 (见 settle.trigger_params), 设置时每个测试点用
+                     triggered_cycle 上电并测量 CH4 均值, 不能与其他测量选项同时使用
+            tracer: 步骤计时 (见 timing.Tracer), 结果文件旁导出追踪文件
+            journal: 结果日志 (见 journal.Journal), 每个测量完成的测试点立即追加
+            done: 已记录的测试点 {key: 日志记录}, 这些点直接使用记录结果, 不再测量
+            store / store_run: 结果库 (见 result_store.ResultStore) 和本次运行 ID
+            interactive: 读取失败时是否提示手动输入 (默认 True), False 时记为测量失败
+            pipeline: 重叠相邻步骤 (见 pipeline.py), 电阻在断电等待期间设置, 结果在后台写入
+            metrics: 运行指标 (见 metrics.RunMetrics), 每个测试点完成时更新
+            archive: 证据归档参数 (见 archive.archive_params), 失败或保护带内的测试点在后台保存
+                     示波器截图和压缩波形到 <结果文件名>_evidence/
+
+    Returns:
+        {"passed", "total", "results", "output_file"}, 电源初始化失败返回 None;
+        流水线模式下后台写入结果日志/结果库失败时, 保存 CSV 后抛出 RuntimeError
+    """
+    options = options or {}
+    settle = options.get("settle")
+    tracer = options.get("tracer") or NULL_TRACER
+    journal = options.get("journal")
+    done = options.get("done") or {}
+    store = options.get("store")
+    trigger = options.get("trigger")
+    pipelined = options.get("pipeline", False)
+
+    if not init_power_supply(bench, voltage):
+        print("  电源初始化失败")
+        return None
 
     # 执行测试
     print("\n[5/5] 执行测试...")
     results = {}
+    details = {}
+
+    # 流水线: 电阻在断电等待期间设置, 结果写入在后台线程中与下一个测试点重叠
+    writer = StepWorker("writer") if pipelined else None
+    res_track = "resistor" if pipelined else "main"
+    archiver = None
+    if options.get("archive"):
+        staging = reserve_path(f"{RESULTS_DIR}/bin_test_evidence_{time.strftime('%Y%m%d_%H%M%S')}", directory=True)
+        archiver = EvidenceArchiver(bench, staging, options["archive"], tracer)
+    guard = (options.get("sampling") or SAMPLING_DEFAULTS)["guard"]
+    metrics = options.get("metrics")
+    if metrics is not None:
+        metrics.plan(sum(1 for b in test_bins for t in ["典型值", "最小值", "最大值"]
+                         if f"{b}_{t}" in bin_config and f"{b}_{t}" not in done))
+        tracer.subscribe(metrics.observe_span)
+    point_start = time.monotonic()
+
+    def record(key, result):
+        """记录测试点结果 (并更新运行指标)"""
+        results[key] = result
+        if metrics is not None:
+            outcome = "pass" if result.startswith("通过") else "fail" if result.startswith("失败") else result
+            metrics.point_done(outcome, time.monotonic() - point_start)
+
+    def write_point(key, bin_name, res_type, config, current, passed, detail):
+        """写入结果日志和结果库 (设备错误的测试点不记录, --resume 时会重测)"""
+        with tracer.span("result_write", track="writer" if pipelined else "main"):
+            if journal is not None:
+                journal.append(key, result=results[key], measured=current, passed=passed,
+                               resistance=config["resistance"], detail=detail)
+            if store is not None:
+                store.add_point(options["store_run"], bin_name, res_type, config["resistance"],
+                                config["current"], current, passed, detail["settle_time"],
+                                samples=detail.get("samples"), std=detail.get("std"))
 
-    for bin_name in test_bins:
-        print(f"\n{'='*50}")
-        print(f"  测试 {bin_name}")
-        print(f"{'='*50}")
+    try:
+        for bin_name in test_bins:
+            print(f"\n{'='*50}")
+            print(f"  测试 {bin_name}")
+            print(f"{'='*50}")
 
-        for res_type in ["典型值", "最小值", "最大值"]:
-            key = f"{bin_name}_{res_type}"
-            if key not in bin_config:
-                continue
+            for res_type in ["典型值", "最小值", "最大值"]:
+                key = f"{bin_name}_{res_type}"
+                if key not in bin_config:
+                    continue
 
-            print(f"\n  [{bin_name}] {res_type}...")
-            config = bin_config[key]
+                print(f"\n  [{bin_name}] {res_type}...")
+                config = bin_config[key]
 
-            # 设置电阻
-            if not set_resistance(res_port, config["resistance"]):
-                results[key] = "电阻设置失败"
-                continue
+                if key in done:
+                    results[key] = done[key]["result"]
+                    details[key] = done[key].get("detail") or {}
+                    print(f"  已记录, 跳过: {results[key]}")
+                    continue
 
-            # 上下电
-            if not power_cycle(pwr_visa_address, voltage):
-                results[key] = "上下电失败"
-                continue
+                point_start = time.monotonic()
 
-            # 测量电流
-            current = measure_current()
+                # 设置电阻 (流水线方式下在断电等待期间执行)
+                res_status = {}
 
-            # 验证结果
-            if verify_result(current, config["current"], config["tolerance"]):
-                results[key] = f"通过 ({current:.1f})"
-            else:
-                results[key] = f"失败 ({current:.1f})"
+                def set_point_resistance(ohms=config["resistance"], status=res_status):
+                    with tracer.span("set_resistance", track=res_track, ohms=ohms):
+                        status["ok"] = set_resistance(bench, ohms)
+                    return status["ok"]
+
+                if not pipelined and not set_point_resistance():
+                    record(key, "电阻设置失败")
+                    continue
+                during_off = set_point_resistance if pipelined else None
+
+                # 上一个测试点的截图/波形读取完成后才能断电
+                if archiver is not None:
+                    archiver.hold()
+
+                # 上下电 (触发模式下上电前布防示波器单次触发)
+                if trigger:
+                    cycle = triggered_cycle(bench, voltage, config, trigger, settle, tracer, during_off)
+                else:
+                    cycle = power_cycle(bench, voltage, settle, tracer, during_off)
+                if not cycle:
+                    record(key, "电阻设置失败" if res_status.get("ok") is False else "上下电失败")
+                    continue
+                details[key] = {"settle_time": cycle["off_time"] + cycle["settle_time"]}
+
+                # 测量电流
+                if trigger:
+                    current = cycle["current"]
+                    passed = current is not None and verify_result(current, config["current"], config["tolerance"])
+                else:
+                    with tracer.span("scope_read"):
+                        current, passed = measure_point(bench, config, options, details[key])
+                if current is None:
+                    record(key, "电流测量失败")
+                    continue
+
+                # 验证结果
+                if passed:
+                    record(key, f"通过 ({current:.1f})")
+                else:
+                    record(key, f"失败 ({current:.1f})")
+
+                # 失败或临界的测试点: 后台保存截图和波形 (不等待)
+                if archiver is not None and (not passed or (archiver.params["guard"] and in_guard_band(
+                        current, config["current"], config["tolerance"], guard))):
+                    archiver.capture(key, "fail" if not passed else "guard",
+                                     {"resistance": config["resistance"], "expected": config["current"],
+                                      "tolerance": config["tolerance"], "measured": current})
+
+                if writer is not None:
+                    writer.submit(write_point, key, bin_name, res_type, config, current, passed, details[key])
+                else:
+                    write_point(key, bin_name, res_type, config, current, passed, details[key])
+    finally:
+        write_error = None
+        if writer is not None:
+            try:
+                writer.close()
+            except Exception as e:
+                # 结果日志/结果库缺少测试点: 先保存 CSV 并关闭电源, 最后再抛出
+                write_error = e
+        if archiver is not None:
+            archiver.drain()
 
     # 输出结果
     print("\n[6/6] 测试结果")
@@ -368,26 +910,82 @@ def main():
     passed = sum(1 for r in results.values() if "通过" in r)
     total = len(results)
     print(f"总计: {passed}/{total} 测试点通过")
+    mismatched = [key for key, detail in details.items() if detail.get("mismatch")]
+    if mismatched:
+        print(f"警告: {len(mismatched)} 个测试点电源换算电流与示波器不一致 (检查探头): {', '.join(mismatched)}")
 
     # 保存结果
     print("\n保存测试结果...")
-    output_file = save_results(test_bins, results, bin_config, passed, total)
+    with tracer.span("result_write"):
+        output_file = save_results(test_bins, results, bin_config, passed, total, details, voltage)
     print(f"结果已保存到: {output_file}")
+    if store is not None:
+        # 标记来源文件, 之后 result_store.py import 不会重复导入
+        store.set_source_file(options["store_run"], output_file)
+    if archiver is not None:
+        evidence = archiver.close(output_file)
+        if evidence:
+            print(f"失败/临界测试点的截图和波形: {evidence} ({archiver.count} 个)")
+
+    if tracer.spans:
+        print("\n步骤耗时:")
+        tracer.print_summary()
+        trace_files = tracer.export(output_file)
+        print(f"追踪文件: {', '.join(trace_files)}")
 
     # 关闭电源
     print("\n关闭电源...")
-    close_power_supply(pwr_visa_address)
+    close_power_supply(bench)
+    if write_error is not None:
+        raise RuntimeError(f"后台写入结果日志/结果库失败, 记录不完整 (CSV 已保存到 {output_file}): "
+                           f"{write_error}") from write_error
+    return {"passed": passed, "total": total, "results": results, "output_file": output_file}
+
+
+def reserve_path(path: str, directory: bool = False) -> str:
+    """独占创建 path (文件或目录), 已存在时在扩展名前加 _2, _3 ...
+
+    文件名只精确到秒, 同一秒内的多次运行 (批量作业、并行的脚本) 不会互相覆盖。
+    """
+    path = os.path.expanduser(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    base, ext = os.path.splitext(path) if not directory else (path, "")
+    n = 1
+    while True:
+        candidate = path if n == 1 else f"{base}_{n}{ext}"
+        try:
+            if directory:
+                os.mkdir(candidate)
+            else:
+                os.close(os.open(candidate, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return candidate
+        except FileExistsError:
+            n += 1
+
 
+def save_results(test_bins: list, results: dict, bin_config: dict, passed: int, total: int,
+                 details: dict = None, voltage: float = None) -> str:
+    """保存测试结果到文件
 
-def save_results(test_bins: list, results: dict, bin_config: dict, passed: int, total: int) -> str:
-    """保存测试结果到文件"""
+    Args:
+        details: 各测试点的附加信息 {key: {"settle_time": ..., "columns": {附加列名: 数值}}}
+        voltage: 电源电压 (V), 写入文件头
+    """
     from datetime import datetime
 
     # 生成文件名
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_file = f"{RESULTS_DIR}/bin_test_result_{timestamp}.csv"
+    abs_path = reserve_path(f"{RESULTS_DIR}/bin_test_result_{timestamp}.csv")
+    output_file = abs_path
 
-    abs_path = os.path.expanduser(output_file)
+    details = details or {}
+
+    # 附加列 (多通道测量项、波形统计等), 按首次出现顺序
+    extra_columns = []
+    for detail in details.values():
+        for column in detail.get("columns") or {}:
+            if column not in extra_columns:
+                extra_columns.append(column)
 
     led_type = "大灯" if "sigled" not in bin_config.get(list(bin_config.keys())[0], {}).get("bin_name", "") else "信号灯"
 
@@ -396,10 +994,14 @@ def save_results(test_bins: list, results: dict, bin_config: dict, passed: int,
         f.write(f"# 时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
         f.write(f"# LED类型: {led_type}\n")
         f.write(f"# 测试档位: {', '.join(test_bins)}\n")
+        if voltage is not None:
+            f.write(f"# 电源电压: {voltage}V\n")
         f.write(f"# 通过: {passed}/{total}\n")
         f.write("\n")
 
-        f.write("档位,类型,电阻(Ω),预期电流(mA),实测电流(mA),结果,误差(%)\n")
+        header = "档位,类型,电阻(Ω),预期电流(mA),实测电流(mA),结果,误差(%),稳定耗时(s)"
+        header += "".join(f",{column}" for column in extra_columns)
+        f.write(header + "\n")
 
         for bin_name in test_bins:
             for res_type in ["典型值", "最小值", "最大值"]:
@@ -426,7 +1028,13 @@ def save_results(test_bins: list, results: dict, bin_config: dict, passed: int,
 
                 status = "通过" if "通过" in result else "失败"
 
-                f.write(f"{bin_name},{res_type},{config.get('resistance', '-')},{expected},{measured:.1f},{status},{error_pct:.2f}\n")
+                detail = details.get(key, {})
+                settle_time = detail.get("settle_time")
+                settle_str = f"{settle_time:.2f}" if settle_time is not None else ""
+                columns = detail.get("columns") or {}
+                extra_str = "".join(f",{columns.get(column, '')}" for column in extra_columns)
+
+                f.write(f"{bin_name},{res_type},{config.get('resistance', '-')},{expected},{measured:.1f},{status},{error_pct:.2f},{settle_str}{extra_str}\n")
 
         f.write("\n")
         f.write(f"总计,,,,{passed}/{total},{passed/total*100:.1f}%\n")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+自适应重复采样 - 只对临界测试点增加读数
+
+第一次读数离容差限 (预期 ± 容差) 较远时直接判定，只读一次。
+落在保护带内 (距最近的容差限小于 guard × 容差) 时继续读数，
+每次计算均值的 t 分布置信区间: 区间完全在容差内判定通过，完全在容差外
+判定失败，达到最大读数次数仍无法判定时按均值判定并标记为未决。
+
+示波器 Mean 每次采集才更新, 连续读取得到的多半是同一个数, 标准差和置信区间
+会塌缩为 0。因此每次重复读数前至少等待 acq_period (不小于示波器的采集周期),
+并记录实际得到的不同读数个数。
+"""
+
+import math
+import statistics
+import time
+
+# 双侧 t 分布临界值, 按自由度 1..30 (超过 30 使用正态分布)
+T_CRITICAL = {
+    0.95: (12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+           2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+           2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042),
+    0.99: (63.657, 9.925, 5.841, 4.604, 4.032, 3.707, 3.499, 3.355, 3.250, 3.169,
+           3.106, 3.055, 3.012, 2.977, 2.947, 2.921, 2.898, 2.878, 2.861, 2.845,
+           2.831, 2.819, 2.807, 2.797, 2.787, 2.779, 2.771, 2.763, 2.756, 2.750),
+}
+Z_CRITICAL = {0.95: 1.960, 0.99: 2.576}
+
+# 默认采样策略
+#   guard: 保护带宽度, 容差的比例 (0.2 表示距容差限 20% 容差以内视为临界)
+#   min_samples: 临界点计算置信区间前的最少读数
+#   max_samples: 临界点最多读数
+#   confidence: 置信水平 (0.95 / 0.99)
+#   acq_period: 相邻两次读数的最短间隔 (s), 不小于示波器的采集周期
+SAMPLING_DEFAULTS = {
+    "guard": 0.2,
+    "min_samples": 3,
+    "max_samples": 10,
+    "confidence": 0.95,
+    "acq_period": 0.1,
+}
+
+
+def sampling_params(**overrides) -> dict:
+    """SAMPLING_DEFAULTS 加上覆盖项 (值为 None 的覆盖项忽略)"""
+    params = dict(SAMPLING_DEFAULTS)
+    params.update({k: v for k, v in overrides.items() if v is not None})
+    if params["confidence"] not in T_CRITICAL:
+        raise ValueError(f"不支持的置信水平: {params['confidence']}")
+    return params
+
+
+def t_critical(df: int, confidence: float = 0.95) -> float:
+    table = T_CRITICAL[confidence]
+    return table[df - 1] if df <= len(table) else Z_CRITICAL[confidence]
+
+
+def in_guard_band(value: float, expected: float, tolerance: float, guard: float) -> bool:
+    """读数距最近的容差限小于 guard × 容差"""
+    return abs(abs(value - expected) - tolerance) < guard * tolerance
+
+
+def _interval(values: list, confidence: float) -> tuple:
+    """(均值, 标准差, 置信区间半宽)"""
+    mean = statistics.fmean(values)
+    if len(values) < 2:
+        return mean, 0.0, 0.0
+    std = statistics.stdev(values)
+    return mean, std, t_critical(len(values) - 1, confidence) * std / math.sqrt(len(values))
+
+
+def adaptive_sample(read, expected: float, tolerance: float, first: float = None, guard: float = 0.2,
+                    min_samples: int = 3, max_samples: int = 10, confidence: float = 0.95,
+                    acq_period: float = 0.0, **_) -> dict:
+    """按需重复读数并判定
+
+    Args:
+        read: 读数函数, 失败返回 None (失败的读数计入次数上限)
+        first: 已有的第一次读数 (为 None 时先读一次)
+        acq_period: 相邻两次读数的最短间隔 (s), 保证每次读数来自新的采集
+
+    Returns:
+        {"value": 均值, "passed", "samples": 有效读数次数, "distinct": 不同读数的个数,
+         "std": 标准差, "ci": 置信区间半宽, "decided": 是否无需重复或置信区间已能判定},
+        第一次读数失败返回 None
+    """
+    first = read() if first is None else first
+    if first is None:
+        return None
+    read_at = time.monotonic()
+    lo, hi = expected - tolerance, expected + tolerance
+    values = [first]
+
+    def decided() -> bool:
+        mean, _, ci = _interval(values, confidence)
+        return (lo <= mean - ci and mean + ci <= hi) or mean + ci < lo or mean - ci > hi
+
+    if in_guard_band(first, expected, tolerance, guard):
+        for _ in range(max_samples - 1):
+            # 等待新的采集
+            remaining = read_at + acq_period - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+            value = read()
+            read_at = time.monotonic()
+            if value is not None:
+                values.append(value)
+            if len(values) >= min_samples and decided():
+                break
+
+    mean, std, ci = _interval(values, confidence)
+    return {"value": mean, "passed": lo <= mean <= hi, "samples": len(values), "distinct": len(set(values)),
+            "std": std, "ci": ci, "decided": len(values) == 1 or decided()}
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+示波器测量配置 (profile) - 每次运行只设置一次
+
+每次 `yokogawa_pyvisa.py mean -c 4` 都是新进程，测量前示波器的设置是什么并不
+确定。本模块把一次运行需要的示波器设置 (通道、测量项、时基、平均、记录长度)
+定义为命名的 profile，由 instruments.ScopeSession 在打开时应用:
+
+- 每项设置对应一条 SCPI 命令，全部合并为一次写入
+- 打开时先用一次查询读回 profile 涉及的全部设置，只发送与示波器当前状态不同的
+  设置; 上次运行之后在前面板或被其他程序改动的设置也会被发现并重新设置
+- 之后每次读数只剩测量值查询本身
+
+--scope-reapply 不读回, 直接重新发送全部设置。
+"""
+
+from instruments import SCOPE_MEASURE_ITEMS
+
+# 命名 profile (DLM 指令, 需与示波器手册核对)
+#   channels: 测量通道
+#   items: 打开的测量项 (见 instruments.SCOPE_MEASURE_ITEMS)
+#   tdiv: 时基 (s/div), None 保持示波器当前设置
+#   average: 平均次数, 1 为普通采集, None 保持当前设置
+#   record_length: 记录长度 (点), None 保持当前设置
+SCOPE_PROFILES = {
+    "headlight": {"channels": [4], "items": ["mean"], "tdiv": None, "average": None, "record_length": None},
+    "sigled": {"channels": [4], "items": ["mean"], "tdiv": None, "average": None, "record_length": None},
+}
+
+
+def profile_params(name: str = "headlight", **overrides) -> dict:
+    """命名 profile 的参数, 并用 overrides 中非 None 的值覆盖"""
+    if name not in SCOPE_PROFILES:
+        raise ValueError(f"未知示波器配置: {name}")
+    profile = dict(SCOPE_PROFILES[name], name=name)
+    profile.update({k: v for k, v in overrides.items() if v is not None})
+    unknown = set(profile["items"]) - set(SCOPE_MEASURE_ITEMS)
+    if unknown:
+        raise ValueError(f"未知测量项: {', '.join(sorted(unknown))}")
+    return profile
+
+
+def profile_settings(profile: dict) -> dict:
+    """profile 展开为 {设置项: SCPI 命令}, 设置项相同的命令互相替代"""
+    settings = {f"MEASure:CHANnel{ch}:{SCOPE_MEASURE_ITEMS[item]}:STATe":
+                f":MEASure:CHANnel{ch}:{SCOPE_MEASURE_ITEMS[item]}:STATe ON"
+                for ch in profile["channels"] for item in profile["items"]}
+    if profile.get("tdiv") is not None:
+        settings["TIMebase:TDIV"] = f":TIMebase:TDIV {profile['tdiv']:g}"
+    if profile.get("average") is not None:
+        if profile["average"] > 1:
+            settings["ACQuire:MODE"] = ":ACQuire:MODE AVERage"
+            settings["ACQuire:AVERage:COUNt"] = f":ACQuire:AVERage:COUNt {profile['average']}"
+        else:
+            settings["ACQuire:MODE"] = ":ACQuire:MODE NORMal"
+    if profile.get("record_length") is not None:
+        settings["ACQuire:RLENgth"] = f":ACQuire:RLENgth {profile['record_length']}"
+    return settings
+
+
+def setting_query(key: str) -> str:
+    """设置项对应的查询命令"""
+    return f":{key}?"
+
+
+def setting_matches(command: str, reply: str) -> bool:
+    """示波器读回的值 (HEADer OFF) 是否与设置命令的参数相同
+
+    数值按数值比较 (0.1 与 1.000E-01 相同); 关键字比较大写缩写部分
+    (AVERage 与 AVER 相同), ON / OFF 与 1 / 0 相同。
+    """
+    wanted = command.split(" ", 1)[1].strip()
+    reply = reply.strip().strip('"')
+    try:
+        return abs(float(reply) - float(wanted)) <= 1e-9 * max(1.0, abs(float(wanted)))
+    except ValueError:
+        pass
+    aliases = {"ON": "1", "OFF": "0"}
+    short = "".join(c for c in wanted if not c.islower()).upper()
+    reply = reply.upper()
+    return reply in (wanted.upper(), short) or aliases.get(short) == reply
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+自适应稳定检测 - 替代上下电和测量前的固定等待
+
+按配置的间隔轮询电流读数 (示波器均值或电源回读)，当连续 N 个读数都落在
+容差带内时判定稳定，超时则返回当前结果并标记为未稳定。每个测试点都会
+记录实际的稳定耗时。
+
+容差带 = max(rel_tol × |均值|, abs_tol)，abs_tol 与读数单位一致。
+
+示波器 Mean 每次采集才更新一次，两次采集之间读到的是同一个值。为避免用
+重复的旧值 (甚至上一个测试点的值) 判定稳定:
+
+- 跨过上下电沿后的第一个读数可能来自沿之前开始的采集, 丢弃不计
+- 与上一个读数相同且距上一个计入的读数不足 acq_period 的读数视为同一次
+  采集, 不计入稳定窗口 (值改变说明已是新的采集)
+"""
+
+import asyncio
+import json
+import os
+import time
+
+# 各 LED 类型的默认参数
+#   interval: 轮询间隔 (s)
+#   acq_period: 采集周期上限 (s), 读数不变时至少间隔这么久才视为新的采集
+#   rel_tol / abs_tol: 相对 / 绝对容差带
+#   samples: 连续稳定读数个数
+#   timeout: 单次等待超时 (s)
+#   min_off: 断电后最短等待 (s), 保证 DUT 完全掉电以便重新读取 BIN 电阻
+#   min_on: 上电后开始轮询前的最短等待 (s)
+#   source: 读数来源, 见 SETTLE_SOURCES
+SETTLE_DEFAULTS = {
+    "headlight": {
+        "source": "scope",
+        "interval": 0.05,
+        "acq_period": 0.1,
+        "rel_tol": 0.01,
+        "abs_tol": 0.002,
+        "samples": 5,
+        "timeout": 5.0,
+        "min_off": 0.5,
+        "min_on": 0.1,
+    },
+    "sigled": {
+        "source": "scope",
+        "interval": 0.05,
+        "acq_period": 0.1,
+        "rel_tol": 0.01,
+        "abs_tol": 0.005,
+        "samples": 5,
+        "timeout": 5.0,
+        "min_off": 0.5,
+        "min_on": 0.2,
+    },
+}
+
+# 示波器单次触发采集的默认参数 (见 run_bin_test.triggered_cycle)
+#   level_ratio: 触发电平, 预期电流的比例 (CH4 上升沿)
+#   window: 触发后的测量时间范围 (开始, 结束) (s)
+#   timeout: 上电后等待触发的超时 (s)
+TRIGGER_DEFAULTS = {
+    "headlight": {"level_ratio": 0.5, "window": (0.1, 0.3), "timeout": 3.0},
+    "sigled": {"level_ratio": 0.5, "window": (0.2, 0.4), "timeout": 3.0},
+}
+
+# 上电特性测量 (characterize.py) 保存的时序配置, 按 LED 类型:
+#   {"headlight": {"measured_at", "dut", "levels": {档位: 特性}, "settle": {...}, "trigger": {...}}}
+# settle_params / trigger_params 用其中的 "settle" / "trigger" 覆盖上面的默认值
+TIMING_PROFILE_FILE = "~/.claude/skills/bin_test/result/timing_profiles.json"
+
+# 源读数函数: 示波器均值 / 电源电流回读
+SETTLE_SOURCES = {
+    "scope": lambda bench: bench.measure_current(4),
+    "supply": lambda bench: bench.measure_supply_current(),
+}
+
+
+def load_timing_profiles(path: str = TIMING_PROFILE_FILE) -> dict:
+    """读取全部时序配置, 文件不存在或损坏时返回 {}"""
+    try:
+        with open(os.path.expanduser(path), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def timing_profile(led_type: str, path: str = TIMING_PROFILE_FILE) -> dict:
+    """LED 类型的时序配置, 没有测量过时返回 None"""
+    return load_timing_profiles(path).get(led_type)
+
+
+def save_timing_profile(led_type: str, profile: dict, path: str = TIMING_PROFILE_FILE):
+    """保存 LED 类型的时序配置 (替换该类型原有配置, 原子写入)"""
+    path = os.path.expanduser(path)
+    profiles = load_timing_profiles(path)
+    profiles[led_type] = profile
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(profiles, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def settle_params(led_type: str = "headlight", **overrides) -> dict:
+    """获取 LED 类型的默认参数 (有时序配置时按其覆盖), 并用 overrides 中非 None 的值覆盖"""
+    params = dict(SETTLE_DEFAULTS.get(led_type, SETTLE_DEFAULTS["headlight"]))
+    params.update((timing_profile(led_type) or {}).get("settle", {}))
+    params.update({k: v for k, v in overrides.items() if v is not None})
+    return params
+
+
+def trigger_params(led_type: str = "headlight", **overrides) -> dict:
+    """获取 LED 类型的触发采集参数 (有时序配置时按其覆盖), 并用 overrides 中非 None 的值覆盖"""
+    params = dict(TRIGGER_DEFAULTS.get(led_type, TRIGGER_DEFAULTS["headlight"]))
+    params.update((timing_profile(led_type) or {}).get("trigger", {}))
+    params.update({k: v for k, v in overrides.items() if v is not None})
+    if isinstance(params["window"], list):
+        params["window"] = tuple(params["window"])
+    return params
+
+
+def _push(window: list, value: float, samples: int, rel_tol: float, abs_tol: float) -> bool:
+    """加入一个读数, 返回窗口是否已满且落在容差带内"""
+    window.append(value)
+    if len(window) > samples:
+        window.pop(0)
+    if len(window) < samples:
+        return False
+    band = max(rel_tol * abs(sum(window) / samples), abs_tol)
+    return max(window) - min(window) <= band
+
+
+def _fresh(state: dict, value: float, acq_period: float) -> bool:
+    """读数是否来自新的采集 (见模块说明), state 记录上一个读数, 初始为 {}"""
+    now = time.monotonic()
+    if "last" not in state:
+        # 跨沿后的第一个读数
+        state.update(last=value, counted_at=now)
+        return False
+    if value == state["last"] and now - state["counted_at"] < acq_period:
+        return False
+    state.update(last=value, counted_at=now)
+    return True
+
+
+def _result(window: list, start: float, count: int, fresh: int, stable: bool) -> dict:
+    mean = sum(window) / len(window) if window else None
+    return {"value": mean, "settle_time": time.monotonic() - start, "samples": count, "fresh": fresh,
+            "stable": stable}
+
+
+def wait_stable(read, interval: float = 0.05, rel_tol: float = 0.01, abs_tol: float = 0.0,
+                samples: int = 5, timeout: float = 5.0, min_wait: float = 0.0, acq_period: float = 0.0,
+                **_) -> dict:
+    """轮询 read() 直到连续 samples 个新采集的读数落在容差带内
+
+    Args:
+        read: 无参读数函数, 读取失败时返回 None
+        min_wait: 开始轮询前的最短等待 (s), 计入稳定耗时
+        acq_period: 采集周期上限 (s), 见模块说明
+
+    Returns:
+        {"value": 稳定窗口均值, "settle_time": 稳定耗时 (s), "samples": 总读数次数,
+         "fresh": 计入稳定判定的读数次数, "stable": 是否稳定}
+    """
+    start = time.monotonic()
+    if min_wait > 0:
+        time.sleep(min_wait)
+
+    window = []
+    state = {}
+    count = fresh = 0
+    while True:
+        value = read()
+        count += 1
+        if value is not None and _fresh(state, value, acq_period):
+            fresh += 1
+            if _push(window, value, samples, rel_tol, abs_tol):
+                return _result(window, start, count, fresh, True)
+        if time.monotonic() - start >= timeout:
+            return _result(window, start, count, fresh, False)
+        time.sleep(interval)
+
+
+async def wait_stable_async(read, interval: float = 0.05, rel_tol: float = 0.01, abs_tol: float = 0.0,
+                            samples: int = 5, timeout: float = 5.0, min_wait: float = 0.0,
+                            acq_period: float = 0.0, **_) -> dict:
+    """wait_stable 的协程版本, read 为无参协程函数"""
+    start = time.monotonic()
+    if min_wait > 0:
+        await asyncio.sleep(min_wait)
+
+    window = []
+    state = {}
+    count = fresh = 0
+    while True:
+        value = await read()
+        count += 1
+        if value is not None and _fresh(state, value, acq_period):
+            fresh += 1
+            if _push(window, value, samples, rel_tol, abs_tol):
+                return _result(window, start, count, fresh, True)
+        if time.monotonic() - start >= timeout:
+            return _result(window, start, count, fresh, False)
+        await asyncio.sleep(interval)
+
+
+def settle_off(bench, params: dict) -> dict:
+    """断电后等待: 至少 min_off 秒, 且电流读数稳定"""
+    source = SETTLE_SOURCES[params["source"]]
+    return wait_stable(lambda: source(bench), min_wait=params["min_off"], **params)
+
+
+def settle_on(bench, params: dict) -> dict:
+    """上电后等待电流稳定"""
+    source = SETTLE_SOURCES[params["source"]]
+    return wait_stable(lambda: source(bench), min_wait=params["min_on"], **params)
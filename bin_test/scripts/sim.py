@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+模拟仪器后端 - 无硬件时运行和计时测试流程
+
+提供与 instruments.py 中会话相同接口的模拟 RM550、IT6722 和 DLM，
+共享一个模拟 DUT:
+
+- DUT 只在上电时读取 BIN 电阻 (与真实 DUT 一致, 改电阻后必须上下电)
+- 按 bin_test/config 中的 BIN 表把电阻映射为电流: 电阻落在某档位的
+  [最小值, 最大值] 内取该档电流, 落在档位间隙时取最近档位
+- 上电后电流按一阶指数上升, 断电后指数衰减, 并叠加高斯噪声
+- 示波器按固定周期采集, 同一采集周期内重复读取得到相同的测量值和波形
+- 每个设备操作有可配置的延迟
+
+用法:
+    python3 run_bin_test.py --backend sim
+    python3 run_bin_test.py --backend sim --sim-latency 0   # 全速运行
+"""
+
+import math
+import os
+import random
+import time
+
+from instruments import SCOPE_DIVISIONS, SCOPE_MEASURE_ITEMS, SCOPE_TRIGGER_POSITION, Bench, scope_tdiv
+
+# 各设备单次操作的默认延迟 (s), 接近真实设备的往返时间
+SIM_LATENCY = {
+    "resistor": 0.02,
+    "power": 0.01,
+    "scope": 0.02,
+}
+
+# 模拟 DUT 默认参数
+#   tau_on / tau_off: 上电 / 断电电流时间常数 (s)
+#   noise: 相对噪声 (标准差)
+#   supply_ratio: 电源电流 (A) / LED 电流 (mA)
+#   inrush: 上电冲击峰值, 档位电流的比例 (0 为无冲击)
+#   tau_inrush: 冲击衰减时间常数 (s), 需大于 tau_on
+SIM_DUT_DEFAULTS = {
+    "tau_on": 0.03,
+    "tau_off": 0.05,
+    "noise": 0.003,
+    "supply_ratio": 0.001,
+    "inrush": 0.0,
+    "tau_inrush": 0.06,
+}
+
+# 1x1 像素 PNG, 模拟截图使用
+_PNG_1X1 = bytes.fromhex(
+    "89504e470d0a1a0a0000000d49484452000000010000000108000000003a7e9b55"
+    "0000000a49444154789c636000000002000148afa4710000000049454e44ae426082"
+)
+
+
+def load_bin_table(config_file: str) -> list:
+    """读取 BIN 表, 返回 [(最小值, 最大值, 电流), ...]"""
+    table = []
+    with open(os.path.expanduser(config_file), "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = line.split(";")
+            if len(parts) != 2:
+                continue
+            res_parts = parts[0].split(":")
+            if len(res_parts) != 3:
+                continue
+            try:
+                table.append((int(res_parts[1]), int(res_parts[2]), int(parts[1])))
+            except ValueError:
+                continue
+    return table
+
+
+class SimDut:
+    """模拟 DUT: 上电时锁存 BIN 电阻, 输出对应档位电流"""
+
+    def __init__(self, config_file: str, multiplier: int = 1, channel: int = 4, seed: int = None, **params):
+        self.table = load_bin_table(config_file)
+        self.multiplier = multiplier
+        self.channel = channel
+        self.params = dict(SIM_DUT_DEFAULTS, **{k: v for k, v in params.items() if v is not None})
+        self.rng = random.Random(seed)
+        self.resistance = None
+        self.latched = 0.0
+        self.output = False
+        self.voltage = 0.0
+        self.changed_at = time.monotonic()
+        self.level_at_change = 0.0
+
+    def target_for(self, resistance) -> float:
+        """电阻对应的档位电流 (mA), 开路或无档位时为 0"""
+        if resistance is None or not self.table:
+            return 0.0
+        best = min(self.table, key=lambda row: max(row[0] - resistance, resistance - row[1], 0))
+        return float(best[2] * self.multiplier)
+
+    def _level(self, now, exp=math.exp):
+        """无噪声电流 (mA); now 为 NumPy 数组时传入 exp=np.exp"""
+        dt = now - self.changed_at
+        if self.output:
+            tau = self.params["tau_on"]
+            level = self.latched + (self.level_at_change - self.latched) * exp(-dt / tau)
+            if self.params["inrush"]:
+                # 双指数脉冲, 峰值归一化为 inrush × 档位电流
+                slow = self.params["tau_inrush"]
+                t_peak = math.log(slow / tau) * tau * slow / (slow - tau)
+                peak = math.exp(-t_peak / slow) - math.exp(-t_peak / tau)
+                level = level + self.latched * self.params["inrush"] / peak * (exp(-dt / slow) - exp(-dt / tau))
+            return level
+        tau = self.params["tau_off"]
+        return self.level_at_change * exp(-dt / tau)
+
+    def set_output(self, on: bool):
+        now = time.monotonic()
+        self.level_at_change = self._level(now)
+        if on and not self.output:
+            # 上电时读取 BIN 电阻
+            self.latched = self.target_for(self.resistance)
+        self.output = on
+        self.changed_at = now
+
+    def current(self, now: float = None) -> float:
+        """带噪声的 LED 电流 (mA)"""
+        level = self._level(time.monotonic() if now is None else now)
+        return level * (1 + self.rng.gauss(0, self.params["noise"])) if level > 0 else 0.0
+
+
+class _SimSession:
+    def __init__(self, dut: SimDut, latency: float):
+        self.dut = dut
+        self.latency = latency
+
+    def _wait(self):
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SimResistorSession(_SimSession):
+    def __init__(self, dut: SimDut, latency: float, port: str = "SIM"):
+        super().__init__(dut, latency)
+        self.port = port
+
+    def set_resistance(self, ohms) -> bool:
+        self._wait()
+        self.dut.resistance = None if str(ohms).upper() == "OPEN" else int(ohms)
+        return True
+
+
+class SimPowerSupplySession(_SimSession):
+    def __init__(self, dut: SimDut, latency: float):
+        super().__init__(dut, latency)
+        self.visa_address = "SIM::IT6722::INSTR"
+
+    def set_voltage(self, voltage: float):
+        self._wait()
+        self.dut.voltage = float(voltage)
+
+    def set_current_limit(self, current: float):
+        self._wait()
+
+    def set_output(self, on: bool, voltage: float = None):
+        # 与 PowerSupplySession 相同, 电压和输出合并为一次写入
+        self._wait()
+        if voltage is not None:
+            self.dut.voltage = float(voltage)
+        self.dut.set_output(on)
+
+    def resync(self) -> dict:
+        return {"VOLT": self.dut.voltage, "OUTP": self.dut.output}
+
+    def measure_current(self) -> float:
+        self._wait()
+        return self.dut.current() * self.dut.params["supply_ratio"]
+
+    def measure_voltage(self) -> float:
+        self._wait()
+        return self.dut.voltage if self.dut.output else 0.0
+
+
+class SimScopeSession(_SimSession):
+    """模拟示波器: DUT 电流接在 dut.channel 上, 其他通道为 0"""
+
+    # 模拟波形块: 采样率与长度
+    sample_rate = 1e6
+    record_length = 10000
+    # 连续采集周期 (s): 记录长度 10 ms 加上处理死区时间, 测量值每个周期更新一次
+    acquisition_time = 0.02
+
+    def __init__(self, dut: SimDut, latency: float):
+        super().__init__(dut, latency)
+        self.visa_address = "SIM::DLM::INSTR"
+        self._armed = None
+        # 最近一次采集的结果 {键: (采集序号, 结果)}
+        self._acquired = {}
+        # 上一次 fresh 读取的采集序号
+        self._last_fresh = None
+
+    def _channel_current(self, channel: int, now: float = None) -> float:
+        return self.dut.current(now) if channel == self.dut.channel else 0.0
+
+    def _acquisition(self) -> int:
+        """最近一次完成的采集序号, 采集在 序号 × acquisition_time 时刻结束"""
+        return math.floor(time.monotonic() / self.acquisition_time)
+
+    def _latest(self, key, compute):
+        """同一采集周期内返回缓存的结果, 否则按采集结束时刻 compute(结束时刻) 计算"""
+        index = self._acquisition()
+        cached = self._acquired.get(key)
+        if cached is None or cached[0] != index:
+            cached = (index, compute(index * self.acquisition_time))
+            self._acquired[key] = cached
+        return cached[1]
+
+    def _acquired_current(self, channel: int) -> float:
+        # 采集结束于上下电之前时取切换时的电流
+        return self._latest(("mean", channel),
+                            lambda end: self._channel_current(channel, max(end, self.dut.changed_at)))
+
+    def read_mean(self, channel: int = 4) -> float:
+        self._wait()
+        return self._acquired_current(channel)
+
+    def measure_channels(self, channels: list, items: list = ("mean",)) -> dict:
+        self._wait()
+        record = {}
+        for ch in channels:
+            base = self._acquired_current(ch)
+            spread = base * self.dut.params["noise"] * 2
+            values = {"mean": base, "min": base - spread, "max": base + spread, "rms": base}
+            record[ch] = {item: values[item] for item in items if item in SCOPE_MEASURE_ITEMS}
+        return record
+
+    def read_waveform(self, channel: int = 4, length: int = None) -> dict:
+        import numpy as np
+
+        self._wait()
+        n = min(length or self.record_length, self.record_length)
+
+        # 波形为最近一次采集的最后 n 个采样点
+        def acquire(end):
+            return self._samples(channel, end - (n - 1 - np.arange(n)) / self.sample_rate)
+
+        samples = self._latest(("wave", channel, n), acquire)
+        return {"samples": samples, "sample_rate": self.sample_rate, "channel": channel}
+
+    def _next_acquisition(self):
+        """等待上一次 fresh 读取之后的新一次采集完成"""
+        index = self._acquisition()
+        if self._last_fresh is not None and index <= self._last_fresh:
+            index = self._last_fresh + 1
+            while self._acquisition() < index:
+                time.sleep(max(0.001, index * self.acquisition_time - time.monotonic()))
+        self._last_fresh = index
+
+    def read_block(self, channel: int = 4, length: int = None, fresh: bool = False) -> dict:
+        """read_waveform 的采样点按固定量程量化为 int16 (满量程为 BIN 表最大电流的 2.5 倍)
+
+        fresh=True 时先等待新的一次采集 (与 ScopeSession.read_block 相同)。
+        """
+        import numpy as np
+
+        if fresh:
+            self._next_acquisition()
+        wf = self.read_waveform(channel, length)
+        full_scale = max((row[2] for row in self.dut.table), default=1) * self.dut.multiplier * 2.5
+        scale = full_scale / 32000
+        raw = np.clip(np.round(wf["samples"] / scale), -32768, 32767).astype("<i2")
+        return {"raw": raw, "scale": scale, "offset": 0.0, "sample_rate": wf["sample_rate"], "channel": channel}
+
+    def _samples(self, channel: int, t):
+        """时刻 t (NumPy 数组) 的带噪声采样点; 上下电之前的时刻取切换时的电流"""
+        import numpy as np
+
+        if channel != self.dut.channel:
+            return np.zeros(len(t))
+        dut = self.dut
+        samples = np.where(t < dut.changed_at, dut.level_at_change, dut._level(t, np.exp))
+        rng = np.random.default_rng(dut.rng.getrandbits(32))
+        return samples * (1 + rng.normal(0, dut.params["noise"], len(t)))
+
+    def arm_single(self, channel: int, level: float, window: tuple):
+        self._wait()
+        self._armed = {"channel": channel, "level": level, "window": window, "at": time.monotonic()}
+
+    def _trigger_time(self) -> float:
+        """已布防后 DUT 电流越过触发电平的时刻, 尚未越过返回 None"""
+        dut, armed = self.dut, self._armed
+        if armed["channel"] != dut.channel or not dut.output or dut.changed_at < armed["at"]:
+            return None
+        start, target, level = dut.level_at_change, dut.latched, armed["level"]
+        if start >= level:
+            return dut.changed_at
+        if target <= level:
+            return None
+        return dut.changed_at + dut.params["tau_on"] * math.log((target - start) / (target - level))
+
+    def read_triggered(self, channel: int, timeout: float) -> float:
+        self._wait()
+        if self._armed is None:
+            return None
+        deadline = time.monotonic() + timeout
+        try:
+            trigger = self._trigger_time()
+            while trigger is None or trigger > time.monotonic():
+                if time.monotonic() >= deadline:
+                    return None
+                time.sleep(0.005)
+                trigger = self._trigger_time()
+            start, end = self._armed["window"]
+            # 等待测量窗口采集完成
+            remaining = trigger + end - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+            times = [trigger + start + (end - start) * i / 99 for i in range(100)]
+            return sum(self._channel_current(channel, t) for t in times) / len(times)
+        finally:
+            self._armed = None
+
+    def read_triggered_waveform(self, channel: int, timeout: float, length: int = None) -> dict:
+        """触发点在记录的 SCOPE_TRIGGER_POSITION% 处, 时基按测量窗口结束时间选择"""
+        import numpy as np
+
+        self._wait()
+        if self._armed is None:
+            return None
+        deadline = time.monotonic() + timeout
+        try:
+            trigger = self._trigger_time()
+            while trigger is None or trigger > time.monotonic():
+                if time.monotonic() >= deadline:
+                    return None
+                time.sleep(0.005)
+                trigger = self._trigger_time()
+            n = min(length or self.record_length, self.record_length)
+            sample_rate = self.record_length / (SCOPE_DIVISIONS * scope_tdiv(self._armed["window"][1]))
+            trigger_index = int(self.record_length * SCOPE_TRIGGER_POSITION / 100)
+            t = trigger + (np.arange(n) - trigger_index) / sample_rate
+            # 等待采集完成
+            remaining = trigger + (self.record_length - trigger_index) / sample_rate - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+            return {"samples": self._samples(channel, t), "sample_rate": sample_rate, "channel": channel,
+                    "trigger_index": trigger_index}
+        finally:
+            self._armed = None
+
+    def screenshot(self, path: str) -> str:
+        self._wait()
+        abs_path = os.path.expanduser(path)
+        with open(abs_path, "wb") as f:
+            f.write(_PNG_1X1)
+        return abs_path
+
+
+class SimBench(Bench):
+    """由模拟会话组成的 Bench, 对外方法与真实 Bench 相同"""
+
+    mode = "sim"
+
+    def __init__(self, config_file: str, multiplier: int = 1, latency: float = 1.0, res_port: str = "SIM",
+                 **dut_params):
+        """
+        Args:
+            config_file: BIN 配置文件, 模拟 DUT 按此表输出电流
+            multiplier: 通道倍数 (信号灯为 64)
+            latency: 延迟倍数, 乘以 SIM_LATENCY (0 为全速)
+            dut_params: 覆盖 SIM_DUT_DEFAULTS 的 DUT 参数, 以及 seed
+        """
+        self.dut = SimDut(config_file, multiplier, **dut_params)
+        self.res_port = res_port
+        self.resistor = SimResistorSession(self.dut, SIM_LATENCY["resistor"] * latency, res_port)
+        self.power = SimPowerSupplySession(self.dut, SIM_LATENCY["power"] * latency)
+        self.scope = SimScopeSession(self.dut, SIM_LATENCY["scope"] * latency)
+        self._owns_scope = True
+
+    def open(self):
+        return self
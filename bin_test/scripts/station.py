@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+多夹具并行 BIN 测试工站 (asyncio)
+
+每个夹具有独立的 RM550 和电源通道，共用一台 4 通道 DLM 示波器
+(每个夹具对应一个通道)。各夹具的设置电阻、上下电、稳定等待并行执行，
+对共享仪器 (示波器) 的访问由 InstrumentScheduler 串行化。
+所有夹具的结果合并写入同一个报告文件。
+
+用法:
+    python3 station.py --fixture A,/dev/ttyUSB0,USB0::0x2EC7::0x6700::800001::INSTR,1 \\
+                       --fixture B,/dev/ttyUSB1,USB0::0x2EC7::0x6700::800002::INSTR,2 \\
+                       --led 1 --levels 1,2,3 --voltage 13.5
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime
+
+from instruments import Bench, ScopeSession
+from metrics import DEFAULT_METRICS_PORT, RunMetrics, start_server
+from result_store import ResultStore
+from run_bin_test import LED_TYPES, RESULT_DB, RESULTS_DIR, load_bin_config, reserve_path
+from scope_profile import profile_params
+from settle import settle_params, wait_stable_async
+from timing import NULL_TRACER, Tracer
+
+
+class InstrumentScheduler:
+    """按仪器名称串行化访问, 阻塞的设备 I/O 在线程中执行"""
+
+    def __init__(self):
+        self._locks = {}
+
+    def lock(self, name: str) -> asyncio.Lock:
+        if name not in self._locks:
+            self._locks[name] = asyncio.Lock()
+        return self._locks[name]
+
+    async def run(self, name: str, func, *args):
+        async with self.lock(name):
+            return await asyncio.to_thread(func, *args)
+
+
+class Fixture:
+    """一个测试夹具: 独立的电阻和电源, 共享示波器上的一个通道"""
+
+    def __init__(self, name: str, bench, channel: int, scheduler: InstrumentScheduler, tracer=NULL_TRACER,
+                 metrics=None):
+        self.name = name
+        self.bench = bench
+        self.channel = channel
+        self.scheduler = scheduler
+        self.tracer = tracer
+        # 运行指标 (见 metrics.RunMetrics), 只统计本夹具 track 的 span
+        self.metrics = metrics
+        if metrics is not None:
+            tracer.subscribe(metrics.observe_span)
+
+    def log(self, msg: str):
+        print(f"  [{self.name}] {msg}")
+
+    async def set_resistance(self, ohms) -> bool:
+        return await self.scheduler.run(f"{self.name}.resistor", self.bench.set_resistance, ohms)
+
+    async def set_output(self, on: bool, voltage: float = None) -> bool:
+        return await self.scheduler.run(f"{self.name}.power", self.bench.set_output, on, voltage)
+
+    async def measure_current(self) -> float:
+        return await self.scheduler.run("scope", self.bench.measure_current, self.channel)
+
+    async def measure_supply_current(self) -> float:
+        return await self.scheduler.run(f"{self.name}.power", self.bench.measure_supply_current)
+
+    async def read(self, source: str) -> float:
+        if source == "supply":
+            return await self.measure_supply_current()
+        return await self.measure_current()
+
+    def _record(self, point: dict) -> dict:
+        """测试点的空结果 (未测量)"""
+        return {
+            "fixture": self.name,
+            "bin_name": point["bin_name"],
+            "res_type": point["res_type"],
+            "resistance": point["resistance"],
+            "expected": point["current"],
+            "tolerance": point["tolerance"],
+            "measured": None,
+            "passed": False,
+            "settle_time": None,
+            "error": "",
+        }
+
+    async def test_point(self, point: dict, voltage: float, settle: dict) -> dict:
+        """执行一个测试点: 断电 -> 设置电阻 (与断电等待并行) -> 上电 -> 稳定 -> 测量"""
+        record = self._record(point)
+        read = lambda: self.read(settle["source"])
+        span = lambda name: self.tracer.span(name, track=self.name)
+
+        with span("supply_off"):
+            ok = await self.set_output(False)
+        if not ok:
+            record["error"] = "上下电失败"
+            return record
+
+        # DUT 只在上电时读取电阻, 电阻在断电等待期间设置
+        async def set_resistance():
+            with self.tracer.span("set_resistance", track=f"{self.name}.resistor"):
+                return await self.set_resistance(point["resistance"])
+
+        with span("off_wait"):
+            ok, off = await asyncio.gather(set_resistance(),
+                                           wait_stable_async(read, min_wait=settle["min_off"], **settle))
+        if not ok:
+            record["error"] = "电阻设置失败"
+            return record
+        with span("supply_on"):
+            ok = await self.set_output(True, voltage)
+        if not ok:
+            record["error"] = "上下电失败"
+            return record
+        with span("settle"):
+            on = await wait_stable_async(read, min_wait=settle["min_on"], **settle)
+        record["settle_time"] = off["settle_time"] + on["settle_time"]
+
+        with span("scope_read"):
+            measured = await self.measure_current()
+        if measured is None:
+            record["error"] = "电流测量失败"
+            return record
+
+        record["measured"] = measured
+        record["passed"] = abs(measured - point["current"]) <= point["tolerance"]
+        status = "通过" if record["passed"] else "失败"
+        self.log(f"{point['bin_name']} {point['res_type']}: {measured:.1f} "
+                 f"(预期 {point['current']} ± {point['tolerance']:.1f}) [{status}] 稳定 {record['settle_time']:.2f}s")
+        return record
+
+    async def run(self, points: list, voltage: float, settle: dict) -> list:
+        records = []
+        if self.metrics is not None:
+            self.metrics.plan(len(points))
+        try:
+            if not await self.set_output(True, voltage):
+                # 电源没有打开, 不能在断电的 DUT 上测量: 本夹具的全部测试点记为失败
+                self.log("电源初始化失败, 本夹具的全部测试点记为失败")
+                records = [dict(self._record(point), error="上下电失败") for point in points]
+                if self.metrics is not None:
+                    for record in records:
+                        self.metrics.point_done(record["error"])
+                return records
+            for point in points:
+                start = time.monotonic()
+                record = await self.test_point(point, voltage, settle)
+                records.append(record)
+                if self.metrics is not None:
+                    outcome = record["error"] or ("pass" if record["passed"] else "fail")
+                    self.metrics.point_done(outcome, time.monotonic() - start)
+        finally:
+            await self.set_output(False)
+        return records
+
+
+def parse_fixture(spec: str) -> dict:
+    """解析夹具描述: 名称,电阻串口,电源VISA地址,示波器通道"""
+    parts = spec.split(",")
+    if len(parts) != 4:
+        raise argparse.ArgumentTypeError(f"夹具格式应为 名称,串口,VISA地址,通道: {spec}")
+    name, port, address, channel = (p.strip() for p in parts)
+    return {"name": name, "res_port": port, "visa_address": address or None, "channel": int(channel)}
+
+
+def check_fixtures(specs: list):
+    """多个夹具时每个夹具必须指定各自的电源地址和电阻串口, 否则抛出 ValueError
+
+    地址留空时会自动发现同一台电源, 各夹具会互相给对方的 DUT 上下电。
+    """
+    if len(specs) < 2:
+        return
+    for key, label in (("visa_address", "电源VISA地址"), ("res_port", "电阻串口")):
+        missing = [spec["name"] for spec in specs if not spec[key]]
+        if missing:
+            raise ValueError(f"多夹具时必须为每个夹具指定{label}: {', '.join(missing)}")
+        seen = {}
+        for spec in specs:
+            if spec[key] in seen:
+                raise ValueError(f"夹具 {seen[spec[key]]} 和 {spec['name']} 使用同一{label}: {spec[key]}")
+            seen[spec[key]] = spec["name"]
+
+
+def select_points(bin_config: dict, levels: str) -> list:
+    """按档位列表 (逗号分隔数字或 BIN_LEVEL_X, 留空为全部) 选择测试点"""
+    wanted = None
+    if levels:
+        wanted = set()
+        for b in levels.upper().split(","):
+            b = b.strip()
+            wanted.add(f"BIN_LEVEL_{b}" if b.isdigit() else b)
+    return [c for c in bin_config.values() if wanted is None or c["bin_name"] in wanted]
+
+
+def save_station_results(records: list, led_name: str, elapsed: float) -> str:
+    """所有夹具的结果合并写入一个 CSV"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_file = reserve_path(f"{RESULTS_DIR}/bin_station_result_{timestamp}.csv")
+
+    passed = sum(1 for r in records if r["passed"])
+    fixtures = sorted({r["fixture"] for r in records})
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write("# BIN 多夹具测试结果\n")
+        f.write(f"# 时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(f"# LED类型: {led_name}\n")
+        f.write(f"# 夹具: {', '.join(fixtures)}\n")
+        f.write(f"# 通过: {passed}/{len(records)}\n")
+        f.write(f"# 耗时: {elapsed:.1f}s ({len(records) / elapsed * 3600:.0f} 点/小时)\n")
+        f.write("\n")
+        f.write("夹具,档位,类型,电阻(Ω),预期电流(mA),实测电流(mA),结果,误差(%),稳定耗时(s),备注\n")
+        for r in records:
+            measured = r["measured"]
+            error_pct = ((measured - r["expected"]) / r["expected"] * 100) if measured and r["expected"] else 0.0
+            measured_str = f"{measured:.1f}" if measured is not None else ""
+            settle_str = f"{r['settle_time']:.2f}" if r["settle_time"] is not None else ""
+            status = "通过" if r["passed"] else "失败"
+            f.write(f"{r['fixture']},{r['bin_name']},{r['res_type']},{r['resistance']},{r['expected']},"
+                    f"{measured_str},{status},{error_pct:.2f},{settle_str},{r['error']}\n")
+    return output_file
+
+
+def store_station_results(db_path: str, records: list, led_name: str, voltage: float, output_file: str):
+    """所有夹具的结果作为一次运行写入结果库"""
+    with ResultStore(db_path) as store:
+        run = store.add_run("station", led_name, voltage=voltage,
+                            source_file=output_file)
+        for r in records:
+            store.add_point(run, r["bin_name"], r["res_type"], r["resistance"], r["expected"], r["measured"],
+                            r["passed"], r["settle_time"], fixture=r["fixture"], commit=False)
+        store.conn.commit()
+
+
+async def run_station(fixtures: list, points: list, voltage: float, settle: dict) -> list:
+    """所有夹具并行运行, 返回合并后的结果"""
+    per_fixture = await asyncio.gather(*(fx.run(points, voltage, settle) for fx in fixtures))
+    return [r for records in per_fixture for r in records]
+
+
+def open_fixtures(specs: list, scope_address: str, scheduler: InstrumentScheduler, tracer=NULL_TRACER,
+                  server=None, labels: dict = None, scope_profile: dict = None):
+    """打开共享示波器和各夹具设备
+
+    server: 运行指标服务 (见 metrics.MetricsServer), 每个夹具一组指标 (fixture 标签)
+    scope_profile: 示波器测量配置 (见 scope_profile.py), 通道取各夹具的通道
+    """
+    check_fixtures(specs)
+    if scope_profile is not None:
+        scope_profile = dict(scope_profile, channels=sorted({spec["channel"] for spec in specs}))
+    scope = ScopeSession(scope_address, profile=scope_profile)
+    scope.open()
+    fixtures = []
+    try:
+        for spec in specs:
+            bench = Bench(spec["res_port"], spec["visa_address"], scope=scope).open()
+            metrics = None
+            if server is not None:
+                metrics = server.add(RunMetrics(dict(labels or {}, fixture=spec["name"]), track=spec["name"]))
+            fixtures.append(Fixture(spec["name"], bench, spec["channel"], scheduler, tracer, metrics))
+    except Exception:
+        for fx in fixtures:
+            fx.bench.close()
+        scope.close()
+        raise
+    return scope, fixtures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多夹具并行 BIN 测试工站")
+    parser.add_argument("--fixture", action="append", type=parse_fixture, required=True,
+                        help="夹具: 名称,电阻串口,电源VISA地址,示波器通道 (可重复)")
+    parser.add_argument("--scope", help="示波器 VISA 地址 (留空自动搜索 Yokogawa)")
+    parser.add_argument("--led", choices=sorted(LED_TYPES), default="1", help="LED 类型: 1 大灯, 2 信号灯")
+    parser.add_argument("--config", help="BIN 配置文件 (默认按 LED 类型选择)")
+    parser.add_argument("--levels", default="", help="测试档位, 逗号分隔 (留空测试全部)")
+    parser.add_argument("--voltage", type=float, default=13.5, help="电源电压 (默认 13.5V)")
+    parser.add_argument("--db", default=RESULT_DB, help=f"结果库路径 (默认 {RESULT_DB})")
+    parser.add_argument("--no-db", action="store_true", help="不写入结果库")
+    parser.add_argument("--metrics-port", type=int,
+                        help=f"在该端口提供运行指标 /metrics (Prometheus 文本格式, 例如 {DEFAULT_METRICS_PORT})")
+    parser.add_argument("--metrics-host", default="127.0.0.1", help="指标监听地址 (默认 127.0.0.1)")
+    args = parser.parse_args()
+    try:
+        check_fixtures(args.fixture)
+    except ValueError as e:
+        parser.error(str(e))
+
+    led_config = LED_TYPES[args.led]
+    bin_config = load_bin_config(args.config or led_config["file"])
+    if not bin_config:
+        print("错误: 无法加载配置文件")
+        sys.exit(1)
+    for c in bin_config.values():
+        c["current"] *= led_config["channel_multiplier"]
+        c["tolerance"] *= led_config["channel_multiplier"]
+
+    points = select_points(bin_config, args.levels)
+    if not points:
+        print("错误: 没有可测试的档位")
+        sys.exit(1)
+
+    scheduler = InstrumentScheduler()
+    tracer = Tracer()
+    server = start_server(args.metrics_port, args.metrics_host) if args.metrics_port is not None else None
+    try:
+        scope, fixtures = open_fixtures(args.fixture, args.scope, scheduler, tracer, server,
+                                        {"led": led_config["name"]}, profile_params(led_config["settle"]))
+    except Exception as e:
+        print(f"错误: 设备打开失败: {e}")
+        sys.exit(1)
+
+    settle = settle_params(led_config["settle"])
+    print(f"夹具: {', '.join(fx.name for fx in fixtures)}, 每个夹具 {len(points)} 个测试点")
+
+    start = time.monotonic()
+    try:
+        records = asyncio.run(run_station(fixtures, points, args.voltage, settle))
+    finally:
+        for fx in fixtures:
+            fx.bench.close()
+        scope.close()
+        if server is not None:
+            server.close()
+    elapsed = time.monotonic() - start
+
+    passed = sum(1 for r in records if r["passed"])
+    print(f"\n总计: {passed}/{len(records)} 测试点通过, 耗时 {elapsed:.1f}s "
+          f"({len(records) / elapsed * 3600:.0f} 点/小时)")
+    with tracer.span("result_write"):
+        output_file = save_station_results(records, led_config["name"], elapsed)
+        if not args.no_db:
+            store_station_results(args.db, records, led_config["name"], args.voltage, output_file)
+    print(f"结果已保存到: {output_file}")
+
+    print("\n步骤耗时:")
+    tracer.print_summary()
+    print(f"追踪文件: {', '.join(tracer.export(output_file))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+BIN 电源电压扫描 - 电阻 × 电压矩阵
+
+对每个测试点 (档位电阻) 只设置一次电阻、只上下电一次 (DUT 在上电时读取
+BIN 电阻)，之后在不断电的情况下逐个切换电源电压并测量，得到
+电阻 × 电压的电流矩阵。与按电压逐次重跑整个测试相比，电阻写入和上下电
+次数减少为原来的 1/电压个数。
+
+若 DUT 不允许带电改变电压，使用 --cycle-each 在每个电压下重新上下电
+(电阻仍只设置一次)。
+
+用法:
+    python3 sweep.py --led 1 --levels 1,2,3 --voltages 9:16:1
+    python3 sweep.py --led 2 --voltages 9,13.5,16 --cycle-each
+    python3 sweep.py --backend sim --sim-latency 0 --levels 1 --voltages 9:16:0.5
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime
+
+from discovery import AmbiguousDeviceError
+from instruments import DaemonBusyError, open_bench
+from result_store import ResultStore
+from run_bin_test import (LED_TYPES, RESULT_DB, RESULTS_DIR, available_bins, check_device, default_res_port,
+                          load_test_config, measure_current, power_cycle, reserve_path, select_bins,
+                          set_resistance)
+from settle import settle_on, settle_params
+from timing import NULL_TRACER, Tracer
+
+RES_TYPES = ["典型值", "最小值", "最大值"]
+
+
+def parse_voltages(spec: str) -> list:
+    """解析电压列表: 逗号分隔, 每项为单个电压或 起始:结束:步进 (含结束值)"""
+    voltages = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if ":" in part:
+            start, stop, step = (float(x) for x in part.split(":"))
+            if step <= 0:
+                raise argparse.ArgumentTypeError(f"步进必须大于 0: {part}")
+            n = int(round((stop - start) / step))
+            voltages.extend(round(start + i * step, 3) for i in range(n + 1))
+        else:
+            voltages.append(float(part))
+    if not voltages:
+        raise argparse.ArgumentTypeError("电压列表为空")
+    return voltages
+
+
+def step_voltage(bench, voltage: float, settle: dict = None, tracer=NULL_TRACER) -> dict:
+    """不断电切换电源电压并等待电流稳定
+
+    Returns:
+        {"settle_time", "stable"}, 失败返回 None
+    """
+    print(f"  切换电压: {voltage}V")
+    with tracer.span("voltage_step", voltage=voltage):
+        if not bench.set_voltage(voltage):
+            return None
+    with tracer.span("settle") as attrs:
+        if settle:
+            on = settle_on(bench, settle)
+            attrs["stable"] = on["stable"]
+            return {"settle_time": on["settle_time"], "stable": on["stable"]}
+        time.sleep(1)
+    return {"settle_time": 1.0, "stable": True}
+
+
+def sweep_point(bench, config: dict, voltages: list, settle: dict = None, cycle_each: bool = False,
+                tracer=NULL_TRACER) -> dict:
+    """对一个测试点扫描全部电压
+
+    Returns:
+        {电压: {"measured", "passed", "settle_time", "error"}}
+    """
+    cells = {v: {"measured": None, "passed": False, "settle_time": None, "error": ""} for v in voltages}
+
+    with tracer.span("set_resistance", ohms=config["resistance"]):
+        ok = set_resistance(bench, config["resistance"])
+    if not ok:
+        for cell in cells.values():
+            cell["error"] = "电阻设置失败"
+        return cells
+
+    for i, voltage in enumerate(voltages):
+        cell = cells[voltage]
+        if i == 0 or cycle_each:
+            # 上下电使 DUT 读取新电阻
+            step = power_cycle(bench, voltage, settle, tracer)
+            if step is not None:
+                step = {"settle_time": step["off_time"] + step["settle_time"], "stable": step["stable"]}
+        else:
+            step = step_voltage(bench, voltage, settle, tracer)
+        if step is None:
+            cell["error"] = "电源控制失败"
+            continue
+        cell["settle_time"] = step["settle_time"]
+
+        with tracer.span("scope_read"):
+            measured = measure_current(bench, interactive=False)
+        if measured is None:
+            cell["error"] = "电流测量失败"
+            continue
+        cell["measured"] = measured
+        cell["passed"] = abs(measured - config["current"]) <= config["tolerance"]
+        status = "通过" if cell["passed"] else "失败"
+        print(f"  {voltage}V: {measured:.1f} (预期 {config['current']} ± {config['tolerance']:.1f}) [{status}]")
+    return cells
+
+
+def run_sweep(bench, test_bins: list, bin_config: dict, voltages: list, settle: dict = None,
+              cycle_each: bool = False, tracer=NULL_TRACER) -> dict:
+    """扫描所有测试点, 返回 {key: {电压: 单元格}}"""
+    matrix = {}
+    if not bench.set_output(True, voltages[0]):
+        print("  电源初始化失败")
+        return None
+    try:
+        for bin_name in test_bins:
+            for res_type in RES_TYPES:
+                key = f"{bin_name}_{res_type}"
+                if key not in bin_config:
+                    continue
+                print(f"\n  [{bin_name}] {res_type} ({bin_config[key]['resistance']}Ω)...")
+                matrix[key] = sweep_point(bench, bin_config[key], voltages, settle, cycle_each, tracer)
+    finally:
+        bench.set_output(False)
+    return matrix
+
+
+def print_matrix(matrix: dict, bin_config: dict, voltages: list):
+    header = f"{'档位':<14} {'类型':<6} {'电阻':>7} {'预期':>7} " + " ".join(f"{v:>8g}V" for v in voltages)
+    print(header)
+    print("-" * (40 + 10 * len(voltages)))
+    for key, cells in matrix.items():
+        c = bin_config[key]
+        values = []
+        for v in voltages:
+            cell = cells[v]
+            if cell["measured"] is None:
+                values.append(f"{'--':>9}")
+            else:
+                values.append(f"{cell['measured']:>8.1f}{' ' if cell['passed'] else '*'}")
+        print(f"{c['bin_name']:<14} {c['res_type']:<6} {c['resistance']:>7} {c['current']:>7g} " + " ".join(values))
+    print("(* 超出容差, -- 测量失败)")
+
+
+def save_matrix(matrix: dict, bin_config: dict, voltages: list, led_name: str, cycle_each: bool) -> str:
+    """保存电阻 × 电压矩阵: 每行一个测试点, 每个电压一列实测电流"""
+    output_file = reserve_path(f"{RESULTS_DIR}/bin_sweep_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+
+    cells = [cell for row in matrix.values() for cell in row.values()]
+    passed = sum(1 for cell in cells if cell["passed"])
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write("# BIN 电压扫描结果 (电阻 × 电压, 单元格为实测电流 mA)\n")
+        f.write(f"# 时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(f"# LED类型: {led_name}\n")
+        f.write(f"# 电压: {', '.join(f'{v:g}' for v in voltages)}\n")
+        f.write(f"# 每个电压上下电: {'是' if cycle_each else '否'}\n")
+        f.write(f"# 通过: {passed}/{len(cells)}\n")
+        f.write("\n")
+        f.write("档位,类型,电阻(Ω),预期电流(mA)," + ",".join(f"{v:g}V" for v in voltages) + ",通过\n")
+        for key, row in matrix.items():
+            c = bin_config[key]
+            values = [f"{row[v]['measured']:.2f}" if row[v]["measured"] is not None else "" for v in voltages]
+            n_pass = sum(1 for v in voltages if row[v]["passed"])
+            f.write(f"{c['bin_name']},{c['res_type']},{c['resistance']},{c['current']},"
+                    f"{','.join(values)},{n_pass}/{len(voltages)}\n")
+    return output_file
+
+
+def store_matrix(db_path: str, matrix: dict, bin_config: dict, led_name: str, dut: str, output_file: str):
+    """矩阵的每个单元格作为一个测试点写入结果库 (电压列区分)"""
+    with ResultStore(db_path) as store:
+        run = store.add_run("sweep", led_name, dut, source_file=output_file)
+        for key, row in matrix.items():
+            c = bin_config[key]
+            for voltage, cell in row.items():
+                store.add_point(run, c["bin_name"], c["res_type"], c["resistance"], c["current"], cell["measured"],
+                                cell["passed"], cell["settle_time"], voltage=voltage, commit=False)
+        store.conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BIN 电源电压扫描 (电阻 × 电压矩阵)")
+    parser.add_argument("--voltages", type=parse_voltages, default=parse_voltages("9:16:1"),
+                        help="电压列表, 逗号分隔, 支持 起始:结束:步进 (默认 9:16:1)")
+    parser.add_argument("--led", choices=sorted(LED_TYPES), default="1", help="LED 类型: 1 大灯, 2 信号灯")
+    parser.add_argument("--config", help="BIN 配置文件 (默认按 LED 类型选择)")
+    parser.add_argument("--levels", default="", help="测试档位, 逗号分隔 (留空测试全部)")
+    parser.add_argument("--cycle-each", action="store_true", help="每个电压重新上下电 (DUT 不允许带电改变电压时)")
+    parser.add_argument("--backend", choices=["session", "daemon", "subprocess", "sim"], default="session",
+                        help="设备控制方式 (默认 session)")
+    parser.add_argument("-p", "--res-port", help="程控电阻串口 (默认取发现缓存, 否则 /dev/ttyUSB0)")
+    parser.add_argument("-a", "--visa-address", help="电源 VISA 地址 (留空自动搜索)")
+    parser.add_argument("--fixed-wait", action="store_true", help="使用固定等待代替自适应稳定检测")
+    parser.add_argument("--dut", default="", help="DUT 序列号 (写入结果库)")
+    parser.add_argument("--db", default=RESULT_DB, help=f"结果库路径 (默认 {RESULT_DB})")
+    parser.add_argument("--no-db", action="store_true", help="不写入结果库")
+    parser.add_argument("--no-trace", action="store_true", help="不记录步骤耗时和追踪文件")
+    parser.add_argument("--sim-latency", type=float, default=1.0, help="模拟设备延迟倍数 (0 为全速)")
+    args = parser.parse_args()
+
+    led_config = LED_TYPES[args.led]
+    config_file = args.config or led_config["file"]
+    bin_config = load_test_config(config_file, led_config["channel_multiplier"])
+    if not bin_config:
+        print("错误: 无法加载配置文件")
+        sys.exit(1)
+    bin_names = available_bins(bin_config)
+    test_bins = select_bins(bin_names, args.levels.split(",")) if args.levels else bin_names
+    if not test_bins:
+        print("错误: 没有可测试的档位")
+        sys.exit(1)
+    try:
+        args.res_port = args.res_port or default_res_port(args.backend)
+        if args.backend != "sim" and not check_device(args.res_port):
+            print(f"错误: 程控电阻 {args.res_port} 不存在")
+            sys.exit(1)
+
+        sim = {"config_file": config_file, "multiplier": led_config["channel_multiplier"], "latency": args.sim_latency}
+        bench = open_bench(args.res_port, args.visa_address, mode=args.backend, sim=sim)
+    except (AmbiguousDeviceError, DaemonBusyError) as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+    settle = None
+    if not args.fixed_wait and bench.mode != "subprocess":
+        settle = settle_params(led_config["settle"])
+    tracer = NULL_TRACER if args.no_trace else Tracer()
+
+    n_points = sum(1 for b in test_bins for t in RES_TYPES if f"{b}_{t}" in bin_config)
+    print(f"扫描: {n_points} 个测试点 × {len(args.voltages)} 个电压 ({bench.mode})")
+    print(f"电压: {', '.join(f'{v:g}' for v in args.voltages)}V, "
+          f"上下电 {n_points * len(args.voltages) if args.cycle_each else n_points} 次")
+
+    start = time.monotonic()
+    try:
+        matrix = run_sweep(bench, test_bins, bin_config, args.voltages, settle, args.cycle_each, tracer)
+    finally:
+        bench.close()
+    if matrix is None:
+        sys.exit(1)
+    elapsed = time.monotonic() - start
+
+    print(f"\n电流矩阵 (mA), 耗时 {elapsed:.1f}s:")
+    print_matrix(matrix, bin_config, args.voltages)
+    with tracer.span("result_write"):
+        output_file = save_matrix(matrix, bin_config, args.voltages, led_config["name"], args.cycle_each)
+        if not args.no_db:
+            store_matrix(args.db, matrix, bin_config, led_config["name"], args.dut, output_file)
+    print(f"结果已保存到: {output_file}")
+
+    if tracer.spans:
+        print("\n步骤耗时:")
+        tracer.print_summary()
+        print(f"追踪文件: {', '.join(tracer.export(output_file))}")
+
+
+if __name__ == "__main__":
+    main()
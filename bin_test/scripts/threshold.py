@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+BIN 阈值查找 - 用程控电阻二分查找相邻档位的切换电阻
+
+BIN 表只给出每个档位的 典型值:最小值:最大值，常规测试只验证这三个点。
+本脚本在相邻两档的典型值之间二分电阻: 每次设置电阻、上下电、测量电流，
+按电流判断 DUT 落在哪一档，直到区间小于分辨率，得到 DUT 实际的切换电阻，
+并给出相对配置 最大值 (下档) / 最小值 (上档) 的裕量。
+
+每个边界约需 log2(区间/分辨率) 次测量，相邻边界共用典型值处的测量。
+假设 DUT 的档位随电阻单调变化。
+
+用法:
+    python3 threshold.py --led 1                 # 全部 22 个边界
+    python3 threshold.py --led 1 --levels 1,12   # BIN_LEVEL_1|2 和 BIN_LEVEL_12|13
+    python3 threshold.py --backend sim --sim-latency 0 --levels 1,2,3
+"""
+
+import argparse
+import math
+import sys
+import time
+from datetime import datetime
+
+from discovery import AmbiguousDeviceError
+from instruments import DaemonBusyError, open_bench
+from run_bin_test import (LED_TYPES, RESULTS_DIR, available_bins, check_device, default_res_port,
+                          load_test_config, measure_current, power_cycle, reserve_path, select_bins,
+                          set_resistance)
+from settle import settle_params
+from timing import NULL_TRACER, Tracer
+
+# 默认分辨率 (Ω), RM550 的最小步进
+DEFAULT_RESOLUTION = 1
+
+
+class LevelProbe:
+    """设置电阻 -> 上下电 -> 测量, 同一电阻的测量结果缓存复用"""
+
+    def __init__(self, bench, voltage: float, settle: dict = None, tracer=NULL_TRACER):
+        self.bench = bench
+        self.voltage = voltage
+        self.settle = settle
+        self.tracer = tracer
+        self.cache = {}
+        self.count = 0
+
+    def measure(self, ohms: int) -> float:
+        """电阻 ohms 下的 DUT 电流, 失败返回 None"""
+        if ohms in self.cache:
+            return self.cache[ohms]
+        with self.tracer.span("set_resistance", ohms=ohms):
+            ok = set_resistance(self.bench, ohms)
+        if not ok or power_cycle(self.bench, self.voltage, self.settle, self.tracer) is None:
+            return None
+        with self.tracer.span("scope_read"):
+            current = measure_current(self.bench, interactive=False)
+        self.count += 1
+        if current is not None:
+            self.cache[ohms] = current
+        return current
+
+
+def classify(current: float, lower: dict, upper: dict) -> str:
+    """按电流判断落在下档 ("lower") 还是上档 ("upper"), 两档容差外返回 None"""
+    d_lower = abs(current - lower["current"])
+    d_upper = abs(current - upper["current"])
+    if min(d_lower - lower["tolerance"], d_upper - upper["tolerance"]) > 0:
+        return None
+    return "lower" if d_lower <= d_upper else "upper"
+
+
+def find_threshold(probe: LevelProbe, lower: dict, upper: dict, resolution: int = DEFAULT_RESOLUTION) -> dict:
+    """在下档典型值和上档典型值之间二分查找切换电阻
+
+    Args:
+        lower / upper: 相邻两档的配置 {"typical", "min", "max", "current", "tolerance"}
+
+    Returns:
+        {"threshold": 上档的第一个电阻 (Ω), "lo", "hi": 最终区间, "steps": 测量次数, "error": 错误说明}
+    """
+    start_count = probe.count
+    lo, hi = lower["typical"], upper["typical"]
+    result = {"threshold": None, "lo": lo, "hi": hi, "steps": 0, "error": ""}
+
+    # 两端必须分别落在下档和上档
+    for ohms, expected in ((lo, "lower"), (hi, "upper")):
+        current = probe.measure(ohms)
+        side = classify(current, lower, upper) if current is not None else None
+        if side != expected:
+            result["error"] = f"{ohms}Ω 处电流 {current} 不在{'下' if expected == 'lower' else '上'}档"
+            result["steps"] = probe.count - start_count
+            return result
+
+    while hi - lo > resolution:
+        mid = (lo + hi) // 2
+        current = probe.measure(mid)
+        if current is None:
+            result["error"] = f"{mid}Ω 处测量失败"
+            break
+        side = classify(current, lower, upper)
+        if side is None:
+            result["error"] = f"{mid}Ω 处电流 {current:.1f} 不属于相邻两档"
+            break
+        print(f"    {mid}Ω -> {current:.1f} ({'下档' if side == 'lower' else '上档'}), 区间 [{lo}, {hi}]")
+        if side == "lower":
+            lo = mid
+        else:
+            hi = mid
+
+    result.update(lo=lo, hi=hi, steps=probe.count - start_count)
+    if not result["error"]:
+        result["threshold"] = hi
+    return result
+
+
+def boundary_margins(lower: dict, upper: dict, threshold: int) -> dict:
+    """切换电阻相对配置窗口的裕量 (正值表示配置窗口完全落在 DUT 档位内)
+
+    下档裕量 = 阈值 - 下档最大值, 上档裕量 = 上档最小值 - 阈值, 百分比相对各自的配置值。
+    """
+    lower_margin = threshold - 1 - lower["max"]
+    upper_margin = upper["min"] - threshold
+    return {
+        "lower_margin": lower_margin,
+        "lower_margin_pct": lower_margin / lower["max"] * 100,
+        "upper_margin": upper_margin,
+        "upper_margin_pct": upper_margin / upper["min"] * 100,
+    }
+
+
+def level_table(bin_config: dict, bin_names: list) -> list:
+    """按档位顺序整理为 [{"bin_name", "typical", "min", "max", "current", "tolerance"}, ...]"""
+    table = []
+    for name in bin_names:
+        typical = bin_config[f"{name}_典型值"]
+        table.append({"bin_name": name, "typical": typical["resistance"],
+                      "min": bin_config[f"{name}_最小值"]["resistance"],
+                      "max": bin_config[f"{name}_最大值"]["resistance"],
+                      "current": typical["current"], "tolerance": typical["tolerance"]})
+    return table
+
+
+def run_thresholds(probe: LevelProbe, table: list, lower_levels: list, resolution: int) -> list:
+    """查找各边界, lower_levels 为边界下档的档位名称"""
+    records = []
+    index = {row["bin_name"]: i for i, row in enumerate(table)}
+    for name in lower_levels:
+        i = index[name]
+        if i + 1 >= len(table):
+            continue
+        lower, upper = table[i], table[i + 1]
+        span = upper["typical"] - lower["typical"]
+        print(f"\n  {lower['bin_name']} | {upper['bin_name']}: [{lower['typical']}, {upper['typical']}]Ω, "
+              f"约 {math.ceil(math.log2(max(span / resolution, 1)))} 步")
+        found = find_threshold(probe, lower, upper, resolution)
+        record = {"lower": lower, "upper": upper, **found}
+        if found["threshold"] is not None:
+            record.update(boundary_margins(lower, upper, found["threshold"]))
+            print(f"  切换电阻: {found['threshold']}Ω ({found['steps']} 次测量), "
+                  f"裕量 下档 {record['lower_margin']:+d}Ω ({record['lower_margin_pct']:+.1f}%), "
+                  f"上档 {record['upper_margin']:+d}Ω ({record['upper_margin_pct']:+.1f}%)")
+        else:
+            print(f"  失败: {found['error']}")
+        records.append(record)
+    return records
+
+
+def save_thresholds(records: list, led_name: str, resolution: int, voltage: float) -> str:
+    output_file = reserve_path(f"{RESULTS_DIR}/bin_threshold_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    passed = sum(1 for r in records if r["threshold"] is not None and r["lower_margin"] >= 0 and r["upper_margin"] >= 0)
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write("# BIN 阈值查找结果\n")
+        f.write(f"# 时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(f"# LED类型: {led_name}\n")
+        f.write(f"# 电压: {voltage}V, 分辨率: {resolution}Ω\n")
+        f.write(f"# 通过: {passed}/{len(records)}\n")
+        f.write("\n")
+        f.write("下档,上档,下档最大值(Ω),切换电阻(Ω),上档最小值(Ω),下档裕量(Ω),下档裕量(%),"
+                "上档裕量(Ω),上档裕量(%),测量次数,结果,备注\n")
+        for r in records:
+            lower, upper = r["lower"], r["upper"]
+            if r["threshold"] is None:
+                f.write(f"{lower['bin_name']},{upper['bin_name']},{lower['max']},,{upper['min']},,,,,"
+                        f"{r['steps']},失败,{r['error']}\n")
+                continue
+            ok = r["lower_margin"] >= 0 and r["upper_margin"] >= 0
+            f.write(f"{lower['bin_name']},{upper['bin_name']},{lower['max']},{r['threshold']},{upper['min']},"
+                    f"{r['lower_margin']},{r['lower_margin_pct']:.2f},{r['upper_margin']},{r['upper_margin_pct']:.2f},"
+                    f"{r['steps']},{'通过' if ok else '失败'},\n")
+    return output_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BIN 阈值查找 (二分程控电阻)")
+    parser.add_argument("--led", choices=sorted(LED_TYPES), default="1", help="LED 类型: 1 大灯, 2 信号灯")
+    parser.add_argument("--config", help="BIN 配置文件 (默认按 LED 类型选择)")
+    parser.add_argument("--levels", default="",
+                        help="边界的下档档位, 逗号分隔 (例如 1 表示 BIN_LEVEL_1|2, 留空查找全部边界)")
+    parser.add_argument("--resolution", type=int, default=DEFAULT_RESOLUTION,
+                        help=f"分辨率 (Ω, 默认 {DEFAULT_RESOLUTION})")
+    parser.add_argument("--voltage", type=float, default=13.5, help="电源电压 (默认 13.5V)")
+    parser.add_argument("--backend", choices=["session", "daemon", "subprocess", "sim"], default="session",
+                        help="设备控制方式 (默认 session)")
+    parser.add_argument("-p", "--res-port", help="程控电阻串口 (默认取发现缓存, 否则 /dev/ttyUSB0)")
+    parser.add_argument("-a", "--visa-address", help="电源 VISA 地址 (留空自动搜索)")
+    parser.add_argument("--fixed-wait", action="store_true", help="使用固定等待代替自适应稳定检测")
+    parser.add_argument("--no-trace", action="store_true", help="不记录步骤耗时和追踪文件")
+    parser.add_argument("--sim-latency", type=float, default=1.0, help="模拟设备延迟倍数 (0 为全速)")
+    args = parser.parse_args()
+
+    led_config = LED_TYPES[args.led]
+    config_file = args.config or led_config["file"]
+    bin_config = load_test_config(config_file, led_config["channel_multiplier"])
+    if not bin_config:
+        print("错误: 无法加载配置文件")
+        sys.exit(1)
+    bin_names = available_bins(bin_config)
+    lower_levels = select_bins(bin_names, args.levels.split(",")) if args.levels else bin_names[:-1]
+    if not lower_levels:
+        print("错误: 没有可查找的边界")
+        sys.exit(1)
+    try:
+        args.res_port = args.res_port or default_res_port(args.backend)
+        if args.backend != "sim" and not check_device(args.res_port):
+            print(f"错误: 程控电阻 {args.res_port} 不存在")
+            sys.exit(1)
+
+        sim = {"config_file": config_file, "multiplier": led_config["channel_multiplier"], "latency": args.sim_latency}
+        bench = open_bench(args.res_port, args.visa_address, mode=args.backend, sim=sim)
+    except (AmbiguousDeviceError, DaemonBusyError) as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+    settle = None
+    if not args.fixed_wait and bench.mode != "subprocess":
+        settle = settle_params(led_config["settle"])
+    tracer = NULL_TRACER if args.no_trace else Tracer()
+    probe = LevelProbe(bench, args.voltage, settle, tracer)
+
+    print(f"阈值查找: {len(lower_levels)} 个边界, 分辨率 {args.resolution}Ω ({bench.mode})")
+    start = time.monotonic()
+    try:
+        if not bench.set_output(True, args.voltage):
+            print("错误: 电源初始化失败")
+            sys.exit(1)
+        records = run_thresholds(probe, level_table(bin_config, bin_names), lower_levels, args.resolution)
+    finally:
+        bench.set_output(False)
+        bench.close()
+    elapsed = time.monotonic() - start
+
+    print(f"\n{'边界':<28} {'下档最大':>9} {'切换电阻':>9} {'上档最小':>9} {'下档裕量':>10} {'上档裕量':>10}")
+    print("-" * 84)
+    for r in records:
+        name = f"{r['lower']['bin_name']} | {r['upper']['bin_name']}"
+        if r["threshold"] is None:
+            print(f"{name:<28} {r['lower']['max']:>9} {'--':>9} {r['upper']['min']:>9}  {r['error']}")
+            continue
+        print(f"{name:<28} {r['lower']['max']:>9} {r['threshold']:>9} {r['upper']['min']:>9} "
+              f"{r['lower_margin_pct']:>+9.1f}% {r['upper_margin_pct']:>+9.1f}%")
+    print(f"共 {probe.count} 次测量, 耗时 {elapsed:.1f}s")
+
+    with tracer.span("result_write"):
+        output_file = save_thresholds(records, led_config["name"], args.resolution, args.voltage)
+    print(f"结果已保存到: {output_file}")
+    if tracer.spans:
+        print("\n步骤耗时:")
+        tracer.print_summary()
+        print(f"追踪文件: {', '.join(tracer.export(output_file))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+测试步骤计时 - 结构化 span 与追踪文件导出
+
+每个步骤 (设置电阻、断电、断电等待、上电、稳定、示波器读数、写结果)
+记录为一个 span，测试结束后导出到结果 CSV 旁边:
+
+- <结果文件>.trace.jsonl  每行一个 span
+- <结果文件>.trace.json   Chrome trace 格式 (chrome://tracing 或 Perfetto 打开)
+
+并输出各步骤耗时的 p50/p95 汇总。
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+def percentile(values: list, pct: float) -> float:
+    """最近秩百分位 (values 非空)"""
+    ordered = sorted(values)
+    rank = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+class Tracer:
+    """记录 span: {"name", "track", "start", "duration", "attrs"}, 时间单位 s (相对追踪开始)"""
+
+    def __init__(self):
+        self.spans = []
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._active = threading.local()
+
+    def subscribe(self, listener):
+        """每个 span 结束时调用 listener(span) (例如 metrics.RunMetrics.observe_span)"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    @contextmanager
+    def span(self, name: str, track: str = "main", **attrs):
+        """记录一个步骤, 可在 with 块内向返回的 attrs 字典添加属性"""
+        stack = self._active.__dict__.setdefault("stack", [])
+        stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            end = time.perf_counter()
+            stack.pop()
+            span = {
+                "name": name,
+                "track": track,
+                "start": start - self._t0,
+                "duration": end - start,
+                "attrs": attrs,
+            }
+            with self._lock:
+                self.spans.append(span)
+            for listener in self._listeners:
+                listener(span)
+
+    def current(self) -> str:
+        """当前线程最内层进行中的 span 名称, 没有时返回 None"""
+        stack = getattr(self._active, "stack", None)
+        return stack[-1] if stack else None
+
+    def summary(self) -> dict:
+        """各步骤耗时汇总 {name: {"count", "total", "p50", "p95"}}, 按首次出现顺序"""
+        durations = {}
+        for s in self.spans:
+            durations.setdefault(s["name"], []).append(s["duration"])
+        return {
+            name: {"count": len(d), "total": sum(d), "p50": percentile(d, 50), "p95": percentile(d, 95)}
+            for name, d in durations.items()
+        }
+
+    def print_summary(self):
+        summary = self.summary()
+        if not summary:
+            return
+        print(f"{'步骤':<16} {'次数':>6} {'p50(s)':>9} {'p95(s)':>9} {'合计(s)':>9}")
+        for name, s in summary.items():
+            print(f"{name:<16} {s['count']:>6} {s['p50']:>9.3f} {s['p95']:>9.3f} {s['total']:>9.2f}")
+
+    def export_jsonl(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            for s in self.spans:
+                f.write(json.dumps(s, ensure_ascii=False, default=str) + "\n")
+
+    def export_chrome(self, path: str):
+        """导出 Chrome trace (每个 track 一个线程)"""
+        tids = {}
+        events = []
+        for s in self.spans:
+            tid = tids.setdefault(s["track"], len(tids) + 1)
+            events.append({
+                "name": s["name"],
+                "ph": "X",
+                "ts": s["start"] * 1e6,
+                "dur": s["duration"] * 1e6,
+                "pid": 1,
+                "tid": tid,
+                "args": {k: str(v) for k, v in s["attrs"].items()},
+            })
+        for track, tid in tids.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": track}})
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+    def export(self, result_file: str) -> list:
+        """在结果文件旁导出 JSONL 和 Chrome trace, 返回生成的文件路径"""
+        base = os.path.splitext(os.path.expanduser(result_file))[0]
+        paths = [f"{base}.trace.jsonl", f"{base}.trace.json"]
+        self.export_jsonl(paths[0])
+        self.export_chrome(paths[1])
+        return paths
+
+
+class NullTracer:
+    """不记录任何内容的 Tracer, 未启用计时时使用"""
+
+    spans = []
+
+    @contextmanager
+    def span(self, name: str, track: str = "main", **attrs):
+        yield attrs
+
+    def subscribe(self, listener):
+        pass
+
+    def current(self) -> str:
+        return None
+
+    def summary(self) -> dict:
+        return {}
+
+    def print_summary(self):
+        pass
+
+
+NULL_TRACER = NullTracer()
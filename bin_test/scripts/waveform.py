@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+示波器波形块采集与本地统计
+
+通过 VISA 以二进制 (WORD, 小端) 格式读取 DLM 的原始波形块，零拷贝解码为
+NumPy 数组，并在本地一次性计算均值、标准差、百分位、纹波和稳定时间。
+一次采集即可得到完整的分布，而不仅是示波器的 Mean 测量值。
+
+依赖: numpy
+"""
+
+import numpy as np
+
+# DLM 波形数据换算: 物理值 = 原始值 × 量程 / 分度 + 偏置
+WORD_DIVISION = 3200
+BYTE_DIVISION = 12.5
+
+# 统计输出的百分位
+PERCENTILES = (1, 5, 50, 95, 99)
+
+# 稳定时间判定: 最终值取末尾 10% 的均值, 容差带为最终值的 ±2%
+FINAL_FRACTION = 0.1
+DEFAULT_SETTLE_BAND = 0.02
+
+# 上电特性计算前的滑动平均时长 (s), 避免噪声尖峰被当作离开容差带或冲击峰值
+POWER_ON_SMOOTH = 0.002
+
+
+def parse_block(data) -> memoryview:
+    """解析 IEEE 488.2 定长块 (#<n><长度><数据>), 返回数据部分的 memoryview (不拷贝)"""
+    view = memoryview(data)
+    if view[0:1] != b"#":
+        raise ValueError("不是 IEEE 488.2 数据块")
+    digits = int(bytes(view[1:2]))
+    length = int(bytes(view[2:2 + digits]))
+    start = 2 + digits
+    if len(view) < start + length:
+        raise ValueError(f"数据块不完整: {len(view) - start}/{length} 字节")
+    return view[start:start + length]
+
+
+def decode(block, range_: float, offset: float, fmt: str = "WORD") -> np.ndarray:
+    """将原始波形块解码为物理值数组
+
+    np.frombuffer 直接引用块内存, 换算时才分配一次结果数组。
+    """
+    if fmt == "WORD":
+        raw = np.frombuffer(block, dtype="<i2")
+        return raw * (range_ / WORD_DIVISION) + offset
+    raw = np.frombuffer(block, dtype="i1")
+    return raw * (range_ / BYTE_DIVISION) + offset
+
+
+def settling_time(samples: np.ndarray, sample_rate: float, band: float = DEFAULT_SETTLE_BAND) -> float:
+    """信号最后一次离开 最终值 ±band 容差带后重新进入的时间 (s)
+
+    最终值取末尾 FINAL_FRACTION 的均值; 从未离开容差带时返回 0。
+    """
+    tail = max(1, int(len(samples) * FINAL_FRACTION))
+    final = samples[-tail:].mean()
+    limit = max(abs(final) * band, np.finfo(float).eps)
+    outside = np.flatnonzero(np.abs(samples - final) > limit)
+    if outside.size == 0:
+        return 0.0
+    return (outside[-1] + 1) / sample_rate
+
+
+def waveform_stats(samples: np.ndarray, sample_rate: float, settle_band: float = DEFAULT_SETTLE_BAND) -> dict:
+    """计算波形统计量
+
+    Returns:
+        {"mean", "std", "min", "max", "p1", "p5", "p50", "p95", "p99",
+         "ripple": 稳定段 (p99 - p1), "settle_time": 稳定时间 (s), "samples", "sample_rate"}
+    """
+    settle = settling_time(samples, sample_rate, settle_band)
+    pcts = np.percentile(samples, PERCENTILES)
+    stable = samples[int(settle * sample_rate):]
+    if stable.size == 0:
+        stable = samples
+    ripple_lo, ripple_hi = np.percentile(stable, (1, 99))
+
+    stats = {
+        "mean": float(samples.mean()),
+        "std": float(samples.std()),
+        "min": float(samples.min()),
+        "max": float(samples.max()),
+        "ripple": float(ripple_hi - ripple_lo),
+        "settle_time": float(settle),
+        "samples": int(samples.size),
+        "sample_rate": float(sample_rate),
+    }
+    stats.update({f"p{p}": float(v) for p, v in zip(PERCENTILES, pcts)})
+    return stats
+
+
+def smooth(samples: np.ndarray, sample_rate: float, window: float) -> np.ndarray:
+    """滑动平均: 第 i 点为 samples[i:i + n] 的均值 (n = window × 采样率), 结果少 n - 1 点"""
+    n = int(window * sample_rate)
+    if n <= 1 or n > samples.size:
+        return samples
+    cumsum = np.cumsum(np.concatenate(([0.0], samples)))
+    return (cumsum[n:] - cumsum[:-n]) / n
+
+
+def power_on_metrics(samples: np.ndarray, sample_rate: float, trigger_index: int = 0,
+                     settle_band: float = DEFAULT_SETTLE_BAND, smooth_window: float = POWER_ON_SMOOTH) -> dict:
+    """上电波形的冲击和稳定特性, 时间均从触发点算起; 先做 smooth_window 的滑动平均
+
+    Returns:
+        {"final": 最终值 (末尾 FINAL_FRACTION 的均值), "peak": 冲击峰值,
+         "overshoot": (峰值 - 最终值) / 最终值, "peak_time": 峰值时间 (s),
+         "rise_time": 10% -> 90% 上升时间 (s), 未达到时为 None,
+         "settle_time": 进入 最终值 ±settle_band 并保持的时间 (s)}
+    """
+    after = smooth(np.asarray(samples[trigger_index:], dtype=float), sample_rate, smooth_window)
+    tail = max(1, int(len(after) * FINAL_FRACTION))
+    final = float(after[-tail:].mean())
+    peak_index = int(after.argmax())
+    peak = float(after[peak_index])
+
+    rise_time = None
+    low = np.flatnonzero(after >= 0.1 * final)
+    if low.size:
+        high = np.flatnonzero(after[low[0]:] >= 0.9 * final)
+        if high.size:
+            rise_time = high[0] / sample_rate
+
+    return {
+        "final": final,
+        "peak": peak,
+        "overshoot": (peak - final) / final if final else 0.0,
+        "peak_time": peak_index / sample_rate,
+        "rise_time": rise_time,
+        "settle_time": float(settling_time(after, sample_rate, settle_band)),
+    }
+
+
+def distribution_passed(stats: dict, expected: float, tolerance: float) -> bool:
+    """按分布判定: p5 与 p95 都落在 预期 ± 容差 内"""
+    return expected - tolerance <= stats["p5"] and stats["p95"] <= expected + tolerance
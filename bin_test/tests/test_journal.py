@@ -0,0 +1,34 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+from journal import Journal  # noqa: E402
+
+
+def test_resume_after_torn_write_keeps_new_records(tmp_path):
+    path = str(tmp_path / "journal" / "bin_test_x.jsonl")
+    with Journal(path) as journal:
+        journal.append("a", passed=True)
+    # 中断时写了一半的记录
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"key": "b", "pas')
+
+    with Journal(path, resume=True) as journal:
+        assert set(journal.load()) == {"a"}
+        journal.append("c", passed=False)
+
+    with Journal(path, resume=True) as journal:
+        records = journal.load()
+    assert set(records) == {"a", "c"}
+    assert records["c"]["passed"] is False
+
+
+def test_resume_keeps_complete_journal(tmp_path):
+    path = str(tmp_path / "journal" / "bin_test_x.jsonl")
+    with Journal(path) as journal:
+        journal.append("a")
+    size = os.path.getsize(path)
+    with Journal(path, resume=True) as journal:
+        assert set(journal.load()) == {"a"}
+    assert os.path.getsize(path) == size